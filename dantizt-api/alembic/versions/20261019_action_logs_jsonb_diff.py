@@ -0,0 +1,51 @@
+"""store audit updates as jsonb diffs
+
+Revision ID: 20261019_action_logs_jsonb_diff
+Revises: 
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+
+from app.db.triggers import create_audit_diff_function, upgrade_action_logs_storage
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_action_logs_jsonb_diff'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # TEXT -> JSONB и колонка со списком измененных полей
+    op.execute(upgrade_action_logs_storage)
+    op.execute(create_audit_diff_function)
+
+    # Сжимаем накопленные UPDATE до разниц измененных колонок
+    op.execute("""
+        UPDATE action_logs
+        SET (changed_columns, old_data, new_data) = (
+            SELECT d.changed_columns, d.old_values, d.new_values
+            FROM audit_diff(action_logs.old_data, action_logs.new_data) d
+        )
+        WHERE action_type = 'UPDATE'
+        AND changed_columns IS NULL
+        AND old_data IS NOT NULL
+        AND new_data IS NOT NULL
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_action_logs_record
+        ON action_logs (table_name, record_id, created_at)
+    """)
+
+
+def downgrade() -> None:
+    # Разницы UPDATE не разворачиваются обратно в полные строки
+    op.execute("DROP INDEX IF EXISTS ix_action_logs_record")
+    op.execute("ALTER TABLE action_logs DROP COLUMN IF EXISTS changed_columns")
+    op.execute("""
+        ALTER TABLE action_logs
+            ALTER COLUMN old_data TYPE varchar USING old_data::text,
+            ALTER COLUMN new_data TYPE varchar USING new_data::text
+    """)
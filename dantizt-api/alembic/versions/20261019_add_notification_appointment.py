@@ -0,0 +1,33 @@
+"""link reminders to appointments
+
+Revision ID: 20261019_add_notification_appointment
+Revises: 20261019_add_notification_is_sent
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_notification_appointment'
+down_revision = '20261019_add_notification_is_sent'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Прием, о котором напоминает уведомление: триггер записей на прием удаляет
+    # или переносит неотправленные напоминания при отмене или переносе приема
+    op.add_column('notifications', sa.Column('appointment_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'notifications_appointment_id_fkey', 'notifications', 'appointments',
+        ['appointment_id'], ['id'], ondelete='CASCADE'
+    )
+    op.create_index('ix_notifications_appointment', 'notifications', ['appointment_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notifications_appointment')
+    op.drop_constraint('notifications_appointment_id_fkey', 'notifications', type_='foreignkey')
+    op.drop_column('notifications', 'appointment_id')
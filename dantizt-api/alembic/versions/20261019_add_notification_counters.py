@@ -0,0 +1,40 @@
+"""add notification counters
+
+Revision ID: 20261019_add_notification_counters
+Revises: 
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_notification_counters'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Создаем таблицу счетчиков непрочитанных уведомлений
+    op.create_table(
+        'notification_counters',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('unread_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    
+    # Заполняем счетчики по текущим данным
+    op.execute("""
+        INSERT INTO notification_counters (user_id, unread_count)
+        SELECT n.user_id, count(*)
+        FROM notifications n
+        JOIN users u ON u.id = n.user_id
+        WHERE NOT coalesce(n.is_read, false)
+        GROUP BY n.user_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('notification_counters')
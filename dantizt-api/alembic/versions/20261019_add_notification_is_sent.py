@@ -0,0 +1,43 @@
+"""add is_sent to notifications
+
+Revision ID: 20261019_add_notification_is_sent
+Revises: 
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_add_notification_is_sent'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Добавляем признак и время отправки отложенного уведомления
+    op.add_column('notifications', sa.Column('is_sent', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.add_column('notifications', sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True))
+    
+    # Уже наступившие уведомления, созданные до появления признака, считаются
+    # отправленными: иначе они скрылись бы, а диспетчер разослал бы их повторно
+    op.execute("""
+        UPDATE notifications
+        SET is_sent = true, sent_at = coalesce(sent_at, created_at)
+        WHERE scheduled_for IS NOT NULL AND scheduled_for <= now()
+    """)
+    
+    # Частичный индекс для выборки наступивших уведомлений диспетчером
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_scheduled
+        ON notifications (scheduled_for)
+        WHERE NOT is_sent
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_notifications_scheduled')
+    op.drop_column('notifications', 'sent_at')
+    op.drop_column('notifications', 'is_sent')
@@ -0,0 +1,54 @@
+"""partition action_logs by month
+
+Revision ID: 20261019_partition_action_logs
+Revises: 
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.partitions import get_partition_spec, conversion_statements
+
+
+# revision identifiers, used by Alembic.
+revision = '20261019_partition_action_logs'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    partitioned = bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('action_logs'))"
+    )).scalar()
+    if partitioned:
+        return
+
+    # Переводим журнал действий в таблицу с месячными секциями
+    spec = get_partition_spec('action_logs')
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence('action_logs', 'id')")).scalar()
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM action_logs")).scalar()
+    current = spec.period_start(datetime.now(timezone.utc))
+    first_start = spec.period_start(oldest) if oldest else current
+
+    for statement in conversion_statements(spec, first_start, spec.shift(current, spec.premake), sequence):
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    # Возврат к обычной таблице с сохранением данных
+    op.execute("CREATE TABLE action_logs_plain (LIKE action_logs INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO action_logs_plain SELECT * FROM action_logs")
+    sequence = op.get_bind().execute(sa.text("SELECT pg_get_serial_sequence('action_logs', 'id')")).scalar()
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    op.execute("DROP TABLE action_logs CASCADE")
+    op.execute("ALTER TABLE action_logs_plain RENAME TO action_logs")
+    op.execute("ALTER TABLE action_logs ADD PRIMARY KEY (id)")
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY action_logs.id")
+    op.execute("CREATE INDEX ix_action_logs_id ON action_logs (id)")
+    op.execute("CREATE INDEX ix_action_logs_table_action ON action_logs (table_name, action_type)")
+    op.execute("CREATE INDEX ix_action_logs_created_at ON action_logs (created_at)")
@@ -7,7 +7,7 @@ from typing import List, Optional
 import json
 
 from app.core.security import get_current_user
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.db.models import User, Doctor, Patient, Appointment, UserRole, DoctorSchedule, AppointmentStatus, Service, DoctorSpecialDay, SpecialDayType, AppointmentService, Payment, PaymentStatus, PaymentMethod, Notification
 from app.core.metrics import track_appointment, update_doctor_workload, track_payment
 from app.schemas.appointment import (
@@ -28,7 +28,7 @@ async def get_appointments(
     date: Optional[datetime] = None,
     search: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     if current_user.role not in [UserRole.admin, UserRole.reception]:
         raise HTTPException(
@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from datetime import datetime
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
+from urllib.parse import quote
+import base64
 import os
 from pathlib import Path
 
 from app.core.security import get_current_user
 from app.db.session import get_db
 from app.db.models import User, UserRole
-from app.db.backup import DatabaseBackup
+from app.db.backup import DatabaseBackup, DATA_SUFFIX
 from app.schemas.backup import BackupBase, BackupList
+from app.schemas.job import JobOut
+from app.services.backup_jobs import (
+    JOB_KIND_BACKUP, JOB_KIND_RESTORE, JOB_KIND_VERIFY, JOB_KINDS, submit_backup_job
+)
+from app.services.jobs import job_registry
 from app.core.config import settings
 
 router = APIRouter()
@@ -31,70 +38,84 @@ async def list_backups(
             detail="Only administrators can view backups"
         )
     
+    # Индекс копий кэшируется и перестраивается только при изменении директории
     backup_manager = DatabaseBackup(db_name)
-    backup_files = backup_manager.list_backups()
-    
-    backups = []
-    for backup_file in backup_files:
-        stat = backup_file.stat()
-        backups.append(
-            BackupBase(
-                filename=backup_file.name,
-                created_at=datetime.fromtimestamp(stat.st_mtime),
-                size_bytes=stat.st_size,
-                size_human=f"{stat.st_size / (1024*1024):.2f} MB"
-            )
-        )
-    
-    # Сортируем по дате создания (новые вначале)
-    backups.sort(key=lambda x: x.created_at, reverse=True)
+    backups = [
+        BackupBase(**entry, size_human=f"{entry['size_bytes'] / (1024*1024):.2f} MB")
+        for entry in backup_manager.backup_index()
+    ]
     
     return BackupList(items=backups, total=len(backups))
 
-@router.post("/create", response_model=BackupBase)
+@router.post("/create", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
 async def create_backup(
+    incremental: bool = False,
     request: Request = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Создать новую резервную копию базы данных (только для администраторов)"""
+    """
+    Запустить создание резервной копии базы данных (только для администраторов).
+    incremental=true - копия только изменений после предыдущей копии.
+    Ход выгрузки доступен по идентификатору задачи: /backups/jobs/{job_id}
+    """
     if current_user.role != UserRole.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only administrators can create backups"
         )
     
-    backup_manager = DatabaseBackup(db_name)
+    return submit_backup_job(JOB_KIND_BACKUP, incremental=incremental)
+
+@router.get("/jobs/{job_id}", response_model=JobOut)
+async def get_backup_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Состояние задачи создания, восстановления или проверки резервной копии"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can view backup jobs"
+        )
     
-    # Создаем резервную копию синхронно
-    try:
-        backup_file = backup_manager.create_backup()
-        # Очищаем старые бэкапы после создания нового
-        backup_manager.cleanup_old_backups(keep_last=10)
-        
-        # Получаем информацию о созданном файле
-        stat = backup_file.stat()
-        size_bytes = stat.st_size
-        
-        # Формируем человекочитаемый размер файла
-        if size_bytes < 1024:
-            size_human = f"{size_bytes} байт"
-        elif size_bytes < 1024 * 1024:
-            size_human = f"{size_bytes / 1024:.1f} КБ"
-        else:
-            size_human = f"{size_bytes / (1024 * 1024):.1f} МБ"
-        
-        return BackupBase(
-            filename=backup_file.name,
-            size_bytes=size_bytes,
-            size_human=size_human,
-            created_at=datetime.fromtimestamp(stat.st_mtime)
+    job = job_registry.get(job_id)
+    if not job or job["kind"] not in JOB_KINDS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
         )
-    except Exception as e:
+    return job
+
+@router.post("/verify/{filename}", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
+async def verify_backup(
+    filename: str,
+    deep: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Проверить резервную копию по контрольным суммам манифеста без загрузки в базу
+    (только для администраторов). deep=true - дополнительно распаковать данные
+    """
+    if current_user.role != UserRole.admin:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create backup: {str(e)}"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can verify backups"
         )
+    
+    backup_file = DatabaseBackup(db_name).backup_dir / filename
+    if not backup_file.exists() or not backup_file.name.endswith(DATA_SUFFIX):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Backup file not found"
+        )
+    
+    return submit_backup_job(JOB_KIND_VERIFY, filename=filename, deep=deep)
+
+class BackupFileResponse(FileResponse):
+    # Крупные блоки чтения: меньше переходов в пул потоков на больших копиях
+    chunk_size = settings.BACKUP_DOWNLOAD_CHUNK_BYTES
+
 
 @router.get("/download/{filename}")
 async def download_backup(
@@ -103,7 +124,15 @@ async def download_backup(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Скачать резервную копию базы данных (только для администраторов)"""
+    """
+    Скачать резервную копию базы данных (только для администраторов).
+
+    Поддерживаются Range-запросы: прерванную загрузку можно продолжить с места
+    обрыва. ETag - SHA-256 копии из манифеста, поэтому If-Range гарантирует,
+    что докачивается тот же файл, а Repr-Digest позволяет проверить скачанное.
+    Если задан BACKUP_ACCEL_REDIRECT, файл отдает nginx через sendfile,
+    приложение только проверяет права.
+    """
     if current_user.role != UserRole.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -111,30 +140,40 @@ async def download_backup(
         )
     
     backup_manager = DatabaseBackup(db_name)
-    backup_dir = backup_manager.backup_dir
-    backup_file = backup_dir / filename
+    entry = backup_manager.find_backup(filename)
     
-    if not backup_file.exists():
+    if entry is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Backup file not found"
         )
     
-    return FileResponse(
-        path=str(backup_file),
+    headers = {}
+    if entry["sha256"]:
+        digest = base64.b64encode(bytes.fromhex(entry["sha256"])).decode()
+        headers["ETag"] = f'"{entry["sha256"]}"'
+        headers["Repr-Digest"] = f"sha-256=:{digest}:"
+    
+    if settings.BACKUP_ACCEL_REDIRECT:
+        headers["X-Accel-Redirect"] = settings.BACKUP_ACCEL_REDIRECT + quote(filename)
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return Response(headers=headers, media_type="application/octet-stream")
+    
+    return BackupFileResponse(
+        path=str(backup_manager.backup_dir / filename),
         filename=filename,
-        media_type="application/octet-stream"
+        media_type="application/octet-stream",
+        headers=headers
     )
 
-@router.post("/restore/{filename}")
+@router.post("/restore/{filename}", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
 async def restore_backup(
     filename: str,
-    background_tasks: BackgroundTasks,
     request: Request = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Восстановить базу данных из резервной копии (только для администраторов)"""
+    """Запустить восстановление базы данных из резервной копии (только для администраторов)"""
     if current_user.role != UserRole.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -151,13 +190,8 @@ async def restore_backup(
             detail="Backup file not found"
         )
     
-    # Восстанавливаем из бэкапа в фоновом режиме
-    def restore_backup_task():
-        backup_manager.restore_backup(backup_file)
-    
-    background_tasks.add_task(restore_backup_task)
-    
-    return {"message": "Database restoration started"}
+    # Восстанавливаем из бэкапа в потоке задач резервного копирования
+    return submit_backup_job(JOB_KIND_RESTORE, filename=filename)
 
 @router.delete("/{filename}")
 async def delete_backup(
@@ -184,8 +218,13 @@ async def delete_backup(
         )
     
     try:
-        os.remove(backup_file)
+        backup_manager.delete_backup(backup_file)
         return {"message": "Backup deleted successfully"}
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
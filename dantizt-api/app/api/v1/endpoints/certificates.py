@@ -1,11 +1,16 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Request, Response
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import select, func, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
 import logging
 
+from app.core.config import settings
 from app.core.security import get_current_user
 from app.api.deps import get_db
 from app.db.models import (
@@ -13,10 +18,15 @@ from app.db.models import (
     CertificateStatus, UserRole, PaymentStatus
 )
 from app.schemas.certificate import (
-    CertificateCreate, CertificateUpdate, CertificateOut, CertificatePaginatedResponse
+    CertificateCreate, CertificateUpdate, CertificateOut, CertificatePaginatedResponse,
+    BulkCertificateCreate
 )
-from app.api.v1.endpoints.medical_records import generate_tax_deduction_pdf
+from app.schemas.job import JobOut
+from app.services.bulk_certificates import JOB_KIND, run_bulk_certificate_job, bulk_archive_path
+from app.services.certificate_cache import certificate_cache
+from app.services.jobs import job_registry, JobStatus
 from app.utils.email import send_email, send_tax_deduction_certificate
+from app.utils.pdf_generator import generate_tax_deduction_certificate
 
 # Настраиваем логирование
 logger = logging.getLogger(__name__)
@@ -24,6 +34,78 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
+def _certificate_pdf_data(certificate: TaxDeductionCertificate) -> Dict[str, Any]:
+    """
+    Собирает входные данные для PDF справки. Справка неизменна после выдачи,
+    поэтому документ полностью определяется этими данными, а их хэш служит ключом кэша.
+    """
+    patient_user = certificate.patient.user
+    issued_by = certificate.issued_by
+    payments = sorted(certificate.payments, key=lambda p: (p.created_at, p.id))
+
+    return {
+        "certificate_id": certificate.id,
+        "certificate_number": certificate.certificate_number,
+        "year": certificate.year,
+        "status": CertificateStatus(certificate.status).value,
+        "amount": float(certificate.amount),
+        "patient_name": patient_user.full_name,
+        "patient_inn": certificate.patient.inn or "ИНН не указан",
+        "staff_name": issued_by.full_name if issued_by else "",
+        "staff_phone": (issued_by.phone_number if issued_by else None) or "______________",
+        "payments": [
+            {
+                "id": payment.id,
+                "name": payment.description or "Оплата медицинских услуг",
+                "cost": float(payment.amount),
+                "date": payment.created_at.strftime("%d.%m.%Y")
+            }
+            for payment in payments
+        ]
+    }
+
+
+def _render_certificate_pdf(data: Dict[str, Any]) -> bytes:
+    """Формирует PDF справки из подготовленных данных"""
+    payments = data["payments"]
+    return generate_tax_deduction_certificate(
+        patient_name=data["patient_name"],
+        patient_inn=data["patient_inn"],
+        clinic_name=settings.CLINIC_NAME,
+        clinic_inn=settings.CLINIC_INN,
+        clinic_address=settings.CLINIC_ADDRESS,
+        services=[
+            {"name": p["name"], "cost": p["cost"], "date": p["date"]}
+            for p in payments
+        ],
+        total_amount=data["amount"],
+        payment_date=payments[-1]["date"] if payments else "",
+        certificate_number=data["certificate_number"],
+        staff_name=data["staff_name"],
+        staff_phone=data["staff_phone"]
+    )
+
+
+async def _get_certificate_pdf(certificate: TaxDeductionCertificate) -> Tuple[Path, str]:
+    """
+    Возвращает путь к PDF справки и хэш ее данных.
+    PDF берется из дискового кэша, а при промахе формируется и сохраняется.
+    """
+    data = _certificate_pdf_data(certificate)
+    digest = certificate_cache.compute_digest(data)
+
+    pdf_path = certificate_cache.get(certificate.id, digest)
+    if pdf_path is None:
+        logger.debug(f"Certificate {certificate.id} PDF cache miss, rendering")
+        # Генерация PDF занимает процессор, поэтому выполняем ее вне event loop
+        pdf_content = await run_in_threadpool(_render_certificate_pdf, data)
+        pdf_path = await run_in_threadpool(
+            certificate_cache.put, certificate.id, digest, pdf_content
+        )
+
+    return pdf_path, digest
+
+
 @router.get("/", response_model=CertificatePaginatedResponse)
 async def get_certificates(
     status: Optional[str] = None,
@@ -93,6 +175,93 @@ async def get_certificates(
     }
 
 
+@router.post("/bulk", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
+async def create_bulk_certificates(
+    bulk_request: BulkCertificateCreate,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Запустить массовое формирование справок для налогового вычета за год.
+    Справки собираются в ZIP-архив, ход выполнения доступен по идентификатору задачи.
+    """
+    if current_user.role not in [UserRole.reception, UserRole.admin]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only reception staff or administrators can generate certificates"
+        )
+    
+    job = job_registry.create(JOB_KIND, params=bulk_request.model_dump())
+    
+    background_tasks.add_task(
+        run_bulk_certificate_job,
+        job_id=job["id"],
+        year=bulk_request.year,
+        patient_ids=bulk_request.patient_ids,
+        staff_name=current_user.full_name,
+        staff_phone=current_user.phone_number or "______________"
+    )
+    
+    return job
+
+
+def _get_bulk_job(job_id: str, current_user: User) -> dict:
+    if current_user.role not in [UserRole.reception, UserRole.admin]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only reception staff or administrators can view certificate jobs"
+        )
+    
+    job = job_registry.get(job_id)
+    if not job or job["kind"] != JOB_KIND:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job
+
+
+@router.get("/bulk/{job_id}", response_model=JobOut)
+async def get_bulk_certificates_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Получить состояние задачи массового формирования справок.
+    """
+    return _get_bulk_job(job_id, current_user)
+
+
+@router.get("/bulk/{job_id}/download", response_class=None)
+async def download_bulk_certificates(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Скачать ZIP-архив со справками, сформированными задачей.
+    """
+    job = _get_bulk_job(job_id, current_user)
+    
+    if job["status"] != JobStatus.completed:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job is not completed (status: {job['status']})"
+        )
+    
+    archive_path = bulk_archive_path(job_id)
+    if not archive_path.exists():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Archive not found"
+        )
+    
+    return FileResponse(
+        path=archive_path,
+        filename=job["result"]["filename"],
+        media_type="application/zip"
+    )
+
+
 @router.get("/{certificate_id}", response_model=CertificateOut)
 async def get_certificate(
     certificate_id: int,
@@ -298,6 +467,9 @@ async def update_certificate(
     await db.commit()
     await db.refresh(db_certificate)
     
+    # Сбрасываем закэшированный PDF справки
+    certificate_cache.invalidate(certificate_id)
+    
     return db_certificate
 
 
@@ -333,12 +505,15 @@ async def delete_certificate(
     await db.delete(db_certificate)
     await db.commit()
     
+    certificate_cache.invalidate(certificate_id)
+    
     return None
 
 
 @router.get("/{certificate_id}/download", response_class=None)
 async def download_certificate(
     certificate_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -352,10 +527,12 @@ async def download_certificate(
             detail="Only reception staff or administrators can download certificates"
         )
     
-    # Получаем справку
+    # Получаем справку вместе со всеми данными, необходимыми для PDF
     result = await db.execute(
         select(TaxDeductionCertificate).options(
-            joinedload(TaxDeductionCertificate.patient)
+            joinedload(TaxDeductionCertificate.patient).joinedload(Patient.user),
+            joinedload(TaxDeductionCertificate.issued_by),
+            joinedload(TaxDeductionCertificate.payments)
         ).where(TaxDeductionCertificate.id == certificate_id)
     )
     db_certificate = result.unique().scalar_one_or_none()
@@ -373,13 +550,29 @@ async def download_certificate(
             detail="Cannot download cancelled certificate"
         )
     
-    # Генерируем PDF
-    return await generate_tax_deduction_pdf(
-        patient_id=db_certificate.patient_id,
-        year=db_certificate.year,
-        send_email=False,
-        current_user=current_user,
-        db=db
+    pdf_path, digest = await _get_certificate_pdf(db_certificate)
+    
+    etag = f'"{digest}"'
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache"
+    }
+    
+    # Клиент уже имеет актуальную версию справки
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+    
+    filename = f"Справка для налогового вычета {db_certificate.patient.user.full_name}.pdf"
+    translit_filename = f"Tax_Deduction_{db_certificate.year}_{db_certificate.patient_id}.pdf"
+    
+    # FileResponse отдает файл через sendfile, не загружая его в память
+    return FileResponse(
+        path=pdf_path,
+        media_type="application/pdf",
+        headers={
+            **cache_headers,
+            "Content-Disposition": f'attachment; filename="{translit_filename}"; filename*=UTF-8\'\'{quote(filename)}'
+        }
     )
 
 
@@ -403,7 +596,9 @@ async def send_certificate_email(
     # Получаем справку
     result = await db.execute(
         select(TaxDeductionCertificate).options(
-            joinedload(TaxDeductionCertificate.patient).joinedload(Patient.user)
+            joinedload(TaxDeductionCertificate.patient).joinedload(Patient.user),
+            joinedload(TaxDeductionCertificate.issued_by),
+            joinedload(TaxDeductionCertificate.payments)
         ).where(TaxDeductionCertificate.id == certificate_id)
     )
     db_certificate = result.unique().scalar_one_or_none()
@@ -421,13 +616,22 @@ async def send_certificate_email(
             detail="Cannot send cancelled certificate"
         )
     
-    # Генерируем PDF и отправляем на email
-    await generate_tax_deduction_pdf(
-        patient_id=db_certificate.patient_id,
+    patient_user = db_certificate.patient.user
+    if not patient_user.email:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Patient has no email address"
+        )
+    
+    # Берем PDF из кэша и отправляем на email
+    pdf_path, _ = await _get_certificate_pdf(db_certificate)
+    pdf_content = await run_in_threadpool(pdf_path.read_bytes)
+    
+    await send_tax_deduction_certificate(
+        email=patient_user.email,
+        full_name=patient_user.full_name,
         year=db_certificate.year,
-        send_email=True,
-        current_user=current_user,
-        db=db
+        pdf_content=pdf_content
     )
     
     return {"message": "Certificate sent to patient's email"}
@@ -1,13 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, tuple_
 from typing import List, Optional
 from datetime import datetime
 
 from app.core.security import get_current_user
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.db.models import User, ActionLog, UserRole
-from app.schemas.log import LogResponse, LogList
+from app.db.partitions import partition_report
+from app.db.instrumentation import query_log
+from app.services.log_archive import log_archive
+from app.services.audit import (
+    reconstruct_log_states, count_logs, encode_cursor, decode_cursor, get_log_catalog
+)
+from app.schemas.log import (
+    LogResponse, LogList, PartitionInfo, DbQueryLogSettings, DbQueryLogSettingsUpdate
+)
 
 router = APIRouter()
 
@@ -15,22 +24,64 @@ router = APIRouter()
 async def get_logs(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    archive: bool = False,
     table_name: Optional[str] = None,
     action_type: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     request: Request = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Получить список логов действий (только для администраторов)"""
+    """
+    Получить список логов действий (только для администраторов).
+    Для перехода по страницам передается cursor из next_cursor предыдущего ответа;
+    skip оставлен для совместимости и на глубоких страницах работает медленно.
+    С archive=true записи читаются из холодного хранилища выгруженных секций,
+    открываются только куски, пересекающиеся с интервалом start_date - end_date.
+    """
     if current_user.role != UserRole.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only administrators can view logs"
         )
     
-    # Строим запрос с фильтрами
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+    
+    if archive:
+        rows, total_count, total_is_estimate = await run_in_threadpool(
+            log_archive.query,
+            start=start_date,
+            end=end_date,
+            table_name=table_name,
+            action_type=action_type,
+            cursor=position,
+            limit=limit
+        )
+        items = [LogResponse(**{field: row.get(field) for field in LogResponse.model_fields}) for row in rows]
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+        return LogList(
+            items=items,
+            total=total_count,
+            total_is_estimate=total_is_estimate,
+            page=1,
+            size=limit,
+            next_cursor=next_cursor
+        )
+    
+    # Строим запрос с фильтрами. Условия по created_at отсекают лишние секции журнала
     query = select(ActionLog)
     
     if table_name:
@@ -42,29 +93,43 @@ async def get_logs(
     if end_date:
         query = query.where(ActionLog.created_at <= end_date)
     
-    # Получаем общее количество записей для пагинации
-    count_query = select(func.count()).select_from(query.subquery())
-    total = await db.execute(count_query)
-    total_count = total.scalar()
+    # Количество записей - по оценке планировщика или из кэша по набору фильтров
+    total_count, total_is_estimate = await count_logs(
+        db, query, (table_name, action_type, start_date, end_date)
+    )
+    
+    # Страница по ключу (created_at, id): позиция курсора находится по индексу без OFFSET
+    if position:
+        query = query.where(
+            tuple_(ActionLog.created_at, ActionLog.id) < tuple_(*position)
+        )
+    else:
+        query = query.offset(skip)
     
-    # Добавляем пагинацию и сортировку
-    query = query.order_by(ActionLog.created_at.desc()).offset(skip).limit(limit)
+    query = query.order_by(ActionLog.created_at.desc(), ActionLog.id.desc()).limit(limit + 1)
     
     result = await db.execute(query)
     logs = result.scalars().all()
     
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = encode_cursor(logs[-1].created_at, logs[-1].id)
+    
     return LogList(
         items=[LogResponse.from_orm(log) for log in logs],
         total=total_count,
+        total_is_estimate=total_is_estimate,
         page=skip // limit + 1,
-        size=limit
+        size=limit,
+        next_cursor=next_cursor
     )
 
 @router.get("/tables", response_model=List[str])
 async def get_log_tables(
     request: Request = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Получить список таблиц, для которых есть логи (только для администраторов)"""
     if current_user.role != UserRole.admin:
@@ -73,17 +138,14 @@ async def get_log_tables(
             detail="Only administrators can view logs"
         )
     
-    query = select(ActionLog.table_name).distinct()
-    result = await db.execute(query)
-    tables = result.scalars().all()
-    
-    return tables
+    catalog = await get_log_catalog(db)
+    return sorted({table for table, _ in catalog})
 
 @router.get("/actions", response_model=List[str])
 async def get_log_actions(
     request: Request = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Получить список типов действий в логах (только для администраторов)"""
     if current_user.role != UserRole.admin:
@@ -92,20 +154,71 @@ async def get_log_actions(
             detail="Only administrators can view logs"
         )
     
-    query = select(ActionLog.action_type).distinct()
-    result = await db.execute(query)
-    actions = result.scalars().all()
+    catalog = await get_log_catalog(db)
+    return sorted({action for _, action in catalog})
+
+@router.get("/partitions", response_model=List[PartitionInfo])
+async def get_log_partitions(
+    request: Request = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Размеры секций журнала и приемов, включая отсоединенные (только для администраторов)"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can view logs"
+        )
+    
+    report = await partition_report(await db.connection())
+    return [
+        PartitionInfo(schema_name=item.pop("schema"), **item)
+        for item in report
+    ]
+
+@router.get("/db-query-logging", response_model=DbQueryLogSettings)
+async def get_db_query_logging(
+    current_user: User = Depends(get_current_user)
+):
+    """Пороги журнала медленных запросов и выборочного вывода запросов (только для администраторов)"""
+    if current_user.role != UserRole.admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can view logs"
+        )
+    
+    query_log.refresh()
+    return query_log.as_dict()
+
+@router.put("/db-query-logging", response_model=DbQueryLogSettings)
+async def update_db_query_logging(
+    update: DbQueryLogSettingsUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Изменить пороги журнала запросов без перезапуска (только для администраторов).
+    Изменения подхватываются всеми воркерами в течение секунды
+    """
+    if current_user.role != UserRole.admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only administrators can change logging settings"
+        )
     
-    return actions
+    return await run_in_threadpool(query_log.update, **update.model_dump())
 
 @router.get("/{log_id}", response_model=LogResponse)
 async def get_log(
     log_id: int,
+    reconstruct: bool = False,
     request: Request = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Получить детальную информацию о логе (только для администраторов)"""
+    """
+    Получить детальную информацию о логе (только для администраторов).
+    С reconstruct=true к разнице изменений добавляются полные состояния записи до и после.
+    """
     if current_user.role != UserRole.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -123,4 +236,7 @@ async def get_log(
             detail="Log not found"
         )
     
-    return LogResponse.from_orm(log)
+    response = LogResponse.from_orm(log)
+    if reconstruct:
+        response.before, response.after = await reconstruct_log_states(db, log)
+    return response
@@ -5,6 +5,7 @@ from sqlalchemy import update, delete, and_, text
 from typing import List, Optional
 import json
 from datetime import datetime
+from app.core.config import settings
 from app.core.security import get_current_user
 from app.db.session import get_db
 from app.db.models import (
@@ -19,6 +20,9 @@ from app.schemas.medical_record import (
     PatientAppointmentWithRecords
 )
 from fastapi.responses import StreamingResponse, JSONResponse
+from app.services.tax_deduction import (
+    get_tax_deduction_payment_summary, get_tax_deduction_services, build_services_data
+)
 from app.utils.pdf_generator import generate_tax_deduction_certificate
 from app.utils.email import send_tax_deduction_certificate
 import logging
@@ -542,84 +546,36 @@ async def generate_tax_deduction_pdf(
             detail="Patient not found"
         )
     
-    # Получаем все оплаченные приемы пациента за указанный год
-    start_date = datetime(year, 1, 1)
-    end_date = datetime(year, 12, 31, 23, 59, 59)
-    
-    # Получаем все платежи пациента за указанный год
-    payments_result = await db.execute(
-        select(Payment)
-        .where(
-            and_(
-                Payment.patient_id == patient_id,
-                Payment.created_at >= start_date,
-                Payment.created_at <= end_date,
-                Payment.status == 'completed'
-            )
-        )
-        .order_by(Payment.created_at)
-    )
-    payments = payments_result.scalars().all()
+    # Сводка по завершенным платежам пациента за указанный год
+    payment_summary = await get_tax_deduction_payment_summary(db, year, patient_id)
     
-    if not payments:
+    if not payment_summary.payments_count:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No payments found for the specified year"
         )
     
-    # Получаем все приемы, связанные с этими платежами
-    appointment_ids = [payment.appointment_id for payment in payments if payment.appointment_id]
-    
-    if not appointment_ids:
+    if not payment_summary.appointments_count:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No appointments found for the payments"
         )
     
-    appointments_result = await db.execute(
-        select(Appointment)
-        .where(Appointment.id.in_(appointment_ids))
-        .options(
-            joinedload(Appointment.doctor).joinedload(Doctor.user),
-            joinedload(Appointment.service)
-        )
-    )
-    appointments = appointments_result.scalars().all()
-    
-    # Получаем все услуги для этих приемов
-    services_data = []
-    total_amount = 0.0
+    # Все услуги по оплаченным приемам одним запросом, независимо от числа визитов
+    service_rows = await get_tax_deduction_services(db, year, [patient_id])
+    services_data = build_services_data(service_rows)
+    total_amount = sum(service["cost"] for service in services_data)
     
-    for appointment in appointments:
-        # Получаем услуги для этого приема
-        services_result = await db.execute(
-            select(Service)
-            .join(AppointmentService, Service.id == AppointmentService.service_id)
-            .where(AppointmentService.appointment_id == appointment.id)
-        )
-        services = services_result.scalars().all()
-        
-        for service in services:
-            service_date = appointment.start_time.strftime("%d.%m.%Y")
-            service_cost = float(service.cost) if service.cost else 0.0
-            total_amount += service_cost
-            
-            services_data.append({
-                "name": service.name,
-                "cost": service_cost,
-                "date": service_date
-            })
-    
-    # Данные клиники (в реальном приложении эти данные должны быть в базе или конфиге)
-    clinic_name = "ООО 'ДантиЗТ'"
-    clinic_inn = "7701234567"
-    clinic_address = "г. Москва, ул. Примерная, д. 1"
+    # Данные клиники
+    clinic_name = settings.CLINIC_NAME
+    clinic_inn = settings.CLINIC_INN
+    clinic_address = settings.CLINIC_ADDRESS
     
     # Генерируем номер справки
     certificate_number = f"{year}-{patient_id}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
     
     # Дата последнего платежа
-    last_payment_date = max(payments, key=lambda x: x.created_at).created_at.strftime("%d.%m.%Y")
+    last_payment_date = payment_summary.last_payment_at.strftime("%d.%m.%Y")
     
     # Данные сотрудника регистратуры
     staff_name = current_user.full_name
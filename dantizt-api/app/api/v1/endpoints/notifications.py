@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update, delete, and_
+from sqlalchemy import update, delete, and_, or_
 from typing import List, Optional
 from datetime import datetime
+import asyncio
+import json
 
+from app.core.config import settings
 from app.core.security import get_current_user
 from app.db.session import get_db
 from app.db.models import (
@@ -15,6 +19,8 @@ from app.schemas.notification import (
     NotificationUpdate,
     NotificationInDB
 )
+from app.services.notifications import get_unread_count
+from app.services.notification_hub import notification_hub
 
 router = APIRouter()
 
@@ -59,8 +65,11 @@ async def get_user_notifications(
             detail="You can only view your own notifications"
         )
     
-    # Формируем запрос
-    query = select(Notification).where(Notification.user_id == user_id)
+    # Формируем запрос. Отложенные уведомления показываем только после отправки
+    query = select(Notification).where(and_(
+        Notification.user_id == user_id,
+        or_(Notification.scheduled_for.is_(None), Notification.is_sent == True)
+    ))
     
     if unread_only:
         query = query.where(Notification.is_read == False)
@@ -95,15 +104,16 @@ async def mark_notification_as_read(
         )
     
     # Проверяем права доступа
-    if current_user.id != notification.user_id and current_user.role != UserRole.ADMIN:
+    if current_user.id != notification.user_id and current_user.role != UserRole.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can only mark your own notifications as read"
         )
     
-    # Отмечаем как прочитанное
+    # Отмечаем как прочитанное. Счетчик непрочитанных обновляется триггером
+    # в той же транзакции
     notification.is_read = True
-    notification.read_at = datetime.utcnow()
+    notification.updated_at = datetime.utcnow()
     
     await db.commit()
     await db.refresh(notification)
@@ -118,13 +128,14 @@ async def mark_all_notifications_as_read(
 ):
     """Отметить все уведомления пользователя как прочитанные"""
     # Проверяем права доступа
-    if current_user.id != user_id and current_user.role != UserRole.ADMIN:
+    if current_user.id != user_id and current_user.role != UserRole.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can only mark your own notifications as read"
         )
     
-    # Обновляем все непрочитанные уведомления
+    # Обновляем все непрочитанные уведомления одним оператором,
+    # триггер уменьшает счетчик пользователя на число измененных строк
     await db.execute(
         update(Notification)
         .where(and_(
@@ -133,7 +144,7 @@ async def mark_all_notifications_as_read(
         ))
         .values(
             is_read=True,
-            read_at=datetime.utcnow()
+            updated_at=datetime.utcnow()
         )
     )
     
@@ -175,20 +186,62 @@ async def get_unread_notifications_count(
 ):
     """Получить количество непрочитанных уведомлений"""
     # Проверяем права доступа
-    if current_user.id != user_id and current_user.role != UserRole.ADMIN:
+    if current_user.id != user_id and current_user.role != UserRole.admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You can only view your own notifications count"
         )
     
-    # Получаем количество непрочитанных уведомлений
-    result = await db.execute(
-        select(Notification)
-        .where(and_(
-            Notification.user_id == user_id,
-            Notification.is_read == False
-        ))
-    )
-    count = len(result.scalars().all())
+    # Получаем количество непрочитанных уведомлений по счетчику (поиск по первичному ключу)
+    count = await get_unread_count(db, user_id)
     
     return {"unread_count": count}
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@router.get("/stream")
+async def stream_notifications(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Поток уведомлений текущего пользователя (Server-Sent Events).
+
+    Сразу после подключения отправляет событие unread_count, затем новые
+    уведомления (created) и изменения счетчика (read, deleted, resync).
+    Пока событий нет, раз в NOTIFICATION_STREAM_HEARTBEAT секунд отправляется
+    комментарий, чтобы прокси не закрывали соединение.
+    """
+    user_id = current_user.id
+    unread_count = await get_unread_count(db, user_id)
+    
+    # Поток может быть открыт часами - возвращаем соединение с БД в пул
+    await db.close()
+    
+    queue = notification_hub.subscribe(user_id)
+    
+    async def event_stream():
+        try:
+            yield _sse_event("unread_count", {"unread_count": unread_count})
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.NOTIFICATION_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                yield _sse_event(event.get("event", "message"), event)
+        finally:
+            notification_hub.unsubscribe(user_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
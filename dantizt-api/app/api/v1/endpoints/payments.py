@@ -1,7 +1,7 @@
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, status as http_status, Request, Response
 from fastapi.responses import PlainTextResponse
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 from datetime import datetime
@@ -11,6 +11,7 @@ import logging
 
 from app.core.security import get_current_user
 from app.api.deps import get_db
+from app.db.session import AsyncSessionLocal, get_read_db
 from app.db.models import User, Payment, PaymentStatus, UserRole, Appointment, Doctor, Patient, AppointmentService, Service, Notification
 from app.core.metrics import track_payment
 from app.schemas.payment import PaymentCreate, PaymentUpdate, PaymentInDB, PaymentProcessSchema
@@ -34,7 +35,7 @@ async def get_payments(
     page: int = 1,
     limit: int = 10,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Получить список платежей с возможностью фильтрации и пагинации"""
     # Базовый запрос
@@ -90,7 +91,9 @@ async def get_payments(
     
     # Для каждого платежа получаем связанные услуги и создаем словари
     payments_data = []
+    amount_fixes = {}
     for payment in payments:
+        amount = payment.amount
         # Проверяем, нужно ли обновить сумму платежа
         if payment.amount == 0 and payment.appointment:
             # Получаем услуги для записи на прием
@@ -106,16 +109,15 @@ async def get_payments(
             
             # Если сумма платежа равна 0, обновляем её на основе стоимости услуг
             if total_cost > 0:
-                payment.amount = total_cost
-                await db.commit()
-                await db.refresh(payment)
+                amount = total_cost
+                amount_fixes[payment.id] = total_cost
         
         payment_dict = {
             "id": payment.id,
             "appointment_id": payment.appointment_id,
             "patient_id": payment.patient_id,
             "doctor_id": payment.doctor_id,
-            "amount": payment.amount,
+            "amount": amount,
             "status": payment.status,
             "payment_method": payment.payment_method,
             "created_at": payment.created_at,
@@ -183,6 +185,17 @@ async def get_payments(
         
         payments_data.append(payment_dict)
     
+    # Список может читаться с реплики, поэтому суммы сохраняются в основной базе
+    if amount_fixes:
+        async with AsyncSessionLocal() as write_db:
+            for payment_id, amount in amount_fixes.items():
+                await write_db.execute(
+                    update(Payment)
+                    .where(Payment.id == payment_id, Payment.amount == 0)
+                    .values(amount=amount)
+                )
+            await write_db.commit()
+    
     # Возвращаем данные в формате, который ожидает фронтенд
     return {
         "items": payments_data,
@@ -7,7 +7,7 @@ from typing import List, Optional
 from datetime import datetime, timedelta, time
 
 from app.core.security import get_current_user
-from app.db.session import get_db
+from app.db.session import get_read_db
 from app.db.models import (
     User, Doctor, Patient, Appointment, Payment,
     UserRole, AppointmentStatus, TreatmentStatus, PaymentStatus,
@@ -22,7 +22,7 @@ async def get_doctor_statistics(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Получить статистику врача
@@ -146,7 +146,7 @@ async def get_doctor_statistics(
 async def get_patient_statistics(
     patient_id: int,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Получить статистику пациента
@@ -247,7 +247,7 @@ async def get_patient_statistics(
 @router.get("/clinic")
 async def get_clinic_statistics(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Получить общую статистику клиники (только для администраторов)
@@ -331,7 +331,7 @@ async def get_clinic_statistics(
 @router.get("/reception/dashboard")
 async def get_reception_dashboard(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Получить статистику для дашборда регистратуры
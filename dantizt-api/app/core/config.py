@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Dict
 from functools import lru_cache
 import logging
 
@@ -39,6 +39,15 @@ class Settings(BaseSettings):
     POSTGRES_HOST: str
     POSTGRES_PORT: str
     
+    # Реплики для чтения: тяжелые чтения (get_read_db) идут на реплики с отставанием
+    # не больше REPLICA_MAX_LAG_SECONDS; после записи клиента его чтения
+    # READ_YOUR_WRITES_SECONDS секунд идут в основную базу
+    DATABASE_REPLICA_URLS: List[str] = []
+    REPLICA_POOL_SIZE: int = 10
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_LAG_CHECK_INTERVAL: float = 2.0
+    READ_YOUR_WRITES_SECONDS: int = 10
+    
     # JWT Settings
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
@@ -62,8 +71,99 @@ class Settings(BaseSettings):
     MAIL_FROM_NAME: str = "Dental Clinic"
     MAIL_PORT: int = 465
     MAIL_SERVER: str = "smtp.gmail.com"
+    MAIL_SSL_TLS: bool = True
+    MAIL_STARTTLS: bool = False
+    MAIL_USE_CREDENTIALS: bool = True
+    MAIL_TIMEOUT: int = 60
+
+    # Очередь исходящей почты
+    EMAIL_OUTBOX_ENABLED: bool = True
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_OUTBOX_POLL_INTERVAL: float = 2.0
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 8
+    EMAIL_OUTBOX_BACKOFF_BASE: int = 30
+    EMAIL_OUTBOX_BACKOFF_MAX: int = 3600
+    EMAIL_SMTP_IDLE_TIMEOUT: int = 60
+    # Аренда забранной пачки: если воркер упал во время отправки, письма
+    # возвращаются в очередь через столько секунд
+    EMAIL_OUTBOX_LEASE_SECONDS: int = 600
+
+    # Потоковая доставка уведомлений (SSE)
+    NOTIFICATION_STREAM_ENABLED: bool = True
+    NOTIFICATION_STREAM_QUEUE_SIZE: int = 100
+    NOTIFICATION_STREAM_HEARTBEAT: int = 25
+
+    # Диспетчер отложенных уведомлений
+    NOTIFICATION_DISPATCHER_ENABLED: bool = True
+    NOTIFICATION_DISPATCH_BATCH_SIZE: int = 100
+    NOTIFICATION_DISPATCH_POLL_INTERVAL: float = 10.0
+    NOTIFICATION_DISPATCH_EMAIL: bool = True
+
+    # Период сверки счетчиков непрочитанных уведомлений (0 - отключено)
+    NOTIFICATION_COUNTER_REPAIR_INTERVAL_HOURS: float = 24
+
+    # Аудит изменений в action_logs: row - построчный триггер, statement - пакетный
+    # триггер уровня оператора, off - без аудита. Режим можно переопределить для таблицы
+    AUDIT_MODE: str = "statement"
+    AUDIT_TABLE_MODES: Dict[str, str] = {}
+
+    # Секционирование action_logs и appointments: число заранее создаваемых секций,
+    # сроки хранения в месяцах (0 - хранить всегда) и схема для отсоединенных секций
+    PARTITION_MAINTENANCE_INTERVAL_HOURS: float = 6
+    PARTITION_PREMAKE: int = 3
+    ACTION_LOGS_RETENTION_MONTHS: int = 12
+    APPOINTMENTS_RETENTION_MONTHS: int = 0
+    PARTITION_ARCHIVE_SCHEMA: str = "archive"
+
+    # Журнал действий: выше порога количество записей берется из оценки планировщика,
+    # точные количества и справочник таблиц/действий кэшируются (секунды)
+    LOGS_EXACT_COUNT_THRESHOLD: int = 10000
+    LOGS_COUNT_CACHE_TTL: int = 60
+    LOGS_CATALOG_CACHE_TTL: int = 300
+
+    # Холодное хранилище журнала: отсоединенные секции action_logs выгружаются
+    # в сжатые куски JSONL (gzip или zstd) и удаляются из базы
+    LOGS_ARCHIVE_ENABLED: bool = True
+    LOGS_ARCHIVE_DIR: str = "log_archive"
+    LOGS_ARCHIVE_COMPRESSION: str = "gzip"
+    LOGS_ARCHIVE_CHUNK_ROWS: int = 50000
+
+    # Резервные копии: данные таблиц пишутся потоком COPY в сжатые gzip-куски,
+    # кусок закрывается после BACKUP_CHUNK_BYTES байт несжатых данных
+    BACKUP_DIR: str = "backups"
+    BACKUP_CHUNK_BYTES: int = 64 * 1024 * 1024
+    BACKUP_COMPRESSION_LEVEL: int = 6
+    # Параллельные соединения: выгрузка идет из общего снимка (pg_export_snapshot),
+    # а параллельная загрузка не атомарна, поэтому восстановление по умолчанию последовательное
+    BACKUP_WORKERS: int = 4
+    RESTORE_WORKERS: int = 1
+    # Сколько инкрементных копий подряд допускается, после них создается полная
+    BACKUP_MAX_INCREMENTALS: int = 6
+    # Скачивание копий: размер блока чтения и префикс внутреннего location nginx
+    # (X-Accel-Redirect); с префиксом файл отдает nginx через sendfile
+    BACKUP_DOWNLOAD_CHUNK_BYTES: int = 1024 * 1024
+    BACKUP_ACCEL_REDIRECT: str = ""
+
+    # Журнал запросов к БД: время каждого запроса идет в DB_QUERY_LATENCY, запросы
+    # дольше DB_SLOW_QUERY_MS пишутся в журнал медленных запросов с долей выборки,
+    # DB_ECHO_SAMPLE_RATE - доля остальных запросов в отладочном журнале (0 - выключено).
+    # Значения меняются на лету через /logs/db-query-logging и хранятся в файле состояния
+    DB_SLOW_QUERY_MS: int = 500
+    DB_SLOW_QUERY_SAMPLE_RATE: float = 1.0
+    DB_ECHO_SAMPLE_RATE: float = 0.0
+    DB_QUERY_LOG_STATE_FILE: str = "jobs/db_query_log.json"
+
+    # Период обновления метрик из базы (пользователи по ролям, записи на сегодня,
+    # неоплаченные платежи) на воркере-лидере, секунды (0 - отключено)
+    METRICS_REFRESH_INTERVAL: float = 60
+
+    # Шаблоны писем
+    EMAIL_DEFAULT_LOCALE: str = "ru"
+    EMAIL_TEMPLATE_CACHE_DIR: str = "email_template_cache"
 
     AUTO_CREATE_TABLES: bool = True
+    # Применить при запуске все наборы DDL, даже если их отпечатки не изменились
+    SCHEMA_BOOTSTRAP_FORCE: bool = False
 
     # Tinkoff API settings
     TINKOFF_TERMINAL_KEY: str = ""
@@ -73,6 +173,26 @@ class Settings(BaseSettings):
     TINKOFF_FAIL_URL: str = ""
     TINKOFF_NOTIFICATION_URL: str = ""
 
+    # Реквизиты клиники для справок налогового вычета
+    CLINIC_NAME: str = "ООО 'ДантиЗТ'"
+    CLINIC_INN: str = "7701234567"
+    CLINIC_ADDRESS: str = "г. Москва, ул. Примерная, д. 1"
+
+    # Дисковый кэш сгенерированных справок
+    CERTIFICATE_CACHE_DIR: str = "certificate_cache"
+    CERTIFICATE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+    # Массовое формирование справок
+    CERTIFICATE_BULK_DIR: str = "certificate_bulk"
+    CERTIFICATE_BULK_WORKERS: int = 4
+
+    # Директория со шрифтами для PDF (DejaVuSerif.ttf, DejaVuSerif-Bold.ttf),
+    # по умолчанию - системные шрифты из пакета fonts-dejavu-core
+    PDF_FONTS_DIR: str = "/usr/share/fonts/truetype/dejavu"
+
+    # Состояние фоновых задач
+    JOBS_DIR: str = "jobs"
+
     model_config = {
         "env_file": ".env",
         "extra": "ignore",
@@ -58,6 +58,17 @@ def setup_logging():
     sqlalchemy_logger.setLevel(logging.WARNING)
     sqlalchemy_logger.addHandler(file_handler)
     
+    # Журнал медленных запросов к БД пишется в отдельный файл
+    slow_query_handler = RotatingFileHandler(
+        logs_dir / "slow_queries.log",
+        maxBytes=10485760,  # 10MB
+        backupCount=5,
+        encoding="utf-8"
+    )
+    slow_query_handler.setFormatter(file_formatter)
+    slow_query_logger = logging.getLogger("app.db.slow_query")
+    slow_query_logger.addHandler(slow_query_handler)
+    
     # Configure API endpoints logger
     api_logger = logging.getLogger("app.api.v1.endpoints")
     api_logger.setLevel(logging.DEBUG)
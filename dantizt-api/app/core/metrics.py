@@ -1,12 +1,25 @@
-from prometheus_client import Counter, Gauge, Histogram, Summary
-from starlette_exporter import PrometheusMiddleware, handle_metrics
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from starlette_exporter import PrometheusMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
 from fastapi import FastAPI
+from functools import lru_cache
+import os
 import time
 from typing import Callable, Dict, List, Optional
 import logging
 import random
 logger = logging.getLogger(__name__)
 
+# Режим нескольких воркеров: при заданной PROMETHEUS_MULTIPROC_DIR каждый процесс
+# пишет значения метрик в свои mmap-файлы в этой директории, а /metrics суммирует
+# файлы всех воркеров. Директорию нужно очищать перед запуском воркеров.
+# Для датчиков задан multiprocess_mode: livesum - сумма по живым воркерам,
+# mostrecent - последнее записанное значение (датчики, которые выставляет один воркер)
+MULTIPROCESS_MODE = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
 REQUEST_COUNT = Counter(
     'dantizt_http_requests_total', 
     'Общее количество HTTP запросов',
@@ -23,7 +36,8 @@ REQUEST_LATENCY = Histogram(
 ACTIVE_REQUESTS = Gauge(
     'dantizt_http_requests_active',
     'Количество активных HTTP запросов',
-    ['method', 'endpoint']
+    ['method', 'endpoint'],
+    multiprocess_mode='livesum'
 )
 
 APPOINTMENT_COUNT = Counter(
@@ -35,7 +49,8 @@ APPOINTMENT_COUNT = Counter(
 DOCTOR_WORKLOAD = Gauge(
     'dantizt_doctor_workload',
     'Загруженность врачей (количество назначенных приемов)',
-    ['doctor_id', 'doctor_name']
+    ['doctor_id', 'doctor_name'],
+    multiprocess_mode='mostrecent'
 )
 
 PAYMENT_AMOUNT = Counter(
@@ -52,7 +67,33 @@ API_ERRORS = Counter(
 ACTIVE_USERS = Gauge(
     'dantizt_active_users',
     'Количество активных пользователей',
-    ['role']
+    ['role'],
+    multiprocess_mode='mostrecent'
+)
+
+APPOINTMENTS_TODAY = Gauge(
+    'dantizt_appointments_today',
+    'Записи на прием на сегодня по статусам',
+    ['status'],
+    multiprocess_mode='mostrecent'
+)
+
+PENDING_PAYMENTS = Gauge(
+    'dantizt_pending_payments',
+    'Количество неоплаченных платежей',
+    multiprocess_mode='mostrecent'
+)
+
+PENDING_PAYMENTS_AMOUNT = Gauge(
+    'dantizt_pending_payments_amount',
+    'Сумма неоплаченных платежей',
+    multiprocess_mode='mostrecent'
+)
+
+PENDING_PAYMENTS_OLDEST_AGE = Gauge(
+    'dantizt_pending_payments_oldest_age_seconds',
+    'Возраст самого старого неоплаченного платежа в секундах',
+    multiprocess_mode='mostrecent'
 )
 
 DB_QUERY_LATENCY = Histogram(
@@ -62,6 +103,24 @@ DB_QUERY_LATENCY = Histogram(
     buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.0]
 )
 
+@lru_cache()
+def scrape_registry() -> CollectorRegistry:
+    """Реестр для /metrics: в режиме нескольких воркеров - сбор из файлов всех процессов"""
+    if not MULTIPROCESS_MODE:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def handle_metrics(request: Request) -> Response:
+    # Синхронный обработчик: чтение файлов воркеров выполняется в пуле потоков
+    return Response(generate_latest(scrape_registry()), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+def mark_worker_dead(pid: Optional[int] = None):
+    """Удаляет live-датчики завершившегося воркера из общей директории метрик"""
+    if MULTIPROCESS_MODE:
+        multiprocess.mark_process_dead(pid or os.getpid())
+
 def setup_metrics(app: FastAPI):
     app.add_middleware(
         PrometheusMiddleware,
@@ -92,6 +151,14 @@ def track_db_query(operation: str, table: str, duration: float):
 def update_active_users(role: str, count: int):
     ACTIVE_USERS.labels(role=role).set(count)
 
+def update_appointments_today(status: str, count: int):
+    APPOINTMENTS_TODAY.labels(status=status).set(count)
+
+def update_pending_payments(count: int, amount: float, oldest_age: float):
+    PENDING_PAYMENTS.set(count)
+    PENDING_PAYMENTS_AMOUNT.set(amount)
+    PENDING_PAYMENTS_OLDEST_AGE.set(oldest_age)
+
 def track_api_error(error_type: str, endpoint: str):
     """
     Отслеживание ошибки API.
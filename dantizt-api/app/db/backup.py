@@ -1,134 +1,1191 @@
 import os
+import hashlib
 import logging
 import json
+import shutil
+import tempfile
+import threading
+import time
+import zlib
 import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2 import sql
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT, ISOLATION_LEVEL_REPEATABLE_READ
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from queue import Queue
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Формат потоковой резервной копии: файл данных из gzip-кусков с выводом
+# COPY TO STDOUT и манифест рядом с ним
+BACKUP_FORMAT = "copy-gzip"
+BACKUP_FORMAT_VERSION = 3
+DATA_SUFFIX = ".copy.gz"
+MANIFEST_SUFFIX = ".manifest.json"
+LEGACY_SUFFIX = ".json"
+
+# Таблицы, в которые строки только добавляются: инкрементная копия берет из них
+# строки, созданные после водяного знака
+APPEND_ONLY_TABLES = {"action_logs"}
+
+
+def default_connection_params() -> Dict[str, Any]:
+    """Параметры подключения psycopg2 из настроек приложения"""
+    return {
+        "host": settings.POSTGRES_HOST,
+        "port": settings.POSTGRES_PORT,
+        "user": settings.POSTGRES_USER,
+        "password": settings.POSTGRES_PASSWORD
+    }
+
+
+def manifest_path(backup_file: Path) -> Path:
+    """Путь к манифесту потоковой резервной копии"""
+    return backup_file.with_name(backup_file.name[:-len(DATA_SUFFIX)] + MANIFEST_SUFFIX)
+
+
+class _BackupProgress:
+    """
+    Счетчики хода выгрузки, общие для всех потоков параллельной выгрузки.
+
+    Вызов callback не чаще раза в INTERVAL секунд при записи данных
+    и после каждой выгруженной таблицы.
+    """
+
+    INTERVAL = 1.0
+
+    def __init__(self, callback: Callable[[Dict[str, Any]], None], tables_total: int):
+        self.callback = callback
+        self.tables_total = tables_total
+        self.tables_done = 0
+        self.rows = 0
+        self.raw_bytes = 0
+        self.bytes = 0
+        self._reported = time.monotonic()
+        self._lock = threading.Lock()
+
+    def advance(self, rows: int, raw_bytes: int, written: int) -> None:
+        with self._lock:
+            self.rows += rows
+            self.raw_bytes += raw_bytes
+            self.bytes += written
+            if time.monotonic() - self._reported >= self.INTERVAL:
+                self._report()
+
+    def table_done(self, table: str) -> None:
+        with self._lock:
+            self.tables_done += 1
+            self._report(table)
+
+    def _report(self, table: Optional[str] = None) -> None:
+        self._reported = time.monotonic()
+        state = {
+            "tables_done": self.tables_done,
+            "tables_total": self.tables_total,
+            "rows": self.rows,
+            "raw_bytes": self.raw_bytes,
+            "bytes": self.bytes
+        }
+        if table:
+            state["table"] = table
+        self.callback(state)
+
+
+class _HashingFile:
+    """Обертка над файлом копии: считает SHA-256 всего записанного"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        return self.f.write(data)
+
+    def tell(self) -> int:
+        return self.f.tell()
+
+
+class _GzipChunkWriter:
+    """
+    Файловый объект для cursor.copy_expert: сжимает поток COPY на лету.
+
+    Данные таблицы пишутся отдельными gzip-членами (кусками), кусок закрывается
+    на границе строки после chunk_bytes байт несжатых данных. Склейка gzip-членов -
+    корректный gzip-файл, а смещения кусков позволяют читать таблицы по отдельности.
+    COPY передает данные по строке, поэтому строки копятся в буфере и сжимаются
+    блоками WRITE_BLOCK байт. В памяти держатся только буфер и состояние компрессора.
+    Для каждого куска запоминается SHA-256 сжатых байт, по нему копию можно
+    проверить без распаковки и загрузки в базу.
+    """
+
+    WRITE_BLOCK = 256 * 1024
+
+    def __init__(self, out, chunk_bytes: int, level: int, progress: Optional[_BackupProgress] = None):
+        self.out = out
+        self.chunk_bytes = chunk_bytes
+        self.level = level
+        self.progress = progress
+        self.write_block = min(self.WRITE_BLOCK, chunk_bytes)
+        self.chunks: List[Dict[str, Any]] = []
+        self._compressor = None
+        self._hash = None
+        self._chunk: Dict[str, Any] = {}
+        self._pending = bytearray()
+
+    def write(self, data) -> int:
+        # Вызывается на каждую строку COPY, поэтому здесь только накопление
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._pending += data
+        if len(self._pending) >= self.write_block:
+            self._flush_pending()
+        return len(data)
+
+    def _emit(self, data: bytes) -> int:
+        self._hash.update(data)
+        self.out.write(data)
+        return len(data)
+
+    def _flush_pending(self) -> None:
+        if not self._pending:
+            return
+        if self._compressor is None:
+            # wbits=31 - формат gzip с заголовком и контрольной суммой
+            self._compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+            self._hash = hashlib.sha256()
+            self._chunk = {"offset": self.out.tell(), "length": 0, "rows": 0, "raw_bytes": 0}
+        # В текстовом формате COPY переводы строк внутри значений экранируются
+        rows = self._pending.count(b"\n")
+        self._chunk["rows"] += rows
+        self._chunk["raw_bytes"] += len(self._pending)
+        row_boundary = self._pending.endswith(b"\n")
+        written = self._emit(self._compressor.compress(self._pending))
+        if self.progress:
+            self.progress.advance(rows, len(self._pending), written)
+        self._pending.clear()
+        if self._chunk["raw_bytes"] >= self.chunk_bytes and row_boundary:
+            self._close_chunk()
+
+    def _close_chunk(self) -> None:
+        written = self._emit(self._compressor.flush())
+        if self.progress:
+            self.progress.advance(0, 0, written)
+        self._chunk["length"] = self.out.tell() - self._chunk["offset"]
+        self._chunk["sha256"] = self._hash.hexdigest()
+        self.chunks.append(self._chunk)
+        self._compressor = None
+
+    def finish_table(self) -> List[Dict[str, Any]]:
+        """Закрывает последний кусок таблицы и возвращает описания ее кусков"""
+        self._flush_pending()
+        if self._compressor is not None:
+            self._close_chunk()
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+class _GzipChunkReader:
+    """
+    Файловый объект для cursor.copy_expert FROM STDIN: распаковывает куски
+    таблицы по одному блоками READ_BLOCK байт. Если задан keep, из каждой
+    строки COPY оставляются только поля с этими номерами (колонки, удаленные
+    из схемы после создания копии).
+    """
+
+    READ_BLOCK = 1024 * 1024
+
+    def __init__(self, f, chunks: List[Dict[str, int]], keep: Optional[List[int]] = None):
+        self.f = f
+        self.chunks = list(chunks)
+        self.keep = keep
+        self._buffer = bytearray()
+        self._partial = b""
+        self._decompressor = None
+        self._remaining = 0
+
+    def _project(self, data: bytes) -> bytes:
+        data = self._partial + data
+        end = data.rfind(b"\n") + 1
+        self._partial = data[end:]
+        rows = []
+        for line in data[:end].split(b"\n")[:-1]:
+            # Табуляция внутри значений в текстовом формате COPY экранируется
+            fields = line.split(b"\t")
+            rows.append(b"\t".join(fields[index] for index in self.keep) + b"\n")
+        return b"".join(rows)
+
+    def _fill(self) -> bool:
+        while not self._buffer:
+            if self._decompressor is None:
+                if not self.chunks:
+                    return False
+                chunk = self.chunks.pop(0)
+                self.f.seek(chunk["offset"])
+                self._remaining = chunk["length"]
+                self._decompressor = zlib.decompressobj(31)
+            if self._remaining:
+                data = self.f.read(min(self.READ_BLOCK, self._remaining))
+                if not data:
+                    raise ValueError("Backup file is truncated")
+                self._remaining -= len(data)
+                data = self._decompressor.decompress(data)
+            else:
+                data = self._decompressor.flush()
+                self._decompressor = None
+            self._buffer += self._project(data) if self.keep is not None else data
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._buffer and not self._fill():
+            return b""
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+class _RestorePlan:
+    """Что восстанавливается и что создается заново после загрузки"""
+
+    def __init__(self, tables, increments, target, foreign_keys, indexes):
+        # Таблицы полной копии в порядке загрузки и колонки таблиц в базе
+        self.tables: List[Dict[str, Any]] = tables
+        # Инкрементные копии цепочки по порядку: (файл, таблицы)
+        self.increments: List[Tuple[Path, List[Dict[str, Any]]]] = increments
+        self.target: Dict[str, List[Dict[str, str]]] = target
+        # (таблица в виде regclass, имя, определение, таблица, родительская таблица)
+        self.foreign_keys: List[Tuple[str, str, str, str, str]] = foreign_keys
+        # (таблица, имя, определение)
+        self.indexes: List[Tuple[str, str, str]] = indexes
+        self.tables_total = len(tables) + sum(len(tables) for _, tables in increments)
+        self.tables_done = 0
+        self._lock = threading.Lock()
+
+    @property
+    def names(self) -> List[str]:
+        names = [table["name"] for table in self.tables]
+        for _, tables in self.increments:
+            names.extend(table["name"] for table in tables if table["name"] not in names)
+        return names
+
+    def report(self, progress: Optional[Callable[[Dict[str, Any]], None]], table: str, rows: int, backup: str) -> None:
+        with self._lock:
+            self.tables_done += 1
+            if progress:
+                progress({
+                    "backup": backup,
+                    "table": table,
+                    "rows": rows,
+                    "tables_done": self.tables_done,
+                    "tables_total": self.tables_total
+                })
+
+
+def _table_weight(table: Dict[str, Any]) -> int:
+    return sum(chunk["raw_bytes"] for chunk in table["chunks"])
+
+
+def restore_order(tables: List[Dict[str, Any]], foreign_keys: List[Tuple[str, str, str, str, str]]) -> List[Dict[str, Any]]:
+    """
+    Порядок загрузки таблиц: родительские таблицы внешних ключей раньше дочерних,
+    среди готовых к загрузке - крупные первыми. Внешний ключ создается, как только
+    загружены обе его таблицы, поэтому проверки ключей идут параллельно с
+    загрузкой остальных таблиц. Циклы ключей разрываются в пользу крупных таблиц.
+    """
+    remaining = {table["name"]: table for table in tables}
+    parents: Dict[str, set] = {name: set() for name in remaining}
+    for _, _, _, table, referenced in foreign_keys:
+        if table in parents and referenced != table:
+            parents[table].add(referenced)
+
+    order = []
+    while remaining:
+        ready = [table for name, table in remaining.items() if not parents[name] & remaining.keys()]
+        if not ready:
+            ready = list(remaining.values())
+        for table in sorted(ready, key=_table_weight, reverse=True):
+            order.append(table)
+            del remaining[table["name"]]
+    return order
+
+
+# Кэш списка копий по директориям: {директория: (mtime_ns директории, записи)}
+_index_cache: Dict[str, Tuple[int, List[Dict[str, Any]]]] = {}
+# Директория, измененная менее чем INDEX_SETTLE_NS назад, не кэшируется: за тот же
+# тик часов ядра она могла измениться еще раз без изменения mtime
+INDEX_SETTLE_NS = 1_000_000_000
+
+
 class DatabaseBackup:
-    def __init__(self, db_name: str, backup_dir: str = "backups"):
+    def __init__(
+        self,
+        db_name: str,
+        backup_dir: Optional[str] = None,
+        connection_params: Optional[Dict[str, Any]] = None
+    ):
         """
         Инициализация менеджера резервных копий
-        
+
         :param db_name: Имя базы данных
-        :param backup_dir: Директория для хранения резервных копий
+        :param backup_dir: Директория для хранения резервных копий (по умолчанию BACKUP_DIR)
+        :param connection_params: Параметры подключения psycopg2 без имени базы
         """
         self.db_name = db_name
-        self.backup_dir = Path(backup_dir)
+        self.backup_dir = Path(backup_dir or settings.BACKUP_DIR)
         self.backup_dir.mkdir(parents=True, exist_ok=True)
+        self.connection_params = connection_params or default_connection_params()
+
+    def _connect(self, dbname: Optional[str] = None):
+        return psycopg2.connect(dbname=dbname or self.db_name, **self.connection_params)
+
+    def _snapshot_connection(self, snapshot: Optional[str] = None):
+        """Соединение в транзакции REPEATABLE READ только для чтения, при необходимости - на общем снимке"""
+        conn = self._connect()
+        conn.set_session(isolation_level=ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+        if snapshot:
+            with conn.cursor() as cursor:
+                cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+        return conn
+
+    @staticmethod
+    def _list_tables(cursor) -> List[Tuple[str, List[Dict[str, str]]]]:
+        """Таблицы схемы public с колонками. Секции выгружаются через родительскую таблицу"""
+        cursor.execute("""
+            SELECT c.oid, c.relname FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+            ORDER BY c.relname
+        """)
+        tables = []
+        for oid, name in cursor.fetchall():
+            cursor.execute("""
+                SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute
+                WHERE attrelid = %s AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+                ORDER BY attnum
+            """, (oid,))
+            columns = [{"name": column, "type": column_type} for column, column_type in cursor.fetchall()]
+            tables.append((name, columns))
+        return tables
+
+    @staticmethod
+    def _table_sizes(cursor) -> Dict[str, int]:
+        """Размеры таблиц схемы public вместе с секциями"""
+        cursor.execute("""
+            SELECT c.relname, (SELECT sum(pg_total_relation_size(relid)) FROM pg_partition_tree(c.oid))
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+        """)
+        return {name: size or 0 for name, size in cursor.fetchall()}
 
-    def create_backup(self) -> Path:
+    @staticmethod
+    def _primary_keys(cursor) -> Dict[str, List[str]]:
+        """Колонки первичных ключей таблиц схемы public"""
+        cursor.execute("""
+            SELECT c.relname, array_agg(a.attname::text ORDER BY k.ord)
+            FROM pg_index x
+            JOIN pg_class c ON c.oid = x.indrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            CROSS JOIN LATERAL unnest(x.indkey) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+            WHERE x.indisprimary AND n.nspname = 'public' AND NOT c.relispartition
+            GROUP BY c.relname
+        """)
+        return dict(cursor.fetchall())
+
+    @staticmethod
+    def _sequence_values(cursor) -> Dict[str, Dict[str, Optional[int]]]:
+        """Последние выданные значения последовательностей колонок: таблица -> колонка -> значение"""
+        cursor.execute("""
+            SELECT c.relname, a.attname, s.last_value
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+            JOIN pg_sequences s ON format('%I.%I', s.schemaname, s.sequencename)
+                = pg_get_serial_sequence(format('%I.%I', n.nspname, c.relname), a.attname)
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+        """)
+        sequences: Dict[str, Dict[str, Optional[int]]] = {}
+        for table, column, value in cursor.fetchall():
+            sequences.setdefault(table, {})[column] = value
+        return sequences
+
+    @staticmethod
+    def _audited_tables(cursor) -> set:
+        """Таблицы, все изменения которых попадают в action_logs (см. app/db/triggers.py)"""
+        cursor.execute("""
+            SELECT c.relname FROM pg_trigger t
+            JOIN pg_class c ON c.oid = t.tgrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND t.tgenabled <> 'D'
+            AND t.tgname IN ('audit_trigger', 'audit_insert_trigger', 'audit_update_trigger', 'audit_delete_trigger')
+            GROUP BY c.relname
+            HAVING bool_or(t.tgname = 'audit_trigger') OR count(*) = 3
+        """)
+        return {name for name, in cursor.fetchall()}
+
+    def _table_jobs(
+        self,
+        cursor,
+        tables: List[Tuple[str, List[Dict[str, str]]]],
+        parent: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
         """
-        Создание резервной копии базы данных с использованием psycopg2
-        
-        :return: Путь к файлу резервной копии
+        Что выгружать из каждой таблицы.
+
+        В полной копии и в инкрементной для новых таблиц и таблиц без журнала
+        изменений выгружается вся таблица (full). В инкрементной копии таблицы,
+        изменения которых журналируются в action_logs, выгружаются только строки,
+        измененные начиная с водяного знака родительской копии, и номера удаленных
+        строк (delta); из журнала, в который строки только добавляются, - новые строки (append).
+
+        Граница включительная: водяной знак равен началу самой старой открытой
+        транзакции, а ее строки помечены тем же CURRENT_TIMESTAMP. Строки, уже
+        попавшие в родительскую копию, при восстановлении просто заменяются.
+        """
+        keys = self._primary_keys(cursor)
+        audited = self._audited_tables(cursor) if parent else set()
+        sequences = self._sequence_values(cursor)
+        parent_tables = {table["name"] for table in parent["tables"]} if parent else set()
+
+        jobs = []
+        for table, columns in tables:
+            job = {
+                "name": table, "columns": columns, "mode": "full", "key": keys.get(table, []),
+                "sequences": sequences.get(table, {}), "where": None, "tombstones": None
+            }
+            names = {column["name"] for column in columns}
+            if table in parent_tables:
+                since = sql.SQL("{}::timestamptz").format(sql.Literal(parent["watermark"]))
+                if table in APPEND_ONLY_TABLES and job["key"] and "created_at" in names:
+                    job.update(mode="append", where=sql.SQL("created_at >= {}").format(since))
+                elif table in audited and job["key"] == ["id"]:
+                    conditions = [sql.SQL("""id IN (
+                        SELECT record_id FROM action_logs
+                        WHERE table_name = {name} AND action_type IN ('INSERT', 'UPDATE') AND created_at >= {since}
+                    )""").format(name=sql.Literal(table), since=since)]
+                    conditions.extend(
+                        sql.SQL("{} >= {}").format(sql.Identifier(column), since)
+                        for column in ("updated_at", "created_at") if column in names
+                    )
+                    job.update(
+                        mode="delta",
+                        where=sql.SQL(" OR ").join(conditions),
+                        # Удаленные начиная с водяного знака строки, которых нет в снимке
+                        tombstones=sql.SQL("""
+                            SELECT DISTINCT l.record_id FROM action_logs l
+                            WHERE l.table_name = {name} AND l.action_type = 'DELETE'
+                            AND l.created_at >= {since} AND l.record_id IS NOT NULL
+                            AND NOT EXISTS (SELECT 1 FROM public.{table} t WHERE t.id = l.record_id)
+                        """).format(name=sql.Literal(table), since=since, table=sql.Identifier(table))
+                    )
+            jobs.append(job)
+        return jobs
+
+    def _dump_table(self, conn, writer: _GzipChunkWriter, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Выгружает таблицу (или ее изменения) потоком COPY TO STDOUT через сжимающий writer"""
+        query = sql.SQL("SELECT {columns} FROM public.{table}").format(
+            columns=sql.SQL(", ").join(sql.Identifier(column["name"]) for column in job["columns"]),
+            table=sql.Identifier(job["name"])
+        )
+        if job["where"] is not None:
+            query = sql.SQL("{} WHERE {}").format(query, job["where"])
+        with conn.cursor() as cursor:
+            cursor.copy_expert(sql.SQL("COPY ({}) TO STDOUT").format(query).as_string(conn), writer)
+            chunks = writer.finish_table()
+            table = {
+                "name": job["name"],
+                "columns": job["columns"],
+                "mode": job["mode"],
+                "key": job["key"],
+                "sequences": job["sequences"],
+                "rows": sum(chunk["rows"] for chunk in chunks),
+                "chunks": chunks
+            }
+            if job["tombstones"] is not None:
+                cursor.copy_expert(sql.SQL("COPY ({}) TO STDOUT").format(job["tombstones"]).as_string(conn), writer)
+                chunks = writer.finish_table()
+                table["tombstones"] = {"rows": sum(chunk["rows"] for chunk in chunks), "chunks": chunks}
+        if writer.progress:
+            writer.progress.table_done(job["name"])
+        logger.info(f"Backed up {table['rows']} rows of {job['name']} ({job['mode']})")
+        return table
+
+    def _dump_part(
+        self, connections: Queue, part_file: Path, job: Dict[str, Any], progress: Optional[_BackupProgress]
+    ) -> Dict[str, Any]:
+        """Выгружает таблицу в отдельный файл на свободном соединении пула"""
+        conn = connections.get()
+        try:
+            with open(part_file, "wb") as out:
+                writer = _GzipChunkWriter(
+                    out, settings.BACKUP_CHUNK_BYTES, settings.BACKUP_COMPRESSION_LEVEL, progress
+                )
+                return self._dump_table(conn, writer, job)
+        finally:
+            connections.put(conn)
+
+    def _dump_parallel(
+        self, conn, jobs: List[Dict[str, Any]], out, workers: int, progress: Optional[_BackupProgress] = None
+    ) -> List[Dict[str, Any]]:
         """
+        Параллельная выгрузка таблиц на workers соединениях.
+
+        Соединения импортируют снимок ведущей транзакции (pg_export_snapshot), поэтому
+        копия так же согласована, как при выгрузке в одной транзакции. Ведущая
+        транзакция остается открытой до конца выгрузки, иначе снимок пропадет.
+        Каждая таблица пишется в свой временный файл, затем файлы склеиваются
+        в порядке таблиц со сдвигом смещений кусков.
+        """
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_export_snapshot()")
+            snapshot = cursor.fetchone()[0]
+            sizes = self._table_sizes(cursor)
+
+        parts_dir = Path(tempfile.mkdtemp(prefix=".parts_", dir=self.backup_dir))
+        connections: Queue = Queue()
+        opened = []
+        try:
+            for _ in range(min(workers, len(jobs))):
+                opened.append(self._snapshot_connection(snapshot))
+                connections.put(opened[-1])
+
+            with ThreadPoolExecutor(max_workers=len(opened)) as pool:
+                futures = {}
+                # Крупные таблицы первыми, чтобы в конце не ждать одну большую
+                for index, job in sorted(enumerate(jobs), key=lambda item: -sizes.get(item[1]["name"], 0)):
+                    futures[index] = pool.submit(
+                        self._dump_part, connections, parts_dir / f"{index}.gz", job, progress
+                    )
+                dumped = [futures[index].result() for index in range(len(jobs))]
+
+            for index, table in enumerate(dumped):
+                base = out.tell()
+                for chunk in table["chunks"] + table.get("tombstones", {}).get("chunks", []):
+                    chunk["offset"] += base
+                with open(parts_dir / f"{index}.gz", "rb") as part:
+                    shutil.copyfileobj(part, out, 1024 * 1024)
+            return dumped
+        finally:
+            for worker_conn in opened:
+                worker_conn.close()
+            shutil.rmtree(parts_dir, ignore_errors=True)
+
+    def _write_manifest(self, backup_file: Path, manifest: Dict[str, Any]) -> None:
+        path = manifest_path(backup_file)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def read_manifest(self, backup_file: Path) -> Dict[str, Any]:
+        with open(manifest_path(backup_file), encoding="utf-8") as f:
+            return json.load(f)
+
+    def backup_chain(self, backup_file: Path) -> List[Path]:
+        """
+        Цепочка копий, нужная для восстановления: полная копия и инкрементные
+        копии по порядку, последняя - сама backup_file
+        """
+        chain = [backup_file]
+        manifest = self.read_manifest(backup_file)
+        while manifest.get("kind") == "incremental":
+            parent = self.backup_dir / manifest["parent"]
+            if not manifest_path(parent).exists() or not parent.exists():
+                raise FileNotFoundError(f"Backup {manifest['parent']} from the chain of {backup_file.name} is missing")
+            chain.insert(0, parent)
+            manifest = self.read_manifest(parent)
+        return chain
+
+    def _incremental_parent(self) -> Optional[Path]:
+        """Последняя целая потоковая копия этой базы, если ее цепочка не слишком длинная"""
+        for backup in self.list_backups():
+            if not backup.name.endswith(DATA_SUFFIX):
+                continue
+            manifest = self.read_manifest(backup)
+            if manifest.get("database") != self.db_name or "watermark" not in manifest:
+                continue
+            try:
+                chain = self.backup_chain(backup)
+            except FileNotFoundError as e:
+                logger.warning(f"Skipping broken backup chain: {e}")
+                continue
+            # После BACKUP_MAX_INCREMENTALS инкрементных копий делается полная
+            if len(chain) > settings.BACKUP_MAX_INCREMENTALS:
+                return None
+            return backup
+        return None
+
+    def _new_backup_file(self) -> Path:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = self.backup_dir / f"backup_{self.db_name}_{timestamp}.json"
-        
+        name = f"backup_{self.db_name}_{timestamp}"
+        backup_file = self.backup_dir / f"{name}{DATA_SUFFIX}"
+        number = 1
+        # Несколько копий в одну секунду (инкрементные копии бывают частыми)
+        while backup_file.exists() or manifest_path(backup_file).exists():
+            backup_file = self.backup_dir / f"{name}_{number}{DATA_SUFFIX}"
+            number += 1
+        return backup_file
+
+    def create_backup(
+        self,
+        workers: Optional[int] = None,
+        incremental: bool = False,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Path:
+        """
+        Создание резервной копии базы данных потоком COPY TO STDOUT
+
+        Все таблицы читаются из одного снимка REPEATABLE READ, поэтому копия
+        согласована. Данные сжимаются на лету и сразу пишутся на диск, память
+        не зависит от размера таблиц. Манифест пишется последним: копия без
+        манифеста считается незавершенной.
+
+        Инкрементная копия хранит только изменения после водяного знака
+        предыдущей копии (см. _table_jobs) и ссылку на нее в манифесте. Водяной
+        знак - начало самой старой транзакции, открытой в момент снимка: строки
+        незавершенных тогда транзакций попадут в следующую копию.
+        Если предыдущей копии нет, создается полная.
+
+        :param workers: Число параллельных соединений (по умолчанию BACKUP_WORKERS)
+        :param incremental: Создать инкрементную копию
+        :param progress: Получает счетчики выгрузки: таблицы, строки, байты
+        :return: Путь к файлу данных резервной копии
+        """
+        workers = workers or settings.BACKUP_WORKERS
+        parent = self._incremental_parent() if incremental else None
+        parent_manifest = self.read_manifest(parent) if parent else None
+        backup_file = self._new_backup_file()
+        tmp_file = backup_file.with_name(backup_file.name + ".part")
+
         try:
-            # Получаем параметры подключения к базе данных из переменных окружения
-            from app.core.config import settings
-            
-            db_host = settings.POSTGRES_HOST
-            db_port = settings.POSTGRES_PORT
-            db_user = settings.POSTGRES_USER
-            db_password = settings.POSTGRES_PASSWORD
-            db_name = self.db_name
-            
-            # Подключаемся к базе данных
-            conn = psycopg2.connect(
-                host=db_host,
-                port=db_port,
-                user=db_user,
-                password=db_password,
-                dbname=db_name
-            )
-            
-            # Получаем список всех таблиц в базе данных
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_schema = 'public'
-                """)
-                tables = [row[0] for row in cursor.fetchall()]
-            
-            # Создаем структуру для хранения данных
-            backup_data = {
-                "metadata": {
-                    "database": self.db_name,
-                    "created_at": datetime.now().isoformat(),
-                    "version": "1.0",
-                    "tables": tables
-                },
-                "tables": {}
-            }
-            
-            # Для каждой таблицы получаем структуру и данные
-            for table in tables:
+            conn = self._snapshot_connection()
+            try:
                 with conn.cursor() as cursor:
-                    # Получаем структуру таблицы
-                    cursor.execute(f"""
-                        SELECT column_name, data_type 
-                        FROM information_schema.columns 
-                        WHERE table_name = '{table}'
+                    cursor.execute("""
+                        SELECT least(now(), (
+                            SELECT min(xact_start) FROM pg_stat_activity
+                            WHERE datname = current_database() AND xact_start IS NOT NULL
+                        ))
                     """)
-                    columns = [(row[0], row[1]) for row in cursor.fetchall()]
-                    
-                    # Получаем данные таблицы
-                    cursor.execute(f"SELECT * FROM {table}")
-                    rows = cursor.fetchall()
-                    
-                    # Преобразуем данные в список словарей
-                    table_data = []
-                    for row in rows:
-                        row_dict = {}
-                        for i, col in enumerate(columns):
-                            # Преобразуем типы данных, которые не сериализуются в JSON
-                            value = row[i]
-                            if isinstance(value, datetime):
-                                value = value.isoformat()
-                            elif hasattr(value, '__str__'):
-                                value = str(value)
-                            row_dict[col[0]] = value
-                        table_data.append(row_dict)
-                    
-                    # Добавляем данные таблицы в общую структуру
-                    backup_data["tables"][table] = {
-                        "columns": columns,
-                        "data": table_data
-                    }
-            
-            conn.close()
-            
-            # Сохраняем данные в JSON-файл
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                json.dump(backup_data, f, indent=4, ensure_ascii=False)
-                f.flush()
-                os.fsync(f.fileno())
-            
+                    watermark = cursor.fetchone()[0]
+                    jobs = self._table_jobs(cursor, self._list_tables(cursor), parent_manifest)
+
+                counters = _BackupProgress(progress, len(jobs)) if progress else None
+                with open(tmp_file, "wb") as f:
+                    out = _HashingFile(f)
+                    if workers > 1 and len(jobs) > 1:
+                        dumped = self._dump_parallel(conn, jobs, out, workers, counters)
+                    else:
+                        writer = _GzipChunkWriter(
+                            out, settings.BACKUP_CHUNK_BYTES, settings.BACKUP_COMPRESSION_LEVEL, counters
+                        )
+                        dumped = [self._dump_table(conn, writer, job) for job in jobs]
+                    f.flush()
+                    os.fsync(f.fileno())
+                conn.rollback()
+            finally:
+                conn.close()
+
+            os.replace(tmp_file, backup_file)
+            self._write_manifest(backup_file, {
+                "format": BACKUP_FORMAT,
+                "version": BACKUP_FORMAT_VERSION,
+                "kind": "incremental" if parent else "full",
+                "database": self.db_name,
+                "created_at": datetime.now().isoformat(),
+                "watermark": watermark.isoformat(),
+                "parent": parent.name if parent else None,
+                "chain": (parent_manifest.get("chain", [parent.name]) if parent else []) + [backup_file.name],
+                "size_bytes": backup_file.stat().st_size,
+                "sha256": out.sha256.hexdigest(),
+                "tables": dumped
+            })
+
             logger.info(f"Backup created successfully: {backup_file}")
-            
-            # Проверяем, что файл существует
-            if backup_file.exists():
-                logger.info(f"Backup file confirmed on disk: {backup_file}")
-            else:
-                logger.warning(f"Backup file not found after creation: {backup_file}")
-            
             return backup_file
-            
+
         except Exception as e:
+            tmp_file.unlink(missing_ok=True)
             logger.error(f"Failed to create backup: {e}")
             raise
 
-    def restore_backup(self, backup_file: Path) -> None:
+    def verify_backup(self, backup_file: Path, deep: bool = False) -> Dict[str, Any]:
+        """
+        Проверка потоковой резервной копии без загрузки в базу
+
+        Файл читается один раз: куски должны идти подряд без промежутков,
+        их SHA-256 и SHA-256 всего файла сверяются с манифестом, число строк
+        таблиц - с суммой строк кусков. При deep каждый кусок еще и распаковывается:
+        gzip проверяет свою CRC32, а число строк и несжатый размер сверяются
+        с манифестом. Копии без контрольных сумм (созданные до их появления)
+        проверяются только по смещениям и, при deep, по содержимому.
+
+        :param backup_file: Путь к файлу данных резервной копии
+        :param deep: Распаковывать куски
+        :return: Итог проверки: valid, errors и счетчики
+        """
+        if not backup_file.name.endswith(DATA_SUFFIX):
+            raise ValueError(f"Only streaming backups can be verified: {backup_file.name}")
+        manifest = self.read_manifest(backup_file)
+        errors = []
+
+        try:
+            chain = [path.name for path in self.backup_chain(backup_file)]
+        except FileNotFoundError as e:
+            chain = []
+            errors.append(str(e))
+
+        chunks = []
+        for table in manifest["tables"]:
+            table_chunks = table["chunks"] + table.get("tombstones", {}).get("chunks", [])
+            if sum(chunk["rows"] for chunk in table["chunks"]) != table["rows"]:
+                errors.append(f"{table['name']}: row count does not match its chunks")
+            chunks.extend((table["name"], chunk) for chunk in table_chunks)
+        chunks.sort(key=lambda item: item[1]["offset"])
+
+        size = backup_file.stat().st_size
+        if size != manifest.get("size_bytes", size):
+            errors.append(f"File size {size} does not match the manifest ({manifest['size_bytes']})")
+
+        file_hash = hashlib.sha256()
+        position = 0
+        with open(backup_file, "rb") as f:
+            for name, chunk in chunks:
+                if chunk["offset"] != position:
+                    errors.append(f"{name}: chunk at {chunk['offset']} does not follow the previous one ({position})")
+                    f.seek(chunk["offset"])
+                data = f.read(chunk["length"])
+                position = chunk["offset"] + len(data)
+                file_hash.update(data)
+                if len(data) != chunk["length"]:
+                    errors.append(f"{name}: chunk at {chunk['offset']} is truncated")
+                    continue
+                if "sha256" in chunk and hashlib.sha256(data).hexdigest() != chunk["sha256"]:
+                    errors.append(f"{name}: checksum mismatch in chunk at {chunk['offset']}")
+                    continue
+                if deep:
+                    error = self._verify_chunk_data(data, chunk)
+                    if error:
+                        errors.append(f"{name}: {error} in chunk at {chunk['offset']}")
+        if position != size:
+            errors.append(f"Data file has {size - position} bytes after the last chunk")
+        if "sha256" in manifest and not errors and file_hash.hexdigest() != manifest["sha256"]:
+            errors.append("File checksum does not match the manifest")
+
+        return {
+            "filename": backup_file.name,
+            "valid": not errors,
+            "deep": deep,
+            "checksums": "sha256" in manifest,
+            "chain": chain,
+            "size_bytes": size,
+            "tables": len(manifest["tables"]),
+            "chunks": len(chunks),
+            "rows": sum(table["rows"] for table in manifest["tables"]),
+            "errors": errors
+        }
+
+    @staticmethod
+    def _verify_chunk_data(data: bytes, chunk: Dict[str, Any]) -> Optional[str]:
+        """Распаковывает кусок по частям и сверяет строки и размер с манифестом"""
+        decompressor = zlib.decompressobj(31)
+        rows = raw_bytes = 0
+        try:
+            for start in range(0, len(data), 1024 * 1024):
+                block = decompressor.decompress(data[start:start + 1024 * 1024])
+                rows += block.count(b"\n")
+                raw_bytes += len(block)
+            block = decompressor.flush()
+            rows += block.count(b"\n")
+            raw_bytes += len(block)
+        except zlib.error as e:
+            return f"corrupted gzip data ({e})"
+        if not decompressor.eof or decompressor.unused_data:
+            return "incomplete gzip member"
+        if (rows, raw_bytes) != (chunk["rows"], chunk["raw_bytes"]):
+            return f"{rows} rows / {raw_bytes} bytes instead of {chunk['rows']} / {chunk['raw_bytes']}"
+        return None
+
+    def restore_backup(
+        self,
+        backup_file: Path,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        workers: Optional[int] = None
+    ) -> None:
+        """
+        Восстановление базы данных из резервной копии
+
+        :param backup_file: Путь к файлу резервной копии
+        :param progress: Вызывается после загрузки каждой таблицы
+        :param workers: Число параллельных соединений (по умолчанию RESTORE_WORKERS)
+        """
+        if not backup_file.exists():
+            raise FileNotFoundError(f"Backup file not found: {backup_file}")
+        if backup_file.name.endswith(DATA_SUFFIX):
+            self._restore_streaming(backup_file, progress, workers or settings.RESTORE_WORKERS)
+        else:
+            self._restore_legacy_json(backup_file)
+
+    @staticmethod
+    def _deferred_objects(cursor, table_oids: List[int]) -> Tuple[List[Tuple[str, str, str, str, str]], List[Tuple[str, str, str]]]:
+        """
+        Внешние ключи и вторичные индексы восстанавливаемых таблиц.
+        Они удаляются перед загрузкой и создаются заново после нее: построить индекс
+        по загруженной таблице и проверить ключ одним запросом быстрее, чем
+        обновлять их на каждую строку COPY.
+        """
+        # conparentid = 0 - ключи секций удаляются и создаются вместе с ключом родителя
+        cursor.execute("""
+            SELECT con.conrelid::regclass::text, con.conname, pg_get_constraintdef(con.oid),
+                   t.relname, r.relname
+            FROM pg_constraint con
+            JOIN pg_class t ON t.oid = con.conrelid
+            JOIN pg_class r ON r.oid = con.confrelid
+            WHERE con.contype = 'f' AND con.conparentid = 0
+            AND (con.conrelid = ANY(%s) OR con.confrelid = ANY(%s))
+            ORDER BY con.conrelid::regclass::text, con.conname
+        """, (table_oids, table_oids))
+        foreign_keys = cursor.fetchall()
+        # Индексы первичных ключей и ограничений уникальности остаются на месте
+        cursor.execute("""
+            SELECT t.relname, i.relname, pg_get_indexdef(x.indexrelid)
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            JOIN pg_class t ON t.oid = x.indrelid
+            WHERE x.indrelid = ANY(%s)
+            AND NOT EXISTS (
+                SELECT 1 FROM pg_constraint con
+                WHERE con.conindid = x.indexrelid AND con.contype IN ('p', 'u', 'x')
+            )
+            ORDER BY i.relname
+        """, (table_oids,))
+        indexes = cursor.fetchall()
+        return foreign_keys, indexes
+
+    @staticmethod
+    def _reset_sequences(cursor, table: Dict[str, Any]) -> None:
+        """
+        Продвигает последовательности колонок таблицы за максимальное значение
+        и за значение на момент создания копии: номера удаленных строк не должны
+        выдаваться снова, на них ссылаются журнал действий и инкрементные копии
+        """
+        recorded = table.get("sequences", {})
+        cursor.execute("""
+            SELECT a.attname, pg_get_serial_sequence(format('public.%%I', c.relname), a.attname)
+            FROM pg_attribute a
+            JOIN pg_class c ON c.oid = a.attrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relname = %s AND a.attnum > 0 AND NOT a.attisdropped
+        """, (table["name"],))
+        for column, sequence in cursor.fetchall():
+            if sequence:
+                cursor.execute(
+                    sql.SQL("""
+                        SELECT setval(%s, GREATEST(
+                            COALESCE((SELECT max({column}) FROM public.{table}), 0), COALESCE(%s, 0)
+                        ) + 1, false)
+                    """).format(column=sql.Identifier(column), table=sql.Identifier(table["name"])),
+                    (sequence, recorded.get(column))
+                )
+
+    @staticmethod
+    def _create_index(cursor, definition: str) -> None:
+        # Индекс секционированной таблицы создается сразу на всех секциях
+        cursor.execute(definition.replace(" ON ONLY ", " ON ", 1))
+
+    @staticmethod
+    def _add_foreign_key(cursor, foreign_key: Tuple[str, str, str, str, str]) -> None:
+        relation, name, definition = foreign_key[:3]
+        cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} {}").format(
+            sql.SQL(relation), sql.Identifier(name), sql.SQL(definition)
+        ))
+
+    @staticmethod
+    def _set_triggers(cursor, names: List[str], enabled: bool) -> None:
+        action = sql.SQL("ENABLE" if enabled else "DISABLE")
+        for name in names:
+            cursor.execute(sql.SQL("ALTER TABLE public.{} {} TRIGGER USER").format(sql.Identifier(name), action))
+
+    def _prepare_restore(self, cursor, chain: List[Tuple[Path, Dict[str, Any]]]) -> _RestorePlan:
+        """Удаляет отложенные объекты, отключает триггеры и очищает восстанавливаемые таблицы"""
+        target = dict(self._list_tables(cursor))
+        cursor.execute("""
+            SELECT c.relname, c.oid FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relname = ANY(%s)
+        """, (list(target),))
+        oids = dict(cursor.fetchall())
+
+        def existing(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+            tables = []
+            for table in manifest["tables"]:
+                if table["name"] in target:
+                    tables.append(table)
+                else:
+                    logger.warning(f"Table {table['name']} does not exist, skipping it")
+            return tables
+
+        tables = existing(chain[0][1])
+        increments = [(path, existing(manifest)) for path, manifest in chain[1:]]
+        names = {table["name"] for table in tables}
+        for _, incremental in increments:
+            names.update(table["name"] for table in incremental)
+
+        foreign_keys, indexes = self._deferred_objects(cursor, [oids[name] for name in names])
+        plan = _RestorePlan(restore_order(tables, foreign_keys), increments, target, foreign_keys, indexes)
+
+        for relation, name, *_ in foreign_keys:
+            cursor.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(
+                sql.SQL(relation), sql.Identifier(name)
+            ))
+        for _, name, _ in indexes:
+            cursor.execute(sql.SQL("DROP INDEX public.{}").format(sql.Identifier(name)))
+        self._set_triggers(cursor, plan.names, enabled=False)
+        if plan.names:
+            cursor.execute(sql.SQL("TRUNCATE {}").format(
+                sql.SQL(", ").join(sql.SQL("public.") + sql.Identifier(name) for name in plan.names)
+            ))
+        return plan
+
+    def _copy_in(self, conn, f, table: Dict[str, Any], target_columns: List[Dict[str, str]], relation) -> Tuple[int, List[str]]:
+        """
+        Загружает данные таблицы копии в relation через COPY FROM STDIN.
+        Возвращает число строк и загруженные колонки.
+        """
+        existing = {column["name"] for column in target_columns}
+        columns = [column["name"] for column in table["columns"]]
+        keep = [index for index, column in enumerate(columns) if column in existing]
+        if len(keep) < len(columns):
+            logger.warning(f"Columns {set(columns) - existing} of {table['name']} no longer exist, skipping them")
+        reader = _GzipChunkReader(f, table["chunks"], keep if len(keep) < len(columns) else None)
+        loaded = [columns[index] for index in keep]
+        query = sql.SQL("COPY {relation} ({columns}) FROM STDIN").format(
+            relation=relation,
+            columns=sql.SQL(", ").join(sql.Identifier(column) for column in loaded)
+        )
+        with conn.cursor() as cursor:
+            cursor.copy_expert(query.as_string(conn), reader)
+            return cursor.rowcount, loaded
+
+    def _load_table(self, conn, f, table: Dict[str, Any], target_columns: List[Dict[str, str]]) -> int:
+        """Загружает таблицу через COPY FROM STDIN и продвигает ее последовательности"""
+        relation = sql.SQL("public.") + sql.Identifier(table["name"])
+        rows, _ = self._copy_in(conn, f, table, target_columns, relation)
+        with conn.cursor() as cursor:
+            self._reset_sequences(cursor, table)
+        logger.info(f"Restored {rows} rows of {table['name']}")
+        return rows
+
+    def _apply_increment(self, conn, f, table: Dict[str, Any], target_columns: List[Dict[str, str]]) -> int:
+        """
+        Применяет таблицу инкрементной копии: в режиме full таблица заменяется целиком,
+        в режимах delta и append строки копии заменяют строки с тем же первичным
+        ключом, а строки из списка удаленных удаляются
+        """
+        relation = sql.SQL("public.") + sql.Identifier(table["name"])
+        if table.get("mode", "full") == "full":
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL("TRUNCATE {}").format(relation))
+            return self._load_table(conn, f, table, target_columns)
+
+        stage = sql.Identifier(f"restore_{table['name']}")
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {})").format(stage, relation))
+            rows, columns = self._copy_in(conn, f, table, target_columns, stage)
+            key = sql.SQL(" AND ").join(
+                sql.SQL("t.{column} = s.{column}").format(column=sql.Identifier(column)) for column in table["key"]
+            )
+            column_list = sql.SQL(", ").join(sql.Identifier(column) for column in columns)
+            cursor.execute(sql.SQL("DELETE FROM {} t USING {} s WHERE {}").format(relation, stage, key))
+            cursor.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {}").format(
+                relation, column_list, column_list, stage
+            ))
+            cursor.execute(sql.SQL("DROP TABLE {}").format(stage))
+
+            tombstones = table.get("tombstones")
+            if tombstones and tombstones["rows"]:
+                deleted = sql.Identifier(f"restore_{table['name']}_deleted")
+                cursor.execute(sql.SQL("CREATE TEMP TABLE {} (id bigint)").format(deleted))
+                cursor.copy_expert(
+                    sql.SQL("COPY {} (id) FROM STDIN").format(deleted).as_string(conn),
+                    _GzipChunkReader(f, tombstones["chunks"])
+                )
+                cursor.execute(sql.SQL("DELETE FROM {} WHERE id IN (SELECT id FROM {})").format(relation, deleted))
+                cursor.execute(sql.SQL("DROP TABLE {}").format(deleted))
+            self._reset_sequences(cursor, table)
+        logger.info(f"Applied {rows} changed rows of {table['name']}")
+        return rows
+
+    def _apply_increments(self, conn, plan: _RestorePlan, progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+        for backup_file, tables in plan.increments:
+            with open(backup_file, "rb") as f:
+                for table in tables:
+                    rows = self._apply_increment(conn, f, table, plan.target[table["name"]])
+                    plan.report(progress, table["name"], rows, backup_file.name)
+
+    def _restore_streaming(
+        self,
+        backup_file: Path,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        workers: int = 1
+    ) -> None:
+        """
+        Загрузка потоковой резервной копии в схему, созданную приложением (init_db)
+
+        Таблицы из копии очищаются и загружаются через COPY FROM STDIN прямо из
+        сжатых кусков, без чтения файла целиком. Для инкрементной копии сначала
+        загружается полная копия ее цепочки, затем по порядку применяются
+        инкрементные. На время загрузки отключаются пользовательские триггеры
+        (аудит, уведомления), удаляются внешние ключи и вторичные индексы; после
+        загрузки они создаются заново, а последовательности продвигаются за
+        максимальные значения ключей.
+
+        При workers = 1 все выполняется в одной транзакции: при ошибке база остается
+        в прежнем состоянии. При workers > 1 таблицы полной копии загружаются
+        параллельно, каждая в своей транзакции, и ошибка оставляет базу
+        восстановленной частично.
+        """
+        chain = [(path, self.read_manifest(path)) for path in self.backup_chain(backup_file)]
+        for path, manifest in chain:
+            if manifest.get("format") != BACKUP_FORMAT:
+                raise ValueError(f"Unsupported backup format of {path.name}: {manifest.get('format')}")
+
+        conn = self._connect()
+        try:
+            with conn.cursor() as cursor:
+                plan = self._prepare_restore(cursor, chain)
+
+            full_backup = chain[0][0]
+            if workers > 1 and len(plan.tables) > 1:
+                conn.commit()
+                try:
+                    # Изменения цепочки применяются до создания внешних ключей:
+                    # промежуточные состояния могут им не соответствовать
+                    foreign_keys = self._load_parallel(
+                        full_backup, plan, workers, progress, add_foreign_keys=not plan.increments
+                    )
+                    self._apply_increments(conn, plan, progress)
+                    # Индексы таблиц, которые есть только в инкрементных копиях
+                    loaded = {table["name"] for table in plan.tables}
+                    with conn.cursor() as cursor:
+                        for table, _, definition in plan.indexes:
+                            if table not in loaded:
+                                self._create_index(cursor, definition)
+                except Exception:
+                    # Загруженное уже зафиксировано, но аудит и уведомления должны работать
+                    conn.rollback()
+                    with conn.cursor() as cursor:
+                        self._set_triggers(cursor, plan.names, enabled=True)
+                    conn.commit()
+                    raise
+            else:
+                with open(full_backup, "rb") as f:
+                    for table in plan.tables:
+                        rows = self._load_table(conn, f, table, plan.target[table["name"]])
+                        plan.report(progress, table["name"], rows, full_backup.name)
+                self._apply_increments(conn, plan, progress)
+                with conn.cursor() as cursor:
+                    for _, _, definition in plan.indexes:
+                        self._create_index(cursor, definition)
+                foreign_keys = plan.foreign_keys
+
+            with conn.cursor() as cursor:
+                for foreign_key in foreign_keys:
+                    self._add_foreign_key(cursor, foreign_key)
+                self._set_triggers(cursor, plan.names, enabled=True)
+                if plan.names:
+                    cursor.execute(sql.SQL("ANALYZE {}").format(
+                        sql.SQL(", ").join(sql.SQL("public.") + sql.Identifier(name) for name in plan.names)
+                    ))
+            conn.commit()
+            logger.info(f"Database restored successfully from backup: {backup_file}")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Failed to restore database: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def _load_parallel(
+        self,
+        backup_file: Path,
+        plan: _RestorePlan,
+        workers: int,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        add_foreign_keys: bool = True
+    ) -> List[Tuple[str, str, str, str, str]]:
+        """
+        Параллельная загрузка таблиц полной копии на workers соединениях.
+
+        Таблицы раздаются в порядке restore_order. Соединение, загрузившее таблицу,
+        строит ее индексы, а затем создает внешние ключи, обе таблицы которых
+        уже загружены (таблицы, которых нет в копии, считаются загруженными).
+        Возвращает внешние ключи, которые остались несозданными.
+        """
+        lock = threading.Lock()
+        loaded: set = set()
+        pending = list(plan.foreign_keys)
+        restored = {table["name"] for table in plan.tables}
+        connections: Queue = Queue()
+        opened = []
+
+        def is_ready(name: str) -> bool:
+            return name in loaded or name not in restored
+
+        def load(table: Dict[str, Any]) -> None:
+            conn = connections.get()
+            try:
+                with open(backup_file, "rb") as f:
+                    rows = self._load_table(conn, f, table, plan.target[table["name"]])
+                with conn.cursor() as cursor:
+                    for indexed, _, definition in plan.indexes:
+                        if indexed == table["name"]:
+                            self._create_index(cursor, definition)
+                conn.commit()
+                plan.report(progress, table["name"], rows, backup_file.name)
+
+                ready = []
+                if add_foreign_keys:
+                    with lock:
+                        loaded.add(table["name"])
+                        ready = [fk for fk in pending if is_ready(fk[3]) and is_ready(fk[4])]
+                        for fk in ready:
+                            pending.remove(fk)
+                with conn.cursor() as cursor:
+                    for fk in ready:
+                        self._add_foreign_key(cursor, fk)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                connections.put(conn)
+
+        try:
+            for _ in range(min(workers, len(plan.tables))):
+                opened.append(self._connect())
+                connections.put(opened[-1])
+            with ThreadPoolExecutor(max_workers=len(opened)) as pool:
+                futures = [pool.submit(load, table) for table in plan.tables]
+                for future in futures:
+                    future.result()
+        finally:
+            for conn in opened:
+                conn.close()
+        return pending
+
+    def _restore_legacy_json(self, backup_file: Path) -> None:
         """
-        Восстановление базы данных из резервной копии с использованием psycopg2
+        Восстановление базы данных из резервной копии старого формата (JSON)
         
         :param backup_file: Путь к файлу резервной копии
         """
@@ -649,23 +1706,30 @@ class DatabaseBackup:
         """
         Получение списка файлов резервных копий
         
+        Потоковые копии без манифеста (прерванные) не показываются,
+        старые копии в формате JSON по-прежнему входят в список.
+        
         :return: Список путей к файлам резервных копий
         """
         # Убедимся, что директория существует
         self.backup_dir.mkdir(parents=True, exist_ok=True)
         
-        # Обновляем список файлов в директории (иногда требуется для Windows)
-        import os
-        os.sync() if hasattr(os, 'sync') else None
+        def find(prefix: str) -> List[Path]:
+            streaming = [
+                path for path in self.backup_dir.glob(f"{prefix}*{DATA_SUFFIX}")
+                if manifest_path(path).exists()
+            ]
+            legacy = [
+                path for path in self.backup_dir.glob(f"{prefix}*{LEGACY_SUFFIX}")
+                if not path.name.endswith(MANIFEST_SUFFIX)
+            ]
+            return streaming + legacy
         
-        # Используем более гибкий шаблон для поиска файлов
-        pattern = f"backup_{self.db_name}_*.json"
-        backup_files = list(self.backup_dir.glob(pattern))
+        backup_files = find(f"backup_{self.db_name}_")
         
         # Если файлы не найдены, попробуем поискать по менее строгому шаблону
         if not backup_files:
-            pattern = f"backup_*.json"
-            backup_files = list(self.backup_dir.glob(pattern))
+            backup_files = find("backup_")
         
         logger.info(f"Found {len(backup_files)} backup files in {self.backup_dir}")
         
@@ -675,16 +1739,90 @@ class DatabaseBackup:
             reverse=True
         )
 
+    def backup_index(self) -> List[Dict[str, Any]]:
+        """
+        Список копий с размером, временем создания и контрольной суммой из манифеста,
+        от новых к старым
+
+        Создание, переименование и удаление файлов меняют mtime директории, поэтому
+        список перестраивается только после таких изменений, а обычный вызов -
+        это один stat директории вместо stat и чтения манифеста каждой копии.
+        """
+        key = str(self.backup_dir.resolve())
+        mtime = self.backup_dir.stat().st_mtime_ns
+        cached = _index_cache.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        entries = []
+        for path in self.list_backups():
+            try:
+                stat = path.stat()
+                manifest = self.read_manifest(path) if path.name.endswith(DATA_SUFFIX) else {}
+            except FileNotFoundError:
+                # Копию удалили, пока строился список
+                continue
+            entries.append({
+                "filename": path.name,
+                "created_at": datetime.fromtimestamp(stat.st_mtime),
+                "size_bytes": stat.st_size,
+                "kind": manifest.get("kind"),
+                "sha256": manifest.get("sha256")
+            })
+        if time.time_ns() - mtime >= INDEX_SETTLE_NS:
+            _index_cache[key] = (mtime, entries)
+        return entries
+
+    def find_backup(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Запись индекса по имени файла; None, если такой копии нет"""
+        return next((entry for entry in self.backup_index() if entry["filename"] == filename), None)
+
+    def dependent_backups(self, backup_file: Path) -> List[Path]:
+        """Инкрементные копии, для которых backup_file - предыдущая копия цепочки"""
+        dependents = []
+        for path in self.backup_dir.glob(f"*{MANIFEST_SUFFIX}"):
+            with open(path, encoding="utf-8") as f:
+                if json.load(f).get("parent") == backup_file.name:
+                    dependents.append(path.with_name(path.name[:-len(MANIFEST_SUFFIX)] + DATA_SUFFIX))
+        return dependents
+
+    def delete_backup(self, backup_file: Path) -> None:
+        """
+        Удаление резервной копии вместе с ее манифестом.
+        ValueError, если на копию опираются инкрементные копии.
+        """
+        if backup_file.name.endswith(DATA_SUFFIX):
+            dependents = self.dependent_backups(backup_file)
+            if dependents:
+                raise ValueError(
+                    f"Backup {backup_file.name} is the base of {', '.join(path.name for path in dependents)}"
+                )
+        backup_file.unlink()
+        if backup_file.name.endswith(DATA_SUFFIX):
+            manifest_path(backup_file).unlink(missing_ok=True)
+
     def cleanup_old_backups(self, keep_last: int = 5) -> None:
         """
         Удаление старых резервных копий, оставляя только указанное количество последних
         
+        Копии из цепочек оставленных инкрементных копий не удаляются.
+        
         :param keep_last: Количество последних резервных копий, которые нужно сохранить
         """
         backups = self.list_backups()
-        for backup in backups[keep_last:]:
+        keep = set(backups[:keep_last])
+        for backup in backups[:keep_last]:
+            if backup.name.endswith(DATA_SUFFIX):
+                try:
+                    keep.update(self.backup_chain(backup))
+                except FileNotFoundError as e:
+                    logger.warning(f"Broken backup chain: {e}")
+        # Список идет от новых копий к старым: зависимые копии удаляются раньше базовых
+        for backup in backups:
+            if backup in keep:
+                continue
             try:
-                backup.unlink()
+                self.delete_backup(backup)
                 logger.info(f"Deleted old backup: {backup}")
             except Exception as e:
                 logger.error(f"Failed to delete backup {backup}: {e}")
@@ -0,0 +1,171 @@
+import hashlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+from sqlalchemy import Enum, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки: схему применяет один воркер, остальные ждут его
+BOOTSTRAP_LOCK_KEY = 730_004
+
+BOOTSTRAP_TABLE = "schema_bootstrap"
+
+
+def _digest(parts: List[str]) -> str:
+    sha256 = hashlib.sha256()
+    for part in parts:
+        sha256.update(part.encode("utf-8"))
+        sha256.update(b"\0")
+    return sha256.hexdigest()
+
+
+class _StatementRecorder:
+    """Подменяет соединение: запоминает запросы вместо выполнения"""
+
+    def __init__(self):
+        self.statements: List[Any] = []
+
+    async def execute(self, statement, parameters=None):
+        if parameters:
+            raise ValueError("Schema bundle statements must not take parameters")
+        self.statements.append(statement)
+
+
+class SchemaBundle:
+    """
+    Набор DDL, который применяется целиком.
+
+    apply(conn) выполняет DDL, source() возвращает строки, от которых зависит
+    результат; их sha256 - отпечаток набора. Набор должен быть идемпотентным:
+    при изменении отпечатка он применяется к уже существующей схеме.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        apply: Callable[[AsyncConnection], Awaitable[Any]],
+        source: Callable[[], List[str]]
+    ):
+        self.name = name
+        self._apply = apply
+        self._source = source
+
+    async def fingerprint(self) -> str:
+        return _digest(self._source())
+
+    async def apply(self, conn: AsyncConnection) -> None:
+        await self._apply(conn)
+
+
+class SqlBundle(SchemaBundle):
+    """
+    Набор из функции, которая только выполняет SQL (conn.execute(text(...))).
+    Отпечаток считается по тексту запросов, записанных без выполнения.
+    """
+
+    def __init__(self, name: str, build: Callable[[Any], Awaitable[Any]]):
+        self.name = name
+        self.build = build
+
+    async def statements(self) -> List[Any]:
+        recorder = _StatementRecorder()
+        await self.build(recorder)
+        return recorder.statements
+
+    async def fingerprint(self) -> str:
+        return _digest([str(statement) for statement in await self.statements()])
+
+    async def apply(self, conn: AsyncConnection) -> None:
+        for statement in await self.statements():
+            await conn.execute(statement)
+
+
+def metadata_ddl(metadata) -> List[str]:
+    """DDL таблиц, индексов и значения ENUM моделей для отпечатка набора таблиц"""
+    dialect = postgresql.dialect()
+    ddl = []
+    for table in metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name or ""):
+            ddl.append(str(CreateIndex(index).compile(dialect=dialect)))
+        for column in table.columns:
+            if isinstance(column.type, Enum):
+                ddl.append(f"{column.type.name}: {', '.join(column.type.enums)}")
+    return ddl
+
+
+class SchemaBootstrap:
+    """
+    Применение схемы при запуске по отпечаткам наборов DDL.
+
+    Отпечатки примененных наборов хранятся в таблице schema_bootstrap. При теплом
+    запуске сверка стоит два запроса чтения и не выполняет DDL; при отличиях
+    воркер берет advisory-блокировку и в одной транзакции применяет только
+    изменившиеся наборы, записывая их новые отпечатки. Порядок наборов - порядок
+    применения.
+    """
+
+    def __init__(self, bundles: List[SchemaBundle], table: str = BOOTSTRAP_TABLE):
+        self.bundles = bundles
+        self.table = table
+
+    async def fingerprints(self) -> Dict[str, str]:
+        return {bundle.name: await bundle.fingerprint() for bundle in self.bundles}
+
+    async def applied(self, conn: AsyncConnection) -> Dict[str, str]:
+        """Отпечатки примененных наборов; пустой словарь, если таблицы еще нет"""
+        exists = await conn.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": self.table})
+        if not exists.scalar():
+            return {}
+        result = await conn.execute(text(f"SELECT bundle, fingerprint FROM {self.table}"))
+        return dict(result.all())
+
+    async def run(self, engine: AsyncEngine, force: bool = False) -> Dict[str, str]:
+        """
+        Применяет изменившиеся наборы (force - все наборы).
+        Возвращает состояние наборов: applied или unchanged.
+        """
+        expected = await self.fingerprints()
+        if not force:
+            async with engine.connect() as conn:
+                applied = await self.applied(conn)
+            if all(applied.get(name) == fingerprint for name, fingerprint in expected.items()):
+                logger.info("Database schema is up to date")
+                return {name: "unchanged" for name in expected}
+
+        statuses = {}
+        async with engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": BOOTSTRAP_LOCK_KEY})
+            # Пока ждали блокировку, наборы мог применить другой воркер
+            applied = await self.applied(conn)
+            if not applied:
+                await conn.execute(text(f"""
+                    CREATE TABLE IF NOT EXISTS {self.table} (
+                        bundle TEXT PRIMARY KEY,
+                        fingerprint TEXT NOT NULL,
+                        applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+                    )
+                """))
+
+            for bundle in self.bundles:
+                fingerprint = expected[bundle.name]
+                if not force and applied.get(bundle.name) == fingerprint:
+                    statuses[bundle.name] = "unchanged"
+                    continue
+
+                started = time.perf_counter()
+                await bundle.apply(conn)
+                await conn.execute(text(f"""
+                    INSERT INTO {self.table} (bundle, fingerprint, applied_at)
+                    VALUES (:bundle, :fingerprint, now())
+                    ON CONFLICT (bundle) DO UPDATE
+                    SET fingerprint = EXCLUDED.fingerprint, applied_at = EXCLUDED.applied_at
+                """), {"bundle": bundle.name, "fingerprint": fingerprint})
+                statuses[bundle.name] = "applied"
+                logger.info(f"Applied schema bundle {bundle.name} in {time.perf_counter() - started:.2f}s")
+        return statuses
@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.core.metrics import track_db_query
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("app.db.slow_query")
+echo_logger = logging.getLogger("app.db.echo")
+
+# Длина текста запроса в журнале
+STATEMENT_LOG_LIMIT = 2000
+
+_OPERATIONS = {
+    "select", "insert", "update", "delete", "with", "copy", "call",
+    "create", "alter", "drop", "truncate", "begin", "commit", "rollback", "set", "show"
+}
+_IDENTIFIER = r'((?:"[^"]+"|\w+)(?:\.(?:"[^"]+"|\w+))?)'
+_TABLE_PATTERNS = {
+    "insert": re.compile(r"\bINSERT\s+INTO\s+" + _IDENTIFIER, re.IGNORECASE),
+    "update": re.compile(r"\bUPDATE\s+(?:ONLY\s+)?" + _IDENTIFIER, re.IGNORECASE),
+    "delete": re.compile(r"\bDELETE\s+FROM\s+(?:ONLY\s+)?" + _IDENTIFIER, re.IGNORECASE),
+    "select": re.compile(r"\bFROM\s+(?:ONLY\s+)?" + _IDENTIFIER, re.IGNORECASE),
+}
+_WITH_OPERATION = re.compile(r"\)\s*(SELECT|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def classify_statement(statement: str) -> Tuple[str, str]:
+    """
+    Операция и основная таблица запроса для меток DB_QUERY_LATENCY.
+
+    Текст запросов SQLAlchemy повторяется, поэтому разбор кэшируется.
+    Для WITH берется операция основного запроса после CTE, для SELECT -
+    первая таблица после FROM. Схема public в метке опускается.
+    """
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].lower() if words else ""
+    if operation not in _OPERATIONS:
+        return "other", "unknown"
+    if operation == "with":
+        matches = _WITH_OPERATION.findall(statement)
+        operation = matches[-1].lower() if matches else "select"
+    pattern = _TABLE_PATTERNS.get(operation)
+    match = pattern.search(statement) if pattern else None
+    if not match:
+        return operation, "unknown"
+    table = match.group(1).replace('"', "")
+    if table.startswith("public."):
+        table = table[len("public."):]
+    return operation, table
+
+
+def _placeholder(value: Any) -> str:
+    return "NULL" if value is None else f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters: Any, executemany: bool = False) -> Any:
+    """Параметры запроса без значений: в журнал попадают только их типы"""
+    if executemany:
+        return f"<{len(parameters)} rows>"
+    if isinstance(parameters, dict):
+        return {key: _placeholder(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_placeholder(value) for value in parameters]
+    return parameters
+
+
+class QueryLogSettings:
+    """
+    Пороги журнала запросов, изменяемые на лету.
+
+    Значения по умолчанию берутся из настроек. Изменения через API сохраняются
+    в DB_QUERY_LOG_STATE_FILE, поэтому их видят все воркеры uvicorn: каждый
+    проверяет mtime файла не чаще раза в REFRESH_INTERVAL секунд.
+    """
+
+    FIELDS = ("slow_query_ms", "slow_query_sample_rate", "echo_sample_rate")
+    REFRESH_INTERVAL = 1.0
+
+    def __init__(self, state_file: str):
+        self.state_file = Path(state_file)
+        self._lock = threading.Lock()
+        self._mtime: Optional[int] = None
+        self._checked = 0.0
+        self._apply({})
+
+    def _apply(self, overrides: Dict[str, Any]) -> None:
+        self.slow_query_ms = float(overrides.get("slow_query_ms", settings.DB_SLOW_QUERY_MS))
+        self.slow_query_sample_rate = float(overrides.get("slow_query_sample_rate", settings.DB_SLOW_QUERY_SAMPLE_RATE))
+        self.echo_sample_rate = float(overrides.get("echo_sample_rate", settings.DB_ECHO_SAMPLE_RATE))
+
+    def as_dict(self) -> Dict[str, float]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def refresh(self) -> None:
+        """Подхватывает изменения, сделанные в других воркерах"""
+        now = time.monotonic()
+        if now - self._checked < self.REFRESH_INTERVAL:
+            return
+        self._checked = now
+        try:
+            mtime = self.state_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        overrides = {}
+        if mtime is not None:
+            try:
+                with open(self.state_file, encoding="utf-8") as f:
+                    overrides = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to read query log settings: {e}")
+        self._apply(overrides)
+
+    def update(self, **values: Any) -> Dict[str, float]:
+        """Сохраняет новые значения для всех воркеров и сразу применяет их в этом"""
+        with self._lock:
+            state = {**self.as_dict(), **{key: value for key, value in values.items() if value is not None}}
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=self.state_file.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp_name, self.state_file)
+            except Exception:
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+            self._apply(state)
+            self._mtime = self.state_file.stat().st_mtime_ns
+        return self.as_dict()
+
+
+query_log = QueryLogSettings(settings.DB_QUERY_LOG_STATE_FILE)
+
+
+def _format_statement(statement: str) -> str:
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    if len(statement) > STATEMENT_LOG_LIMIT:
+        statement = statement[:STATEMENT_LOG_LIMIT] + "..."
+    return statement
+
+
+def _record(statement: str, parameters: Any, executemany: bool, duration: float, failed: bool = False) -> None:
+    operation, table = classify_statement(statement)
+    track_db_query(operation, table, duration)
+
+    query_log.refresh()
+    elapsed_ms = duration * 1000
+    if elapsed_ms >= query_log.slow_query_ms and random.random() < query_log.slow_query_sample_rate:
+        slow_query_logger.warning(
+            "Slow query%s (%.1f ms, %s %s): %s; parameters: %s",
+            " failed" if failed else "", elapsed_ms, operation, table,
+            _format_statement(statement), redact_parameters(parameters, executemany)
+        )
+    elif query_log.echo_sample_rate > 0 and random.random() < query_log.echo_sample_rate:
+        echo_logger.info(
+            "%.1f ms %s %s: %s; parameters: %s",
+            elapsed_ms, operation, table,
+            _format_statement(statement), redact_parameters(parameters, executemany)
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_time"].pop()
+    _record(statement, parameters, executemany, time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute не вызывается для упавших запросов
+    conn = exception_context.connection
+    started = conn.info.get("query_start_time") if conn is not None else None
+    if not started or exception_context.statement is None:
+        return
+    _record(
+        exception_context.statement,
+        exception_context.parameters,
+        bool(exception_context.execution_context and exception_context.execution_context.executemany),
+        time.perf_counter() - started.pop(),
+        failed=True
+    )
+
+
+def instrument_engine(engine) -> None:
+    """
+    Подключает замер запросов к движку (AsyncEngine или Engine).
+
+    Время каждого запроса идет в гистограмму DB_QUERY_LATENCY с метками операции
+    и таблицы. Запросы дольше порога пишутся в журнал медленных запросов
+    (app.db.slow_query) с долей выборки, а доля echo_sample_rate остальных -
+    в отладочный журнал app.db.echo вместо echo=True. Значения параметров
+    в журналы не попадают.
+    """
+    target = getattr(engine, "sync_engine", engine)
+    if event.contains(target, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+    event.listen(target, "handle_error", _handle_error)
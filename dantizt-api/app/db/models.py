@@ -3,10 +3,10 @@ from enum import Enum
 from sqlalchemy import (
     Boolean, Column, Date, DateTime, Float,
     ForeignKey, Integer, String, Text, Time, Enum as SQLEnum, Index,
-    CheckConstraint, UniqueConstraint, func, ARRAY, Numeric
+    CheckConstraint, UniqueConstraint, func, ARRAY, Numeric, LargeBinary, text
 )
 from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.dialects.postgresql import JSON, JSONB
 from app.db.base_class import Base
 from app.db.mixins import TimestampMixin
 import re
@@ -109,6 +109,12 @@ class CertificateStatus(str, Enum):
     issued = "issued"      # Выдана
     cancelled = "cancelled"  # Отменена
 
+class EmailStatus(str, Enum):
+    """Статус письма в очереди исходящей почты"""
+    pending = "pending"  # Ожидает отправки
+    sent = "sent"        # Доставлено на SMTP-сервер
+    failed = "failed"    # Исчерпаны попытки отправки
+
 class User(Base):
     __tablename__ = "users"
     
@@ -379,6 +385,12 @@ class Notification(Base):
     created_at = Column(DateTime, server_default=func.now())
     scheduled_for = Column(DateTime(timezone=True), nullable=True)
     updated_at = Column(DateTime(timezone=True), nullable=True)
+    # Отложенное уведомление (scheduled_for задан) видно пользователю только после отправки
+    is_sent = Column(Boolean, nullable=False, default=False, server_default="false")
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    # Прием, о котором напоминает уведомление: при отмене или переносе приема
+    # неотправленное напоминание удаляется или переносится триггером
+    appointment_id = Column(Integer, ForeignKey("appointments.id", ondelete="CASCADE"), nullable=True)
     
     user = relationship("User", back_populates="notifications")
     
@@ -386,8 +398,22 @@ class Notification(Base):
         Index('ix_notifications_user', 'user_id'),
         Index('ix_notifications_type', 'type'),
         Index('ix_notifications_scheduled_for', 'scheduled_for'),
+        Index('idx_notifications_scheduled', 'scheduled_for', postgresql_where=text("NOT is_sent")),
+        Index('ix_notifications_appointment', 'appointment_id'),
     )
 
+class NotificationCounter(Base):
+    """Денормализованный счетчик непрочитанных уведомлений пользователя.
+
+    Поддерживается триггерами на таблице notifications, расхождения
+    исправляет периодическая задача repair_notification_counters.
+    """
+    __tablename__ = "notification_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class DoctorSpecialDay(Base):
     """Особый день в расписании врача (отпуск, праздник и т.д.)"""
     __tablename__ = "doctor_special_days"
@@ -461,18 +487,24 @@ class DoctorReview(Base):
 class ActionLog(Base):
     __tablename__ = "action_logs"
     
-    id = Column(Integer, primary_key=True, index=True)
+    # Таблица секционирована по месяцам created_at (см. app/db/partitions.py),
+    # поэтому ключ секционирования входит в первичный ключ
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     table_name = Column(String, nullable=False)
     action_type = Column(String, nullable=False)
     record_id = Column(Integer, nullable=False)
-    old_data = Column(String)
-    new_data = Column(String)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # INSERT и DELETE хранят полную строку, UPDATE - только измененные колонки
+    old_data = Column(JSONB)
+    new_data = Column(JSONB)
+    changed_columns = Column(ARRAY(String))
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     __table_args__ = (
         Index('ix_action_logs_table_action', 'table_name', 'action_type'),
-        Index('ix_action_logs_created_at', 'created_at'),
+        Index('ix_action_logs_created_id', 'created_at', 'id'),
+        Index('ix_action_logs_record', 'table_name', 'record_id', 'created_at'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
     )
 
 class TaxDeductionCertificate(Base):
@@ -509,3 +541,25 @@ class CertificatePayment(Base):
     certificate_id = Column(Integer, ForeignKey("tax_deduction_certificates.id", ondelete="CASCADE"), primary_key=True)
     payment_id = Column(Integer, ForeignKey("payments.id", ondelete="CASCADE"), primary_key=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class EmailOutbox(Base):
+    """Очередь исходящих писем, которую разбирает фоновый отправитель"""
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    attachment = Column(LargeBinary, nullable=True)
+    attachment_name = Column(String, nullable=True)
+    attachment_type = Column(String, nullable=True)
+    status = Column(String, nullable=False, default=EmailStatus.pending.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index('ix_email_outbox_pending', 'next_attempt_at', postgresql_where=text("status = 'pending'")),
+    )
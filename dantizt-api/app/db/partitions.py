@@ -1,135 +1,355 @@
-from sqlalchemy import DDL, event
-
-# Создание партиционированной таблицы логов
-create_partitioned_logs = """
--- Удаляем старую таблицу action_logs если она существует
-DROP TABLE IF EXISTS action_logs CASCADE;
-
--- Создаем основную таблицу с партициями
-CREATE TABLE action_logs (
-    id SERIAL,
-    table_name VARCHAR(50) NOT NULL,
-    action_type VARCHAR(10) NOT NULL,
-    record_id INTEGER,
-    old_data TEXT,
-    new_data TEXT,
-    description TEXT,
-    user_id INTEGER REFERENCES users(id),
-    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-) PARTITION BY RANGE (created_at);
-
--- Создаем партиции по месяцам
-CREATE TABLE action_logs_2024_01 PARTITION OF action_logs
-    FOR VALUES FROM ('2024-01-01') TO ('2024-02-01');
-
-CREATE TABLE action_logs_2024_02 PARTITION OF action_logs
-    FOR VALUES FROM ('2024-02-01') TO ('2024-03-01');
-
-CREATE TABLE action_logs_2024_03 PARTITION OF action_logs
-    FOR VALUES FROM ('2024-03-01') TO ('2024-04-01');
-
--- И так далее для остальных месяцев...
-"""
-
-# Создание партиционированной таблицы приёмов
-create_partitioned_appointments = """
--- Удаляем старую таблицу appointments если она существует
-DROP TABLE IF EXISTS appointments CASCADE;
-
--- Создаём новую партиционированную таблицу
-CREATE TABLE appointments (
-    id SERIAL,
-    patient_id INTEGER NOT NULL,
-    doctor_id INTEGER NOT NULL,
-    start_time TIMESTAMP NOT NULL,
-    end_time TIMESTAMP NOT NULL,
-    status VARCHAR(50) NOT NULL,
-    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    CONSTRAINT fk_patient FOREIGN KEY (patient_id) REFERENCES patients(id),
-    CONSTRAINT fk_doctor FOREIGN KEY (doctor_id) REFERENCES doctors(id)
-) PARTITION BY RANGE (start_time);
-
--- Создаём партиции по кварталам
-CREATE TABLE appointments_2024_q1 PARTITION OF appointments
-    FOR VALUES FROM ('2024-01-01') TO ('2024-04-01');
-
-CREATE TABLE appointments_2024_q2 PARTITION OF appointments
-    FOR VALUES FROM ('2024-04-01') TO ('2024-07-01');
-
-CREATE TABLE appointments_2024_q3 PARTITION OF appointments
-    FOR VALUES FROM ('2024-07-01') TO ('2024-10-01');
-
-CREATE TABLE appointments_2024_q4 PARTITION OF appointments
-    FOR VALUES FROM ('2024-10-01') TO ('2025-01-01');
-"""
-
-# Функция для автоматического создания новых партиций
-create_partition_function = """
-CREATE OR REPLACE FUNCTION create_partition_if_not_exists()
-RETURNS TRIGGER AS $$
-DECLARE
-    partition_date DATE;
-    partition_name TEXT;
-    start_date DATE;
-    end_date DATE;
-BEGIN
-    -- Для таблицы логов создаём месячные партиции
-    IF TG_TABLE_NAME = 'action_logs' THEN
-        partition_date := DATE_TRUNC('month', NEW.created_at);
-        partition_name := 'action_logs_' || TO_CHAR(partition_date, 'YYYY_MM');
-        start_date := partition_date;
-        end_date := partition_date + INTERVAL '1 month';
-    
-    -- Для таблицы приёмов создаём квартальные партиции
-    ELSIF TG_TABLE_NAME = 'appointments' THEN
-        partition_date := DATE_TRUNC('quarter', NEW.start_time);
-        partition_name := 'appointments_' || TO_CHAR(partition_date, 'YYYY') || '_q' || 
-                         TO_CHAR(EXTRACT(QUARTER FROM partition_date), '9');
-        start_date := partition_date;
-        end_date := partition_date + INTERVAL '3 months';
-    END IF;
-
-    -- Проверяем существование партиции
-    IF NOT EXISTS (SELECT 1 FROM pg_class WHERE relname = partition_name) THEN
-        EXECUTE format(
-            'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I
-             FOR VALUES FROM (%L) TO (%L)',
-            partition_name, TG_TABLE_NAME, start_date, end_date
-        );
-    END IF;
-
-    RETURN NEW;
-END;
-$$ LANGUAGE plpgsql;
-"""
-
-# Создание триггеров для автоматического создания партиций
-create_partition_triggers = """
--- Триггер для таблицы логов
-DROP TRIGGER IF EXISTS action_logs_insert_trigger ON action_logs;
-CREATE TRIGGER action_logs_insert_trigger
-    BEFORE INSERT ON action_logs
-    FOR EACH ROW
-    EXECUTE FUNCTION create_partition_if_not_exists();
-
--- Триггер для таблицы приёмов
-DROP TRIGGER IF EXISTS appointments_insert_trigger ON appointments;
-CREATE TRIGGER appointments_insert_trigger
-    BEFORE INSERT ON appointments
-    FOR EACH ROW
-    EXECUTE FUNCTION create_partition_if_not_exists();
-"""
-
-def setup_partitions(engine):
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.schema import CreateIndex
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки, чтобы обслуживание секций выполнял один воркер
+PARTITION_MAINTENANCE_LOCK_KEY = 730_002
+
+
+def add_months(moment: datetime, months: int) -> datetime:
+    """Первое число месяца, отстоящего от moment на months месяцев (UTC)"""
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+class PartitionSpec:
+    """Таблица, секционированная по диапазонам времени одинаковой длины в месяцах"""
+
+    def __init__(self, table: str, column: str, months: int, retention_months: int = 0, premake: int = 3):
+        self.table = table
+        self.column = column
+        self.months = months
+        # Секции старше срока хранения отсоединяются (0 - хранить всегда)
+        self.retention_months = retention_months
+        # Сколько будущих секций держать созданными заранее
+        self.premake = premake
+
+    @property
+    def default_partition(self) -> str:
+        return f"{self.table}_default"
+
+    def period_start(self, moment: datetime) -> datetime:
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc)
+        month = (moment.month - 1) // self.months * self.months + 1
+        return datetime(moment.year, month, 1, tzinfo=timezone.utc)
+
+    def shift(self, start: datetime, periods: int) -> datetime:
+        return add_months(start, periods * self.months)
+
+    def partition_name(self, start: datetime) -> str:
+        if self.months == 3:
+            return f"{self.table}_{start.year}_q{(start.month - 1) // 3 + 1}"
+        return f"{self.table}_{start:%Y_%m}"
+
+    def bounds(self, start: datetime) -> str:
+        end = self.shift(start, 1)
+        return f"FOR VALUES FROM ('{start:%Y-%m-%d} 00:00:00+00') TO ('{end:%Y-%m-%d} 00:00:00+00')"
+
+
+# action_logs - месячные секции. appointments - квартальные; на таблицу ссылаются
+# внешние ключи по id, поэтому она обслуживается, только если уже секционирована
+PARTITIONED_TABLES = [
+    PartitionSpec(
+        'action_logs', 'created_at', months=1,
+        retention_months=settings.ACTION_LOGS_RETENTION_MONTHS,
+        premake=settings.PARTITION_PREMAKE
+    ),
+    PartitionSpec(
+        'appointments', 'start_time', months=3,
+        retention_months=settings.APPOINTMENTS_RETENTION_MONTHS,
+        premake=settings.PARTITION_PREMAKE
+    ),
+]
+
+
+def get_partition_spec(table: str) -> PartitionSpec:
+    for spec in PARTITIONED_TABLES:
+        if spec.table == table:
+            return spec
+    raise ValueError(f"Table {table} is not configured for partitioning")
+
+
+async def is_partitioned(conn: AsyncConnection, table: str) -> bool:
+    result = await conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table
+            WHERE partrelid = to_regclass(:table)
+        )
+    """), {"table": table})
+    return bool(result.scalar())
+
+
+async def relation_exists(conn: AsyncConnection, name: str) -> bool:
+    result = await conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+    return bool(result.scalar())
+
+
+async def create_partition(conn: AsyncConnection, spec: PartitionSpec, start: datetime) -> bool:
     """
-    Настройка партиционирования для таблиц
+    Создает секцию периода, начинающегося со start. Строки этого периода,
+    успевшие попасть в секцию по умолчанию, переносятся в новую секцию.
+    Возвращает True, если секция была создана.
     """
-    # Создание партиционированных таблиц
-    engine.execute(create_partitioned_logs)
-    engine.execute(create_partitioned_appointments)
-    
-    # Создание функции для автоматического создания партиций
-    engine.execute(create_partition_function)
-    
-    # Создание триггеров
-    engine.execute(create_partition_triggers)
+    name = spec.partition_name(start)
+    if await relation_exists(conn, name):
+        return False
+
+    end = spec.shift(start, 1)
+    stray = False
+    if await relation_exists(conn, spec.default_partition):
+        result = await conn.execute(text(f"""
+            SELECT EXISTS (
+                SELECT 1 FROM {spec.default_partition}
+                WHERE {spec.column} >= :start AND {spec.column} < :end
+            )
+        """), {"start": start, "end": end})
+        stray = bool(result.scalar())
+
+    if not stray:
+        await conn.execute(text(f"CREATE TABLE {name} PARTITION OF {spec.table} {spec.bounds(start)}"))
+    else:
+        await conn.execute(text(f"CREATE TABLE {name} (LIKE {spec.table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        await conn.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM {spec.default_partition}
+                WHERE {spec.column} >= :start AND {spec.column} < :end
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """), {"start": start, "end": end})
+        await conn.execute(text(f"ALTER TABLE {spec.table} ATTACH PARTITION {name} {spec.bounds(start)}"))
+        logger.warning(f"Moved rows of {name} out of {spec.default_partition}")
+
+    logger.info(f"Created partition {name}")
+    return True
+
+
+async def ensure_partitions(conn: AsyncConnection, spec: PartitionSpec, now: Optional[datetime] = None) -> List[str]:
+    """
+    Заранее создает секции текущего и spec.premake следующих периодов.
+    Секция по умолчанию принимает строки, для которых секции нет, поэтому
+    вставка никогда не выполняет DDL и не падает из-за отсутствующей секции.
+    """
+    if not await is_partitioned(conn, spec.table):
+        logger.debug(f"Table {spec.table} is not partitioned, skipping")
+        return []
+
+    await conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {spec.default_partition} PARTITION OF {spec.table} DEFAULT"
+    ))
+
+    start = spec.period_start(now or datetime.now(timezone.utc))
+    created = []
+    for period in range(spec.premake + 1):
+        period_start = spec.shift(start, period)
+        if await create_partition(conn, spec, period_start):
+            created.append(spec.partition_name(period_start))
+    return created
+
+
+async def ensure_all_partitions(conn: AsyncConnection, now: Optional[datetime] = None) -> List[str]:
+    created = []
+    for spec in PARTITIONED_TABLES:
+        created.extend(await ensure_partitions(conn, spec, now))
+    return created
+
+
+async def list_partitions(conn: AsyncConnection, table: str) -> List[Dict[str, Any]]:
+    """Секции таблицы с границами, размером и оценкой числа строк"""
+    result = await conn.execute(text(r"""
+        SELECT
+            child.relname AS partition,
+            pg_get_expr(child.relpartbound, child.oid) AS bounds,
+            ((regexp_match(
+                pg_get_expr(child.relpartbound, child.oid), 'TO \(''([^'']+)''\)'
+            ))[1])::timestamptz AS upper_bound,
+            pg_total_relation_size(child.oid) AS size_bytes,
+            greatest(child.reltuples, 0)::bigint AS estimated_rows
+        FROM pg_inherits i
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+        ORDER BY child.relname
+    """), {"table": table})
+    return [dict(row._mapping) for row in result]
+
+
+async def detach_expired_partitions(
+    conn: AsyncConnection,
+    spec: PartitionSpec,
+    now: Optional[datetime] = None
+) -> List[str]:
+    """
+    Отсоединяет секции, целиком вышедшие за срок хранения, и переносит их
+    в схему архива. Данные остаются доступны для выгрузки в холодное хранилище.
+    """
+    if spec.retention_months <= 0 or not await is_partitioned(conn, spec.table):
+        return []
+
+    cutoff = add_months(spec.period_start(now or datetime.now(timezone.utc)), -spec.retention_months)
+    expired = [
+        partition for partition in await list_partitions(conn, spec.table)
+        if partition["upper_bound"] is not None and partition["upper_bound"] <= cutoff
+    ]
+    if not expired:
+        return []
+
+    schema = settings.PARTITION_ARCHIVE_SCHEMA
+    await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+    # Отсоединение требует короткой эксклюзивной блокировки родителя - не ждем ее бесконечно
+    await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+
+    detached = []
+    for partition in expired:
+        name = partition["partition"]
+        await conn.execute(text(f"ALTER TABLE {spec.table} DETACH PARTITION {name}"))
+        await conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {schema}"))
+        logger.info(f"Detached partition {name} into schema {schema}")
+        detached.append(name)
+    return detached
+
+
+async def partition_report(conn: AsyncConnection) -> List[Dict[str, Any]]:
+    """Размеры подключенных и архивных секций всех секционированных таблиц"""
+    report = []
+    for spec in PARTITIONED_TABLES:
+        if not await is_partitioned(conn, spec.table):
+            continue
+        for partition in await list_partitions(conn, spec.table):
+            partition.pop("upper_bound")
+            report.append({"table": spec.table, "schema": "public", "attached": True, **partition})
+
+    result = await conn.execute(text("""
+        SELECT
+            c.relname AS partition,
+            pg_total_relation_size(c.oid) AS size_bytes,
+            greatest(c.reltuples, 0)::bigint AS estimated_rows
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema AND c.relkind = 'r'
+        ORDER BY c.relname
+    """), {"schema": settings.PARTITION_ARCHIVE_SCHEMA})
+    for row in result:
+        table = next((spec.table for spec in PARTITIONED_TABLES if row.partition.startswith(f"{spec.table}_")), None)
+        report.append({
+            "table": table,
+            "schema": settings.PARTITION_ARCHIVE_SCHEMA,
+            "attached": False,
+            "partition": row.partition,
+            "bounds": None,
+            "size_bytes": row.size_bytes,
+            "estimated_rows": row.estimated_rows
+        })
+    return report
+
+
+async def maintain_partitions(conn: AsyncConnection, now: Optional[datetime] = None) -> Optional[Dict[str, List[str]]]:
+    """
+    Один проход обслуживания: создание будущих секций и отсоединение устаревших.
+    Возвращает None, если обслуживание уже выполняет другой процесс.
+    """
+    locked = await conn.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"),
+        {"key": PARTITION_MAINTENANCE_LOCK_KEY}
+    )
+    if not locked.scalar():
+        return None
+
+    created, detached = [], []
+    for spec in PARTITIONED_TABLES:
+        created.extend(await ensure_partitions(conn, spec, now))
+        detached.extend(await detach_expired_partitions(conn, spec, now))
+    return {"created": created, "detached": detached}
+
+
+async def run_partition_maintenance(interval_hours: float) -> None:
+    """Периодически обслуживает секции. Первый проход выполняется сразу при запуске"""
+    from app.db.session import engine
+    from app.services.log_archive import log_archive
+
+    while True:
+        try:
+            async with engine.begin() as conn:
+                await maintain_partitions(conn)
+            # Отсоединенные секции журнала выгружаются в холодное хранилище
+            if settings.LOGS_ARCHIVE_ENABLED:
+                await log_archive.archive_partitions(engine)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+def conversion_statements(spec: PartitionSpec, first_start: datetime, last_start: datetime, sequence: str) -> List[str]:
+    """
+    SQL для перевода обычной таблицы в секционированную с переносом данных.
+    Запись в таблицу блокируется до конца транзакции, поэтому перевод
+    выполняется в окно обслуживания.
+    """
+    from app.db.models import Base
+
+    table = Base.metadata.tables[spec.table]
+    staging = f"{spec.table}_partitioned"
+    primary_key = ", ".join(column.name for column in table.primary_key.columns)
+
+    statements = [
+        f"LOCK TABLE {spec.table} IN EXCLUSIVE MODE",
+        f"UPDATE {spec.table} SET {spec.column} = CURRENT_TIMESTAMP WHERE {spec.column} IS NULL",
+        f"CREATE TABLE {staging} (LIKE {spec.table} INCLUDING DEFAULTS) PARTITION BY RANGE ({spec.column})",
+        f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_pkey PRIMARY KEY ({primary_key})",
+        f"CREATE TABLE {spec.default_partition} PARTITION OF {staging} DEFAULT",
+    ]
+    start = first_start
+    while start <= last_start:
+        statements.append(f"CREATE TABLE {spec.partition_name(start)} PARTITION OF {staging} {spec.bounds(start)}")
+        start = spec.shift(start, 1)
+
+    statements += [
+        f"INSERT INTO {staging} SELECT * FROM {spec.table}",
+        f"ALTER SEQUENCE {sequence} OWNED BY NONE",
+        f"DROP TABLE {spec.table}",
+        f"ALTER TABLE {staging} RENAME TO {spec.table}",
+        f"ALTER TABLE {spec.table} RENAME CONSTRAINT {staging}_pkey TO {spec.table}_pkey",
+        f"ALTER SEQUENCE {sequence} OWNED BY {spec.table}.id",
+    ]
+    statements += [
+        str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+        for index in sorted(table.indexes, key=lambda index: index.name)
+    ]
+    return statements
+
+
+async def convert_to_partitioned(conn: AsyncConnection, spec: PartitionSpec, now: Optional[datetime] = None) -> bool:
+    """Переводит таблицу в секционированную. Возвращает False, если она уже секционирована"""
+    if await is_partitioned(conn, spec.table):
+        return False
+
+    referenced = await conn.execute(text("""
+        SELECT count(*) FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = to_regclass(:table)
+    """), {"table": spec.table})
+    if referenced.scalar():
+        raise ValueError(f"Table {spec.table} is referenced by foreign keys and cannot be converted")
+
+    sequence = (await conn.execute(
+        text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": spec.table}
+    )).scalar()
+    oldest = (await conn.execute(text(f"SELECT min({spec.column}) FROM {spec.table}"))).scalar()
+
+    current = spec.period_start(now or datetime.now(timezone.utc))
+    first_start = spec.period_start(oldest) if oldest else current
+    for statement in conversion_statements(spec, first_start, spec.shift(current, spec.premake), sequence):
+        await conn.execute(text(statement))
+    logger.info(f"Converted {spec.table} to a partitioned table")
+    return True
@@ -97,7 +97,7 @@ BEGIN
             'doctor_id', p_doctor_id,
             'start_time', p_start_time,
             'end_time', v_end_time
-        )::text,
+        ),
         CURRENT_TIMESTAMP,
         CURRENT_TIMESTAMP
     );
@@ -184,7 +184,7 @@ BEGIN
             'discount_amount', discount_amount,
             'final_cost', final_cost,
             'visit_count', v_visit_count
-        )::text,
+        ),
         CURRENT_TIMESTAMP,
         CURRENT_TIMESTAMP
     );
@@ -275,7 +275,7 @@ BEGIN
         'doctors',
         'UPDATE',
         p_doctor_id,
-        report::text,
+        report,
         CURRENT_TIMESTAMP,
         CURRENT_TIMESTAMP
     );
@@ -428,7 +428,7 @@ async def create_procedures(conn):
                     'doctor_id', p_doctor_id,
                     'start_time', p_start_time,
                     'end_time', v_end_time
-                )::text,
+                ),
                 CURRENT_TIMESTAMP,
                 CURRENT_TIMESTAMP
             );
@@ -0,0 +1,152 @@
+import asyncio
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.db.instrumentation import classify_statement, instrument_engine
+
+logger = logging.getLogger(__name__)
+
+# Cookie, по которой чтения клиента идут в основную базу после его записи
+PRIMARY_COOKIE = "db_primary_until"
+
+_WRITE_OPERATIONS = {"insert", "update", "delete", "copy", "call", "create", "alter", "drop", "truncate"}
+
+# Отставание реплики в секундах; на основной базе (не в режиме восстановления) - 0
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReplicaRouter:
+    """
+    Реплики для чтения и выбор реплики с допустимым отставанием.
+
+    Отставание каждой реплики измеряется фоновой задачей (run_replica_monitor);
+    пока реплика не измерена, недоступна или отстает больше REPLICA_MAX_LAG_SECONDS,
+    чтения идут на другие реплики или в основную базу. Реплики выбираются по кругу.
+    """
+
+    def __init__(self, urls: List[str], max_lag: float):
+        self.max_lag = max_lag
+        self.engines: List[AsyncEngine] = []
+        self.session_factories = []
+        for url in urls:
+            engine = create_async_engine(
+                url,
+                pool_size=settings.REPLICA_POOL_SIZE,
+                max_overflow=settings.REPLICA_POOL_SIZE // 2,
+                pool_pre_ping=True,
+                pool_recycle=3600,
+                # Сессии реплик только читают, в том числе если репликой служит обычный сервер
+                connect_args={"server_settings": {"default_transaction_read_only": "on"}}
+            )
+            instrument_engine(engine)
+            self.engines.append(engine)
+            self.session_factories.append(
+                sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            )
+        # Отставание по номеру реплики, None - реплика недоступна
+        self.lag: Dict[int, Optional[float]] = {}
+        self._next = itertools.count()
+
+    async def _measure(self, index: int) -> Optional[float]:
+        try:
+            async with self.engines[index].connect() as conn:
+                return float((await conn.execute(REPLICA_LAG_QUERY)).scalar())
+        except Exception as e:
+            logger.warning(f"Replica {index} is unavailable: {e}")
+            return None
+
+    async def refresh(self) -> None:
+        """Измеряет отставание всех реплик"""
+        timeout = settings.REPLICA_LAG_CHECK_INTERVAL
+        for index in range(len(self.engines)):
+            try:
+                self.lag[index] = await asyncio.wait_for(self._measure(index), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Replica {index} lag check timed out")
+                self.lag[index] = None
+
+    def healthy(self) -> List[int]:
+        return [
+            index for index in range(len(self.engines))
+            if self.lag.get(index) is not None and self.lag[index] <= self.max_lag
+        ]
+
+    def pick(self) -> Optional[sessionmaker]:
+        """Фабрика сессий пригодной реплики или None, если читать нужно из основной базы"""
+        healthy = self.healthy()
+        if not healthy:
+            return None
+        return self.session_factories[healthy[next(self._next) % len(healthy)]]
+
+    async def dispose(self) -> None:
+        for engine in self.engines:
+            await engine.dispose()
+
+
+replica_router = ReplicaRouter(settings.DATABASE_REPLICA_URLS, settings.REPLICA_MAX_LAG_SECONDS)
+
+
+async def run_replica_monitor(interval: float) -> None:
+    """Периодически измеряет отставание реплик"""
+    while True:
+        try:
+            await replica_router.refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Replica lag check failed: {e}")
+        await asyncio.sleep(interval)
+
+
+# Отметка о записи в рамках текущего HTTP-запроса (см. ReadYourWritesMiddleware)
+request_writes: ContextVar[Optional[Dict[str, bool]]] = ContextVar("request_writes", default=None)
+
+
+def primary_required(cookies: Dict[str, str]) -> bool:
+    """Клиент недавно писал в базу: его чтения идут в основную базу"""
+    try:
+        return float(cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@event.listens_for(Session, "after_flush")
+def _flushed(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _executed(orm_execute_state):
+    statement = orm_execute_state.statement
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+    elif isinstance(statement, TextClause) and classify_statement(str(statement))[0] in _WRITE_OPERATIONS:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    if session.info.pop("has_writes", False):
+        writes = request_writes.get()
+        if writes is not None:
+            writes["wrote"] = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session):
+    session.info.pop("has_writes", None)
@@ -12,18 +12,25 @@ from app.db.models import (
 from app.core.utils import get_password_hash
 import logging
 from datetime import datetime, time, timezone
-from app.db.triggers import create_triggers
+from app.db.triggers import create_triggers, upgrade_action_logs_storage
 from app.db.procedures import create_procedures
+from app.db.partitions import PARTITIONED_TABLES, ensure_all_partitions
+from app.db.bootstrap import SchemaBootstrap, SchemaBundle, SqlBundle, metadata_ddl
+from app.db.instrumentation import instrument_engine
+from app.db.replicas import replica_router, primary_required
+from fastapi import Request
 import random
 
+# Вместо echo=True запросы замеряются и выборочно пишутся в журнал (см. instrumentation)
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=True,
+    echo=False,
     pool_size=20,
     max_overflow=10,
     pool_pre_ping=True,
     pool_recycle=3600
 )
+instrument_engine(engine)
 
 AsyncSessionLocal = sessionmaker(
     engine,
@@ -643,420 +650,422 @@ async def create_initial_data(session: AsyncSession):
         logging.error(f"Error creating initial data: {str(e)}")
         raise
 
-async def create_enum_types():
+# ENUM типы и функции приведения типов
+create_enum_types_sql = """
+DO $BODY$
+BEGIN
+    -- UserRole
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'userrole') THEN
+        CREATE TYPE "userrole" AS ENUM ('admin', 'doctor', 'patient', 'reception');
+    END IF;
+
+    -- Создаем функцию приведения типа
+    CREATE OR REPLACE FUNCTION text_to_userrole(text) RETURNS "userrole" AS $FUNC$
+    BEGIN
+        RETURN $1::"userrole";
+    EXCEPTION
+        WHEN invalid_text_representation THEN
+            RETURN 'patient'::"userrole";
+    END;
+    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
+
+    -- Создаем оператор приведения
+    DROP CAST IF EXISTS (text AS "userrole");
+    CREATE CAST (text AS "userrole") WITH FUNCTION text_to_userrole(text) AS IMPLICIT;
+
+    -- AppointmentStatus
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'appointmentstatus') THEN
+        CREATE TYPE "appointmentstatus" AS ENUM ('scheduled', 'confirmed', 'in_progress', 'completed', 'cancelled', 'no_show');
+    END IF;
+
+    -- Создаем функцию приведения типа
+    CREATE OR REPLACE FUNCTION text_to_appointmentstatus(text) RETURNS "appointmentstatus" AS $FUNC$
+    BEGIN
+        RETURN $1::"appointmentstatus";
+    EXCEPTION
+        WHEN invalid_text_representation THEN
+            RETURN 'scheduled'::"appointmentstatus";
+    END;
+    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
+
+    -- Создаем оператор приведения
+    DROP CAST IF EXISTS (text AS "appointmentstatus");
+    CREATE CAST (text AS "appointmentstatus") WITH FUNCTION text_to_appointmentstatus(text) AS IMPLICIT;
+
+    -- ServiceCategory
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'servicecategory') THEN
+        CREATE TYPE "servicecategory" AS ENUM ('therapy', 'surgery', 'diagnostics', 'consultation', 'prevention');
+    END IF;
+
+    -- Создаем функцию приведения типа
+    CREATE OR REPLACE FUNCTION text_to_servicecategory(text) RETURNS "servicecategory" AS $FUNC$
+    BEGIN
+        RETURN $1::"servicecategory";
+    EXCEPTION
+        WHEN invalid_text_representation THEN
+            RETURN 'consultation'::"servicecategory";
+    END;
+    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
+
+    -- Создаем оператор приведения
+    DROP CAST IF EXISTS (text AS "servicecategory");
+    CREATE CAST (text AS "servicecategory") WITH FUNCTION text_to_servicecategory(text) AS IMPLICIT;
+
+    -- PaymentStatus
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'paymentstatus') THEN
+        CREATE TYPE "paymentstatus" AS ENUM ('pending', 'completed', 'failed', 'refunded');
+    END IF;
+
+    -- Создаем функцию приведения типа
+    CREATE OR REPLACE FUNCTION text_to_paymentstatus(text) RETURNS "paymentstatus" AS $FUNC$
+    BEGIN
+        RETURN $1::"paymentstatus";
+    EXCEPTION
+        WHEN invalid_text_representation THEN
+            RETURN 'pending'::"paymentstatus";
+    END;
+    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
+
+    -- Создаем оператор приведения
+    DROP CAST IF EXISTS (text AS "paymentstatus");
+    CREATE CAST (text AS "paymentstatus") WITH FUNCTION text_to_paymentstatus(text) AS IMPLICIT;
+
+    -- PaymentMethod
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'paymentmethod') THEN
+        CREATE TYPE "paymentmethod" AS ENUM ('cash', 'card', 'insurance');
+    END IF;
+
+    -- Создаем функцию приведения типа
+    CREATE OR REPLACE FUNCTION text_to_paymentmethod(text) RETURNS "paymentmethod" AS $FUNC$
+    BEGIN
+        RETURN $1::"paymentmethod";
+    EXCEPTION
+        WHEN invalid_text_representation THEN
+            RETURN 'card'::"paymentmethod";
+    END;
+    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
+
+    -- Создаем оператор приведения
+    DROP CAST IF EXISTS (text AS "paymentmethod");
+    CREATE CAST (text AS "paymentmethod") WITH FUNCTION text_to_paymentmethod(text) AS IMPLICIT;
+
+    -- NotificationType
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'notificationtype') THEN
+        CREATE TYPE "notificationtype" AS ENUM ('appointment', 'reminder', 'system', 'payment');
+    END IF;
+
+    -- Создаем функцию приведения типа
+    CREATE OR REPLACE FUNCTION text_to_notificationtype(text) RETURNS "notificationtype" AS $FUNC$
+    BEGIN
+        RETURN $1::"notificationtype";
+    EXCEPTION
+        WHEN invalid_text_representation THEN
+            RETURN 'system'::"notificationtype";
+    END;
+    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
+
+    -- Создаем оператор приведения
+    DROP CAST IF EXISTS (text AS "notificationtype");
+    CREATE CAST (text AS "notificationtype") WITH FUNCTION text_to_notificationtype(text) AS IMPLICIT;
+
+    -- SpecialDayType
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'specialdaytype') THEN
+        CREATE TYPE "specialdaytype" AS ENUM ('holiday', 'vacation', 'sick_leave', 'training');
+    END IF;
+
+    -- Создаем функцию приведения типа
+    CREATE OR REPLACE FUNCTION text_to_specialdaytype(text) RETURNS "specialdaytype" AS $FUNC$
+    BEGIN
+        RETURN $1::"specialdaytype";
+    EXCEPTION
+        WHEN invalid_text_representation THEN
+            RETURN 'holiday'::"specialdaytype";
+    END;
+    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
+
+    -- Создаем оператор приведения
+    DROP CAST IF EXISTS (text AS "specialdaytype");
+    CREATE CAST (text AS "specialdaytype") WITH FUNCTION text_to_specialdaytype(text) AS IMPLICIT;
+
+    -- TreatmentStatus
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'treatmentstatus') THEN
+        CREATE TYPE "treatmentstatus" AS ENUM ('planned', 'in_progress', 'completed', 'cancelled');
+    END IF;
+
+    -- Создаем функцию приведения типа
+    CREATE OR REPLACE FUNCTION text_to_treatmentstatus(text) RETURNS "treatmentstatus" AS $FUNC$
+    BEGIN
+        RETURN $1::"treatmentstatus";
+    EXCEPTION
+        WHEN invalid_text_representation THEN
+            RETURN 'planned'::"treatmentstatus";
+    END;
+    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
+
+    -- Создаем оператор приведения
+    DROP CAST IF EXISTS (text AS "treatmentstatus");
+    CREATE CAST (text AS "treatmentstatus") WITH FUNCTION text_to_treatmentstatus(text) AS IMPLICIT;
+
+    -- RecordType
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'recordtype') THEN
+        CREATE TYPE "recordtype" AS ENUM ('note', 'prescription', 'diagnosis', 'test_result', 'examination');
+    END IF;
+
+    -- Создаем функцию приведения типа
+    CREATE OR REPLACE FUNCTION text_to_recordtype(text) RETURNS "recordtype" AS $FUNC$
+    BEGIN
+        RETURN $1::"recordtype";
+    EXCEPTION
+        WHEN invalid_text_representation THEN
+            RETURN 'note'::"recordtype";
+    END;
+    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
+
+    -- Создаем оператор приведения
+    DROP CAST IF EXISTS (text AS "recordtype");
+    CREATE CAST (text AS "recordtype") WITH FUNCTION text_to_recordtype(text) AS IMPLICIT;
+
+    -- RecordStatus
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'recordstatus') THEN
+        CREATE TYPE "recordstatus" AS ENUM ('active', 'archived', 'deleted');
+    END IF;
+
+    -- Создаем функцию приведения типа
+    CREATE OR REPLACE FUNCTION text_to_recordstatus(text) RETURNS "recordstatus" AS $FUNC$
+    BEGIN
+        RETURN $1::"recordstatus";
+    EXCEPTION
+        WHEN invalid_text_representation THEN
+            RETURN 'active'::"recordstatus";
+    END;
+    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
+
+    -- Создаем оператор приведения
+    DROP CAST IF EXISTS (text AS "recordstatus");
+    CREATE CAST (text AS "recordstatus") WITH FUNCTION text_to_recordstatus(text) AS IMPLICIT;
+
+    -- CertificateStatus
+    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'certificatestatus') THEN
+        CREATE TYPE "certificatestatus" AS ENUM ('issued', 'cancelled');
+    END IF;
+
+    -- Создаем функцию приведения типа
+    CREATE OR REPLACE FUNCTION text_to_certificatestatus(text) RETURNS "certificatestatus" AS $FUNC$
+    BEGIN
+        RETURN $1::"certificatestatus";
+    EXCEPTION
+        WHEN invalid_text_representation THEN
+            RETURN 'issued'::"certificatestatus";
+    END;
+    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
+
+    -- Создаем оператор приведения
+    DROP CAST IF EXISTS (text AS "certificatestatus");
+    CREATE CAST (text AS "certificatestatus") WITH FUNCTION text_to_certificatestatus(text) AS IMPLICIT;
+END
+$BODY$;
+"""
+
+# Представление для просмотра загруженности врачей
+create_doctor_workload_view = """
+CREATE OR REPLACE VIEW doctor_workload_view AS
+SELECT
+    d.id as doctor_id,
+    u.full_name as doctor_name,
+    d.experience_years,
+    s.name as specialization,
+    COUNT(a.id) as total_appointments,
+    COUNT(CASE WHEN a.status = 'completed' THEN 1 END) as completed_appointments,
+    COUNT(CASE WHEN a.status = 'cancelled' THEN 1 END) as cancelled_appointments,
+    d.average_rating,
+    d.rating_count
+FROM doctors d
+JOIN users u ON d.user_id = u.id
+JOIN specializations s ON d.specialization_id = s.id
+LEFT JOIN appointments a ON d.id = a.doctor_id
+GROUP BY
+    d.id, u.full_name, d.experience_years, s.name, d.average_rating, d.rating_count;
+"""
+
+# Представление для расписания врачей
+create_doctor_schedule_view = """
+CREATE OR REPLACE VIEW doctor_schedule_view AS
+SELECT
+    d.id as doctor_id,
+    u.full_name as doctor_name,
+    ds.day_of_week,
+    ds.start_time,
+    ds.end_time,
+    ds.is_active,
+    ARRAY(
+        SELECT json_build_object(
+            'id', a.id,
+            'patient_name', pu.full_name,
+            'service_name', s.name,
+            'start_time', a.start_time,
+            'end_time', a.end_time,
+            'status', a.status
+        )
+        FROM appointments a
+        JOIN users pu ON a.patient_id = pu.id
+        JOIN services s ON a.service_id = s.id
+        WHERE 
+            a.doctor_id = d.id 
+            AND EXTRACT(DOW FROM a.start_time) = ds.day_of_week
+            AND a.status != 'cancelled'
+        ORDER BY a.start_time
+    ) as appointments
+FROM doctors d
+JOIN users u ON d.user_id = u.id
+JOIN doctor_schedules ds ON d.id = ds.doctor_id
+"""
+
+async def create_enum_types(conn):
     """Creates all necessary ENUM types and casting functions in the database."""
-    try:
-        async with engine.connect() as conn:
-            # Создаем все необходимые ENUM типы и функции приведения типов
-            await conn.execute(text("""
-                DO $BODY$
-                BEGIN
-                    -- UserRole
-                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'userrole') THEN
-                        CREATE TYPE "userrole" AS ENUM ('admin', 'doctor', 'patient', 'reception');
-                    END IF;
-                    
-                    -- Создаем функцию приведения типа
-                    CREATE OR REPLACE FUNCTION text_to_userrole(text) RETURNS "userrole" AS $FUNC$
-                    BEGIN
-                        RETURN $1::"userrole";
-                    EXCEPTION
-                        WHEN invalid_text_representation THEN
-                            RETURN 'patient'::"userrole";
-                    END;
-                    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
-                    
-                    -- Создаем оператор приведения
-                    DROP CAST IF EXISTS (text AS "userrole");
-                    CREATE CAST (text AS "userrole") WITH FUNCTION text_to_userrole(text) AS IMPLICIT;
-                    
-                    -- AppointmentStatus
-                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'appointmentstatus') THEN
-                        CREATE TYPE "appointmentstatus" AS ENUM ('scheduled', 'confirmed', 'in_progress', 'completed', 'cancelled', 'no_show');
-                    END IF;
-                    
-                    -- Создаем функцию приведения типа
-                    CREATE OR REPLACE FUNCTION text_to_appointmentstatus(text) RETURNS "appointmentstatus" AS $FUNC$
-                    BEGIN
-                        RETURN $1::"appointmentstatus";
-                    EXCEPTION
-                        WHEN invalid_text_representation THEN
-                            RETURN 'scheduled'::"appointmentstatus";
-                    END;
-                    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
-                    
-                    -- Создаем оператор приведения
-                    DROP CAST IF EXISTS (text AS "appointmentstatus");
-                    CREATE CAST (text AS "appointmentstatus") WITH FUNCTION text_to_appointmentstatus(text) AS IMPLICIT;
-                    
-                    -- ServiceCategory
-                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'servicecategory') THEN
-                        CREATE TYPE "servicecategory" AS ENUM ('therapy', 'surgery', 'diagnostics', 'consultation', 'prevention');
-                    END IF;
-                    
-                    -- Создаем функцию приведения типа
-                    CREATE OR REPLACE FUNCTION text_to_servicecategory(text) RETURNS "servicecategory" AS $FUNC$
-                    BEGIN
-                        RETURN $1::"servicecategory";
-                    EXCEPTION
-                        WHEN invalid_text_representation THEN
-                            RETURN 'consultation'::"servicecategory";
-                    END;
-                    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
-                    
-                    -- Создаем оператор приведения
-                    DROP CAST IF EXISTS (text AS "servicecategory");
-                    CREATE CAST (text AS "servicecategory") WITH FUNCTION text_to_servicecategory(text) AS IMPLICIT;
-                    
-                    -- PaymentStatus
-                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'paymentstatus') THEN
-                        CREATE TYPE "paymentstatus" AS ENUM ('pending', 'completed', 'failed', 'refunded');
-                    END IF;
-                    
-                    -- Создаем функцию приведения типа
-                    CREATE OR REPLACE FUNCTION text_to_paymentstatus(text) RETURNS "paymentstatus" AS $FUNC$
-                    BEGIN
-                        RETURN $1::"paymentstatus";
-                    EXCEPTION
-                        WHEN invalid_text_representation THEN
-                            RETURN 'pending'::"paymentstatus";
-                    END;
-                    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
-                    
-                    -- Создаем оператор приведения
-                    DROP CAST IF EXISTS (text AS "paymentstatus");
-                    CREATE CAST (text AS "paymentstatus") WITH FUNCTION text_to_paymentstatus(text) AS IMPLICIT;
-                    
-                    -- PaymentMethod
-                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'paymentmethod') THEN
-                        CREATE TYPE "paymentmethod" AS ENUM ('cash', 'card', 'insurance');
-                    END IF;
-                    
-                    -- Создаем функцию приведения типа
-                    CREATE OR REPLACE FUNCTION text_to_paymentmethod(text) RETURNS "paymentmethod" AS $FUNC$
-                    BEGIN
-                        RETURN $1::"paymentmethod";
-                    EXCEPTION
-                        WHEN invalid_text_representation THEN
-                            RETURN 'card'::"paymentmethod";
-                    END;
-                    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
-                    
-                    -- Создаем оператор приведения
-                    DROP CAST IF EXISTS (text AS "paymentmethod");
-                    CREATE CAST (text AS "paymentmethod") WITH FUNCTION text_to_paymentmethod(text) AS IMPLICIT;
-                    
-                    -- NotificationType
-                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'notificationtype') THEN
-                        CREATE TYPE "notificationtype" AS ENUM ('appointment', 'reminder', 'system', 'payment');
-                    END IF;
-                    
-                    -- Создаем функцию приведения типа
-                    CREATE OR REPLACE FUNCTION text_to_notificationtype(text) RETURNS "notificationtype" AS $FUNC$
-                    BEGIN
-                        RETURN $1::"notificationtype";
-                    EXCEPTION
-                        WHEN invalid_text_representation THEN
-                            RETURN 'system'::"notificationtype";
-                    END;
-                    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
-                    
-                    -- Создаем оператор приведения
-                    DROP CAST IF EXISTS (text AS "notificationtype");
-                    CREATE CAST (text AS "notificationtype") WITH FUNCTION text_to_notificationtype(text) AS IMPLICIT;
-                    
-                    -- SpecialDayType
-                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'specialdaytype') THEN
-                        CREATE TYPE "specialdaytype" AS ENUM ('holiday', 'vacation', 'sick_leave', 'training');
-                    END IF;
-                    
-                    -- Создаем функцию приведения типа
-                    CREATE OR REPLACE FUNCTION text_to_specialdaytype(text) RETURNS "specialdaytype" AS $FUNC$
-                    BEGIN
-                        RETURN $1::"specialdaytype";
-                    EXCEPTION
-                        WHEN invalid_text_representation THEN
-                            RETURN 'holiday'::"specialdaytype";
-                    END;
-                    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
-                    
-                    -- Создаем оператор приведения
-                    DROP CAST IF EXISTS (text AS "specialdaytype");
-                    CREATE CAST (text AS "specialdaytype") WITH FUNCTION text_to_specialdaytype(text) AS IMPLICIT;
-                    
-                    -- TreatmentStatus
-                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'treatmentstatus') THEN
-                        CREATE TYPE "treatmentstatus" AS ENUM ('planned', 'in_progress', 'completed', 'cancelled');
-                    END IF;
-                    
-                    -- Создаем функцию приведения типа
-                    CREATE OR REPLACE FUNCTION text_to_treatmentstatus(text) RETURNS "treatmentstatus" AS $FUNC$
-                    BEGIN
-                        RETURN $1::"treatmentstatus";
-                    EXCEPTION
-                        WHEN invalid_text_representation THEN
-                            RETURN 'planned'::"treatmentstatus";
-                    END;
-                    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
-                    
-                    -- Создаем оператор приведения
-                    DROP CAST IF EXISTS (text AS "treatmentstatus");
-                    CREATE CAST (text AS "treatmentstatus") WITH FUNCTION text_to_treatmentstatus(text) AS IMPLICIT;
-                    
-                    -- RecordType
-                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'recordtype') THEN
-                        CREATE TYPE "recordtype" AS ENUM ('note', 'prescription', 'diagnosis', 'test_result', 'examination');
-                    END IF;
-                    
-                    -- Создаем функцию приведения типа
-                    CREATE OR REPLACE FUNCTION text_to_recordtype(text) RETURNS "recordtype" AS $FUNC$
-                    BEGIN
-                        RETURN $1::"recordtype";
-                    EXCEPTION
-                        WHEN invalid_text_representation THEN
-                            RETURN 'note'::"recordtype";
-                    END;
-                    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
-                    
-                    -- Создаем оператор приведения
-                    DROP CAST IF EXISTS (text AS "recordtype");
-                    CREATE CAST (text AS "recordtype") WITH FUNCTION text_to_recordtype(text) AS IMPLICIT;
-                    
-                    -- RecordStatus
-                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'recordstatus') THEN
-                        CREATE TYPE "recordstatus" AS ENUM ('active', 'archived', 'deleted');
-                    END IF;
-                    
-                    -- Создаем функцию приведения типа
-                    CREATE OR REPLACE FUNCTION text_to_recordstatus(text) RETURNS "recordstatus" AS $FUNC$
-                    BEGIN
-                        RETURN $1::"recordstatus";
-                    EXCEPTION
-                        WHEN invalid_text_representation THEN
-                            RETURN 'active'::"recordstatus";
-                    END;
-                    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
-                    
-                    -- Создаем оператор приведения
-                    DROP CAST IF EXISTS (text AS "recordstatus");
-                    CREATE CAST (text AS "recordstatus") WITH FUNCTION text_to_recordstatus(text) AS IMPLICIT;
-                    
-                    -- CertificateStatus
-                    IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'certificatestatus') THEN
-                        CREATE TYPE "certificatestatus" AS ENUM ('issued', 'cancelled');
-                    END IF;
-                    
-                    -- Создаем функцию приведения типа
-                    CREATE OR REPLACE FUNCTION text_to_certificatestatus(text) RETURNS "certificatestatus" AS $FUNC$
-                    BEGIN
-                        RETURN $1::"certificatestatus";
-                    EXCEPTION
-                        WHEN invalid_text_representation THEN
-                            RETURN 'issued'::"certificatestatus";
-                    END;
-                    $FUNC$ LANGUAGE plpgsql IMMUTABLE;
-                    
-                    -- Создаем оператор приведения
-                    DROP CAST IF EXISTS (text AS "certificatestatus");
-                    CREATE CAST (text AS "certificatestatus") WITH FUNCTION text_to_certificatestatus(text) AS IMPLICIT;
-                END
-                $BODY$;
-            """))
-            await conn.commit()
-            logging.info("Created ENUM types and casting functions successfully")
-    except Exception as e:
-        logging.error(f"Error creating ENUM types: {e}")
-        raise
+    await conn.execute(text(create_enum_types_sql))
 
-async def init_db():
-    """Initialize database."""
+async def upgrade_schema(conn):
+    """Изменения схемы, которые create_all не вносит в существующие таблицы"""
+    # Колонки отложенной отправки уведомлений. Уведомления, созданные до их
+    # появления и уже наступившие, считаются отправленными: иначе они скрылись бы
+    # от пользователей, а диспетчер разослал бы их повторно
+    await conn.execute(text("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = 'notifications'
+                AND column_name = 'is_sent'
+            ) THEN
+                ALTER TABLE notifications
+                ADD COLUMN is_sent BOOLEAN NOT NULL DEFAULT false,
+                ADD COLUMN IF NOT EXISTS sent_at TIMESTAMP WITH TIME ZONE;
+
+                UPDATE notifications
+                SET is_sent = true, sent_at = coalesce(sent_at, created_at)
+                WHERE scheduled_for IS NOT NULL AND scheduled_for <= now();
+            END IF;
+        END
+        $$;
+    """))
+    await conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_scheduled
+        ON notifications (scheduled_for)
+        WHERE NOT is_sent
+    """))
+    # Связь напоминания с приемом для отмены и переноса напоминаний
+    await conn.execute(text("""
+        ALTER TABLE notifications
+        ADD COLUMN IF NOT EXISTS appointment_id INTEGER REFERENCES appointments(id) ON DELETE CASCADE
+    """))
+    await conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_notifications_appointment
+        ON notifications (appointment_id)
+    """))
+
+    # Журнал аудита хранит JSONB-разницы изменений
+    await conn.execute(text(upgrade_action_logs_storage))
+    await conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_action_logs_record
+        ON action_logs (table_name, record_id, created_at)
+    """))
+    # Индекс постраничного вывода журнала по ключу (created_at, id)
+    await conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_action_logs_created_id
+        ON action_logs (created_at, id)
+    """))
+    await conn.execute(text("DROP INDEX IF EXISTS ix_action_logs_created_at"))
+
+    await conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_appointments_doctor_date
+        ON appointments (doctor_id, start_time)
+    """))
+    await conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_appointments_patient_date
+        ON appointments (patient_id, start_time)
+    """))
+    await conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_doctor_schedules_composite
+        ON doctor_schedules (doctor_id, day_of_week, is_active)
+    """))
+
+async def create_views(conn):
+    await conn.execute(text(create_doctor_workload_view))
+    await conn.execute(text(create_doctor_schedule_view))
+
+async def create_tables(conn):
+    # Создаем таблицы, добавленные после первоначальной инициализации
+    await conn.run_sync(Base.metadata.create_all)
+
+def partition_periods():
+    """Текущие периоды секционированных таблиц: секции меняются с их сменой"""
+    now = datetime.now(timezone.utc)
+    return [f"{spec.table}: {spec.period_start(now):%Y-%m-%d} +{spec.premake}" for spec in PARTITIONED_TABLES]
+
+# Версия начальных данных: увеличивается при изменении create_initial_data
+INITIAL_DATA_VERSION = "1"
+
+async def seed_initial_data(conn):
+    # Начальные данные создаются только в новой базе
+    has_users = await conn.execute(text("SELECT EXISTS (SELECT 1 FROM users)"))
+    if has_users.scalar():
+        return
+    session = AsyncSession(bind=conn, expire_on_commit=False)
     try:
-        # Создаем все необходимые ENUM типы и функции приведения типов
-        await create_enum_types()
-        
-        # Проверяем, существуют ли уже таблицы
-        async with engine.connect() as conn:
-            # Проверяем существование таблицы users как индикатор инициализации БД
-            result = await conn.execute(text("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'users'
-                );
-            """))
-            table_exists = result.scalar()
-            
-            if not table_exists:
-                logging.info("Database tables do not exist. Creating tables and initial data...")
-                
-                # Шаг 1: Создаем таблицы и индексы
-                async with engine.begin() as conn:
-                    # Create tables first
-                    await conn.run_sync(Base.metadata.create_all)
-                    
-                    # Create indices
-                    await conn.execute(text("""
-                        CREATE INDEX IF NOT EXISTS idx_appointments_doctor_date
-                        ON appointments (doctor_id, start_time)
-                    """))
-                    
-                    await conn.execute(text("""
-                        CREATE INDEX IF NOT EXISTS idx_appointments_patient_date
-                        ON appointments (patient_id, start_time)
-                    """))
-                    
-                    await conn.execute(text("""
-                        CREATE INDEX IF NOT EXISTS idx_doctor_schedules_composite
-                        ON doctor_schedules (doctor_id, day_of_week, is_active)
-                    """))
-                    
-                    # Создаем все триггеры
-                    await create_triggers(conn)
-                    
-                    # Создаем все процедуры
-                    await create_procedures(conn)
+        await create_initial_data(session)
+    finally:
+        await session.close()
 
-                # Шаг 2: Создаем начальные данные
-                async with AsyncSessionLocal() as session:
-                    await create_initial_data(session)
+# Наборы DDL в порядке применения; каждый применяется заново только при
+# изменении его отпечатка (см. SchemaBootstrap)
+SCHEMA_BUNDLES = [
+    SqlBundle("enum_types", create_enum_types),
+    SchemaBundle("tables", create_tables, lambda: metadata_ddl(Base.metadata)),
+    SchemaBundle("partitions", ensure_all_partitions, partition_periods),
+    SqlBundle("schema_upgrades", upgrade_schema),
+    SqlBundle("triggers", create_triggers),
+    SqlBundle("procedures", create_procedures),
+    SchemaBundle("initial_data", seed_initial_data, lambda: [INITIAL_DATA_VERSION]),
+    SqlBundle("views", create_views),
+]
 
-                # Шаг 3: Создаем представления после того, как данные созданы
-                async with engine.begin() as conn:
-                    # Создаем представление для просмотра загруженности врачей
-                    await conn.execute(text("""
-                        CREATE OR REPLACE VIEW doctor_workload_view AS
-                        SELECT
-                            d.id as doctor_id,
-                            u.full_name as doctor_name,
-                            d.experience_years,
-                            s.name as specialization,
-                            COUNT(a.id) as total_appointments,
-                            COUNT(CASE WHEN a.status = 'completed' THEN 1 END) as completed_appointments,
-                            COUNT(CASE WHEN a.status = 'cancelled' THEN 1 END) as cancelled_appointments,
-                            d.average_rating,
-                            d.rating_count
-                        FROM doctors d
-                        JOIN users u ON d.user_id = u.id
-                        JOIN specializations s ON d.specialization_id = s.id
-                        LEFT JOIN appointments a ON d.id = a.doctor_id
-                        GROUP BY
-                            d.id, u.full_name, d.experience_years, s.name, d.average_rating, d.rating_count;
-                    """))
-                    
-                    # Создаем представление для расписания врачей
-                    await conn.execute(text("""
-                        CREATE OR REPLACE VIEW doctor_schedule_view AS
-                        SELECT
-                            d.id as doctor_id,
-                            u.full_name as doctor_name,
-                            ds.day_of_week,
-                            ds.start_time,
-                            ds.end_time,
-                            ds.is_active,
-                            ARRAY(
-                                SELECT json_build_object(
-                                    'id', a.id,
-                                    'patient_name', pu.full_name,
-                                    'service_name', s.name,
-                                    'start_time', a.start_time,
-                                    'end_time', a.end_time,
-                                    'status', a.status
-                                )
-                                FROM appointments a
-                                JOIN users pu ON a.patient_id = pu.id
-                                JOIN services s ON a.service_id = s.id
-                                WHERE 
-                                    a.doctor_id = d.id 
-                                    AND EXTRACT(DOW FROM a.start_time) = ds.day_of_week
-                                    AND a.status != 'cancelled'
-                                ORDER BY a.start_time
-                            ) as appointments
-                        FROM doctors d
-                        JOIN users u ON d.user_id = u.id
-                        JOIN doctor_schedules ds ON d.id = ds.doctor_id
-                    """))
-                logging.info("Database initialization completed successfully")
-            else:
-                logging.info("Database tables already exist. Skipping initialization.")
-                
-                # Проверяем, нужно ли обновить представления
-                async with engine.begin() as conn:
-                    # Обновляем представления, так как они могли измениться
-                    await conn.execute(text("""
-                        CREATE OR REPLACE VIEW doctor_workload_view AS
-                        SELECT
-                            d.id as doctor_id,
-                            u.full_name as doctor_name,
-                            d.experience_years,
-                            s.name as specialization,
-                            COUNT(a.id) as total_appointments,
-                            COUNT(CASE WHEN a.status = 'completed' THEN 1 END) as completed_appointments,
-                            COUNT(CASE WHEN a.status = 'cancelled' THEN 1 END) as cancelled_appointments,
-                            d.average_rating,
-                            d.rating_count
-                        FROM doctors d
-                        JOIN users u ON d.user_id = u.id
-                        JOIN specializations s ON d.specialization_id = s.id
-                        LEFT JOIN appointments a ON d.id = a.doctor_id
-                        GROUP BY
-                            d.id, u.full_name, d.experience_years, s.name, d.average_rating, d.rating_count;
-                    """))
-                    
-                    await conn.execute(text("""
-                        CREATE OR REPLACE VIEW doctor_schedule_view AS
-                        SELECT
-                            d.id as doctor_id,
-                            u.full_name as doctor_name,
-                            ds.day_of_week,
-                            ds.start_time,
-                            ds.end_time,
-                            ds.is_active,
-                            ARRAY(
-                                SELECT json_build_object(
-                                    'id', a.id,
-                                    'patient_name', pu.full_name,
-                                    'service_name', s.name,
-                                    'start_time', a.start_time,
-                                    'end_time', a.end_time,
-                                    'status', a.status
-                                )
-                                FROM appointments a
-                                JOIN users pu ON a.patient_id = pu.id
-                                JOIN services s ON a.service_id = s.id
-                                WHERE 
-                                    a.doctor_id = d.id 
-                                    AND EXTRACT(DOW FROM a.start_time) = ds.day_of_week
-                                    AND a.status != 'cancelled'
-                                ORDER BY a.start_time
-                            ) as appointments
-                        FROM doctors d
-                        JOIN users u ON d.user_id = u.id
-                        JOIN doctor_schedules ds ON d.id = ds.doctor_id
-                    """))
-                    
-                    # Обновляем индексы
-                    await conn.execute(text("""
-                        CREATE INDEX IF NOT EXISTS idx_appointments_doctor_date
-                        ON appointments (doctor_id, start_time)
-                    """))
-                    
-                    await conn.execute(text("""
-                        CREATE INDEX IF NOT EXISTS idx_appointments_patient_date
-                        ON appointments (patient_id, start_time)
-                    """))
-                    
-                    await conn.execute(text("""
-                        CREATE INDEX IF NOT EXISTS idx_doctor_schedules_composite
-                        ON doctor_schedules (doctor_id, day_of_week, is_active)
-                    """))
-                logging.info("Database views and indices updated successfully")
-                
+schema_bootstrap = SchemaBootstrap(SCHEMA_BUNDLES)
+
+async def init_db():
+    """
+    Initialize database.
+
+    Наборы DDL с неизменившимися отпечатками пропускаются, поэтому повторный
+    запуск не выполняет DDL и не берет блокировки на таблицы.
+    """
+    try:
+        statuses = await schema_bootstrap.run(engine, force=settings.SCHEMA_BOOTSTRAP_FORCE)
+        applied = [name for name, status in statuses.items() if status == "applied"]
+        logging.info(f"Database initialization completed, applied bundles: {', '.join(applied) or 'none'}")
     except Exception as e:
         logging.error(f"Error initializing database: {str(e)}")
         raise
 
 async def get_db():
     async with AsyncSessionLocal() as session:
+        try:
+            yield session
+        except Exception as e:
+            await session.rollback()
+            raise e
+        finally:
+            await session.close()
+
+async def get_read_db(request: Request):
+    """
+    Сессия для эндпоинтов, которые только читают: на реплике, если есть реплика
+    с допустимым отставанием, иначе в основной базе. Клиент, который недавно
+    записывал данные, читает из основной базы и видит свои изменения.
+    """
+    session_factory = None
+    if not primary_required(request.cookies):
+        session_factory = replica_router.pick()
+    async with (session_factory or AsyncSessionLocal)() as session:
         try:
             yield session
         except Exception as e:
@@ -1,44 +1,128 @@
+from typing import Dict, List, Optional
+
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncConnection
 
+from app.core.config import settings
+
+# Таблицы, изменения которых пишутся в action_logs
+AUDITED_TABLES = [
+    'users', 'doctors', 'patients', 'appointments', 'medical_records',
+    'services', 'specializations', 'payments', 'doctor_schedules',
+    'doctor_reviews', 'doctor_specializations', 'notifications',
+    'treatments', 'treatment_steps', 'treatment_plans'
+]
+
+AUDIT_MODES = ('row', 'statement', 'off')
+
+AUDIT_TRANSITIONS = [
+    ('INSERT', 'NEW TABLE AS new_rows'),
+    ('UPDATE', 'NEW TABLE AS new_rows OLD TABLE AS old_rows'),
+    ('DELETE', 'OLD TABLE AS old_rows'),
+]
+
+# Разница двух версий строки: список измененных колонок и их старые и новые значения.
+# В журнал UPDATE попадает только она, полные копии строк пишутся лишь при INSERT и DELETE
+create_audit_diff_function = """
+CREATE OR REPLACE FUNCTION audit_diff(
+    old_row jsonb,
+    new_row jsonb,
+    OUT changed_columns text[],
+    OUT old_values jsonb,
+    OUT new_values jsonb
+)
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT
+        array_agg(n.key ORDER BY n.key),
+        jsonb_object_agg(n.key, old_row -> n.key),
+        jsonb_object_agg(n.key, n.value)
+    FROM jsonb_each(new_row) n
+    WHERE n.value IS DISTINCT FROM old_row -> n.key
+$$;
+"""
+
 # Триггер для логирования изменений в таблицах
 create_audit_trigger = """
 CREATE OR REPLACE FUNCTION log_changes()
 RETURNS TRIGGER 
 LANGUAGE plpgsql AS $$
+DECLARE
+    diff record;
 BEGIN
-    INSERT INTO action_logs (
-        table_name,
-        action_type,
-        record_id,
-        old_data,
-        new_data,
-        created_at,
-        updated_at
-    ) VALUES (
-        TG_TABLE_NAME,
-        TG_OP,
-        CASE
-            WHEN TG_OP = 'DELETE' THEN OLD.id
-            ELSE NEW.id
-        END,
-        CASE
-            WHEN TG_OP = 'DELETE' THEN row_to_json(OLD)::text
-            WHEN TG_OP = 'UPDATE' THEN row_to_json(OLD)::text
-            ELSE NULL
-        END,
-        CASE
-            WHEN TG_OP IN ('INSERT', 'UPDATE') THEN row_to_json(NEW)::text
-            ELSE NULL
-        END,
-        CURRENT_TIMESTAMP,
-        CURRENT_TIMESTAMP
-    );
-    RETURN NEW;
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO action_logs (table_name, action_type, record_id, old_data, new_data, created_at, updated_at)
+        VALUES (TG_TABLE_NAME, TG_OP, NEW.id, NULL, to_jsonb(NEW), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP);
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT * INTO diff FROM audit_diff(to_jsonb(OLD), to_jsonb(NEW));
+        -- Обновление без изменений не журналируется
+        IF diff.changed_columns IS NOT NULL THEN
+            INSERT INTO action_logs (
+                table_name, action_type, record_id, old_data, new_data, changed_columns, created_at, updated_at
+            ) VALUES (
+                TG_TABLE_NAME, TG_OP, NEW.id, diff.old_values, diff.new_values, diff.changed_columns,
+                CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+            );
+        END IF;
+    ELSE
+        INSERT INTO action_logs (table_name, action_type, record_id, old_data, new_data, created_at, updated_at)
+        VALUES (TG_TABLE_NAME, TG_OP, OLD.id, to_jsonb(OLD), NULL, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP);
+    END IF;
+    RETURN NULL;
 END;
 $$;
 """
 
+# Пакетный вариант аудита: триггер уровня оператора пишет в action_logs все
+# затронутые строки одним INSERT ... SELECT из таблиц переходов
+create_audit_batch_trigger = """
+CREATE OR REPLACE FUNCTION log_changes_batch()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- Таблицы переходов разбираются при первом выполнении оператора,
+    -- поэтому old_rows и new_rows упоминаются только в своих ветках
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO action_logs (table_name, action_type, record_id, old_data, new_data, created_at, updated_at)
+        SELECT TG_TABLE_NAME, TG_OP, n.id, NULL, to_jsonb(n), CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM new_rows n;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO action_logs (
+            table_name, action_type, record_id, old_data, new_data, changed_columns, created_at, updated_at
+        )
+        SELECT TG_TABLE_NAME, TG_OP, n.id, d.old_values, d.new_values, d.changed_columns,
+               CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        CROSS JOIN LATERAL audit_diff(to_jsonb(o), to_jsonb(n)) d
+        WHERE d.changed_columns IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO action_logs (table_name, action_type, record_id, old_data, new_data, created_at, updated_at)
+        SELECT TG_TABLE_NAME, TG_OP, o.id, to_jsonb(o), NULL, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
+        FROM old_rows o;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+"""
+
+# Перевод журнала, созданного до хранения разниц, на JSONB и список измененных колонок
+upgrade_action_logs_storage = """
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'action_logs'
+        AND column_name = 'new_data' AND data_type <> 'jsonb'
+    ) THEN
+        ALTER TABLE action_logs
+            ALTER COLUMN old_data TYPE jsonb USING old_data::jsonb,
+            ALTER COLUMN new_data TYPE jsonb USING new_data::jsonb,
+            ADD COLUMN IF NOT EXISTS changed_columns text[];
+    END IF;
+END
+$$;
+"""
+
 # Триггер для управления правами пользователей
 create_user_permissions_trigger = """
 CREATE OR REPLACE FUNCTION set_user_permissions()
@@ -927,6 +1011,8 @@ $$ LANGUAGE plpgsql;
 create_appointment_notification_trigger = """
 CREATE OR REPLACE FUNCTION handle_appointment_notifications()
 RETURNS TRIGGER AS $$
+DECLARE
+    needs_reminder BOOLEAN := TG_OP = 'INSERT';
 BEGIN
     -- При создании новой записи
     IF TG_OP = 'INSERT' THEN
@@ -970,9 +1056,21 @@ BEGIN
         JOIN doctors d ON d.id = NEW.doctor_id
         JOIN users u ON u.id = d.user_id
         WHERE p.id = NEW.patient_id;
-    
+
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- Отмена, неявка или перенос приема делают неотправленные напоминания
+        -- неактуальными; для перенесенного или возобновленного приема
+        -- напоминание создается заново
+        IF NEW.start_time IS DISTINCT FROM OLD.start_time
+            OR (NEW.status IN ('cancelled', 'no_show')) IS DISTINCT FROM (OLD.status IN ('cancelled', 'no_show')) THEN
+            DELETE FROM notifications
+            WHERE appointment_id = NEW.id AND NOT is_sent;
+            needs_reminder := true;
+        END IF;
+    END IF;
+
     -- При изменении статуса записи
-    ELSIF TG_OP = 'UPDATE' AND NEW.status != OLD.status THEN
+    IF TG_OP = 'UPDATE' AND NEW.status != OLD.status THEN
         -- Уведомление для пациента о изменении статуса
         INSERT INTO notifications (
             user_id, 
@@ -994,6 +1092,38 @@ BEGIN
         JOIN users u ON u.id = d.user_id
         WHERE p.id = NEW.patient_id;
     END IF;
+
+    IF needs_reminder THEN
+        -- Отложенное напоминание пациенту за сутки до приема,
+        -- отправляется диспетчером уведомлений по scheduled_for
+        INSERT INTO notifications (
+            user_id, 
+            type,
+            title, 
+            message, 
+            is_read,
+            is_sent,
+            scheduled_for,
+            appointment_id,
+            created_at
+        )
+        SELECT 
+            p.user_id,
+            'reminder',
+            'Напоминание о приеме',
+            'Напоминаем, что завтра у вас прием у врача ' || u.full_name || ' в ' || to_char(NEW.start_time, 'HH24:MI DD.MM.YYYY'),
+            false,
+            false,
+            NEW.start_time - INTERVAL '1 day',
+            NEW.id,
+            CURRENT_TIMESTAMP
+        FROM patients p
+        JOIN doctors d ON d.id = NEW.doctor_id
+        JOIN users u ON u.id = d.user_id
+        WHERE p.id = NEW.patient_id
+        AND NEW.status NOT IN ('cancelled', 'no_show')
+        AND NEW.start_time - INTERVAL '1 day' > CURRENT_TIMESTAMP;
+    END IF;
     
     RETURN NEW;
 END;
@@ -1268,11 +1398,231 @@ END;
 $$ LANGUAGE plpgsql;
 """
 
+# Публикация событий уведомлений через LISTEN/NOTIFY для потоковой доставки клиентам.
+# Триггеры уровня оператора с таблицами переходов: массовая отметка прочитанного
+# порождает одно событие на пользователя, а не на каждую строку.
+# Уведомление с scheduled_for скрыто от пользователя до отправки диспетчером:
+# событие created публикуется при вставке видимого уведомления или при отметке is_sent.
+create_notification_event_trigger = """
+CREATE OR REPLACE FUNCTION publish_notification_events()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM pg_notify('notification_events', json_build_object(
+            'event', 'created',
+            'user_id', n.user_id,
+            'notification', json_build_object(
+                'id', n.id,
+                'title', n.title,
+                'message', left(n.message, 1000),
+                'type', n.type,
+                'is_read', n.is_read,
+                'created_at', n.created_at
+            )
+        )::text)
+        FROM new_rows n
+        WHERE n.user_id IS NOT NULL
+        AND (n.scheduled_for IS NULL OR n.is_sent);
+    ELSIF TG_OP = 'UPDATE' THEN
+        -- Отложенное уведомление отправлено диспетчером
+        PERFORM pg_notify('notification_events', json_build_object(
+            'event', 'created',
+            'user_id', n.user_id,
+            'notification', json_build_object(
+                'id', n.id,
+                'title', n.title,
+                'message', left(n.message, 1000),
+                'type', n.type,
+                'is_read', n.is_read,
+                'created_at', n.created_at
+            )
+        )::text)
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.user_id IS NOT NULL
+        AND n.is_sent AND NOT o.is_sent;
+
+        PERFORM pg_notify('notification_events', json_build_object(
+            'event', 'read',
+            'user_id', changed.user_id
+        )::text)
+        FROM (
+            SELECT DISTINCT n.user_id
+            FROM new_rows n
+            JOIN old_rows o ON o.id = n.id
+            WHERE n.user_id IS NOT NULL
+            AND n.is_read IS DISTINCT FROM o.is_read
+        ) changed;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('notification_events', json_build_object(
+            'event', 'deleted',
+            'user_id', changed.user_id
+        )::text)
+        FROM (
+            SELECT DISTINCT o.user_id
+            FROM old_rows o
+            WHERE o.user_id IS NOT NULL
+        ) changed;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Поддержка денормализованных счетчиков непрочитанных уведомлений.
+# Изменение считается как разница между видимыми непрочитанными строками после
+# и до оператора, поэтому одна функция обслуживает вставку, отметку прочитанного,
+# отправку отложенного уведомления, удаление и перенос уведомления другому пользователю. Строки счетчиков
+# блокируются в порядке user_id, чтобы параллельные операторы не взаимоблокировались.
+create_notification_counter_trigger = """
+CREATE OR REPLACE FUNCTION maintain_notification_counters()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO notification_counters (user_id, unread_count, updated_at)
+        SELECT n.user_id, count(*), CURRENT_TIMESTAMP
+        FROM new_rows n
+        WHERE n.user_id IS NOT NULL AND NOT coalesce(n.is_read, false)
+        AND (n.scheduled_for IS NULL OR n.is_sent)
+        GROUP BY n.user_id
+        ORDER BY n.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET unread_count = notification_counters.unread_count + EXCLUDED.unread_count,
+            updated_at = EXCLUDED.updated_at;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO notification_counters (user_id, unread_count, updated_at)
+        SELECT delta.user_id, sum(delta.change), CURRENT_TIMESTAMP
+        FROM (
+            SELECT n.user_id, 1 AS change
+            FROM new_rows n
+            WHERE n.user_id IS NOT NULL AND NOT coalesce(n.is_read, false)
+            AND (n.scheduled_for IS NULL OR n.is_sent)
+            UNION ALL
+            SELECT o.user_id, -1 AS change
+            FROM old_rows o
+            WHERE o.user_id IS NOT NULL AND NOT coalesce(o.is_read, false)
+            AND (o.scheduled_for IS NULL OR o.is_sent)
+        ) delta
+        GROUP BY delta.user_id
+        HAVING sum(delta.change) <> 0
+        ORDER BY delta.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET unread_count = greatest(notification_counters.unread_count + EXCLUDED.unread_count, 0),
+            updated_at = EXCLUDED.updated_at;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE notification_counters c
+        SET unread_count = greatest(c.unread_count - d.removed, 0),
+            updated_at = CURRENT_TIMESTAMP
+        FROM (
+            SELECT o.user_id, count(*) AS removed
+            FROM old_rows o
+            WHERE o.user_id IS NOT NULL AND NOT coalesce(o.is_read, false)
+            AND (o.scheduled_for IS NULL OR o.is_sent)
+            GROUP BY o.user_id
+        ) d
+        WHERE c.user_id = d.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+async def create_notification_statement_triggers(conn: AsyncConnection):
+    """
+    Создает триггеры уведомлений уровня оператора: поддержку счетчиков
+    непрочитанных и публикацию событий в канал notification_events
+    """
+    await conn.execute(text(create_notification_event_trigger))
+    await conn.execute(text(create_notification_counter_trigger))
+
+    # Таблицы переходов допускаются только у триггеров с одним событием
+    for event, transition in [
+        ('INSERT', 'NEW TABLE AS new_rows'),
+        ('UPDATE', 'NEW TABLE AS new_rows OLD TABLE AS old_rows'),
+        ('DELETE', 'OLD TABLE AS old_rows'),
+    ]:
+        for prefix, function in [
+            ('notification_counters', 'maintain_notification_counters'),
+            ('notification_events', 'publish_notification_events'),
+        ]:
+            trigger_name = f"{prefix}_{event.lower()}_trigger"
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger_name} ON notifications"))
+            await conn.execute(text(f"""
+                CREATE TRIGGER {trigger_name}
+                AFTER {event} ON notifications
+                REFERENCING {transition}
+                FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+            """))
+
+def get_audit_mode(table: str) -> str:
+    """Режим аудита таблицы: row, statement или off"""
+    return settings.AUDIT_TABLE_MODES.get(table, settings.AUDIT_MODE)
+
+def audit_trigger_statements(table: str, mode: str) -> List[str]:
+    """SQL для переключения аудита таблицы в заданный режим"""
+    statements = [
+        f"DROP TRIGGER IF EXISTS audit_trigger ON {table};",
+        *[f"DROP TRIGGER IF EXISTS audit_{event.lower()}_trigger ON {table};" for event, _ in AUDIT_TRANSITIONS],
+    ]
+    if mode == 'row':
+        statements.append(f"""
+            CREATE TRIGGER audit_trigger
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION log_changes();
+        """)
+    elif mode == 'statement':
+        # Таблицы переходов допускаются только у триггеров с одним событием
+        for event, transition in AUDIT_TRANSITIONS:
+            statements.append(f"""
+                CREATE TRIGGER audit_{event.lower()}_trigger
+                AFTER {event} ON {table}
+                REFERENCING {transition}
+                FOR EACH STATEMENT EXECUTE FUNCTION log_changes_batch();
+            """)
+    return statements
+
+async def configure_audit_triggers(conn: AsyncConnection, modes: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    Подключает к таблицам аудит в выбранном режиме:
+    row - построчный триггер log_changes (по строке в action_logs на каждый вызов),
+    statement - триггеры уровня оператора log_changes_batch, пишущие всю пачку строк разом,
+    off - аудит таблицы отключен.
+    Возвращает примененные режимы по таблицам.
+    """
+    await conn.execute(text(create_audit_diff_function))
+    await conn.execute(text(create_audit_trigger))
+    await conn.execute(text(create_audit_batch_trigger))
+
+    applied = {}
+    for table in AUDITED_TABLES:
+        mode = (modes or {}).get(table) or get_audit_mode(table)
+        if mode not in AUDIT_MODES:
+            raise ValueError(f"Unknown audit mode '{mode}' for table {table}")
+
+        body = "\n".join(audit_trigger_statements(table, mode))
+        # Проверяем существование таблицы перед созданием триггера
+        await conn.execute(text(f"""
+            DO $$
+            BEGIN
+                IF EXISTS (
+                    SELECT FROM information_schema.tables
+                    WHERE table_schema = 'public'
+                    AND table_name = '{table}'
+                ) THEN
+                    {body}
+                END IF;
+            END
+            $$;
+        """))
+        applied[table] = mode
+    return applied
+
 async def create_triggers(conn: AsyncConnection):
     """Создает все необходимые триггеры в базе данных"""
     
     # Создаем функции триггеров
     trigger_functions = [
+        create_audit_diff_function,
         create_audit_trigger,
         create_user_permissions_trigger,
         create_doctor_rating_trigger,
@@ -1297,13 +1647,6 @@ async def create_triggers(conn: AsyncConnection):
     for func in trigger_functions:
         await conn.execute(text(func))
 
-    # Создаем триггеры для аудита
-    await conn.execute(text("DROP TRIGGER IF EXISTS audit_trigger ON users"))
-    await conn.execute(text("""
-        CREATE TRIGGER audit_trigger
-        AFTER INSERT OR UPDATE OR DELETE ON users
-        FOR EACH ROW EXECUTE FUNCTION log_changes()
-    """))
 
     # Триггер для прав пользователей
     await conn.execute(text("DROP TRIGGER IF EXISTS user_permissions_trigger ON users"))
@@ -1337,6 +1680,9 @@ async def create_triggers(conn: AsyncConnection):
         FOR EACH ROW EXECUTE FUNCTION handle_appointment_notifications()
     """))
 
+    # Триггеры счетчиков и публикации событий уведомлений
+    await create_notification_statement_triggers(conn)
+
     # Триггер для создания медицинской карты
     await conn.execute(text("DROP TRIGGER IF EXISTS create_medical_record_trigger ON appointments"))
     await conn.execute(text("""
@@ -1400,28 +1746,4 @@ async def create_triggers(conn: AsyncConnection):
     """))
     
     # Триггеры для логирования действий во всех основных таблицах
-    tables = [
-        'users', 'doctors', 'patients', 'appointments', 'medical_records',
-        'services', 'specializations', 'payments', 'doctor_schedules',
-        'doctor_reviews', 'doctor_specializations', 'notifications',
-        'treatments', 'treatment_steps', 'treatment_plans'
-    ]
-    
-    for table in tables:
-        # Проверяем существование таблицы перед созданием триггера
-        await conn.execute(text(f"""
-            DO $$
-            BEGIN
-                IF EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = '{table}'
-                ) THEN
-                    DROP TRIGGER IF EXISTS audit_trigger ON {table};
-                    CREATE TRIGGER audit_trigger
-                    AFTER INSERT OR UPDATE OR DELETE ON {table}
-                    FOR EACH ROW EXECUTE FUNCTION log_changes();
-                END IF;
-            END
-            $$;
-        """))
\ No newline at end of file
+    await configure_audit_triggers(conn)
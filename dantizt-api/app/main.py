@@ -3,7 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.db.session import init_db
 from app.core.logging_config import setup_logging
-from app.middleware import RequestLoggingMiddleware
+from app.middleware import RequestLoggingMiddleware, ReadYourWritesMiddleware
 from app.api.v1.api import api_router
 from app.core.metrics import setup_metrics
 
@@ -55,6 +55,9 @@ app.add_middleware(
 # Add request logging middleware
 app.add_middleware(RequestLoggingMiddleware)
 
+# После записи клиента его чтения временно идут в основную базу, а не на реплики
+app.add_middleware(ReadYourWritesMiddleware)
+
 # Setup Prometheus metrics
 setup_metrics(app)
 
@@ -74,22 +77,73 @@ async def root():
 async def startup_event():
     await init_db()
     
-    # Инициализация начальных значений метрик
-    from app.core.metrics import update_active_users
-    from app.db.session import get_db
-    from sqlalchemy import func, select
-    from app.db.models import User, UserRole
+    # Метрики из базы периодически обновляет один воркер-лидер
+    if settings.METRICS_REFRESH_INTERVAL > 0:
+        from app.services.metrics_refresh import metrics_refresher
+        metrics_refresher.start()
+    
+    # Компилируем шаблоны писем заранее, чтобы не разбирать их при первой отправке
+    from app.utils.email_templates import precompile_email_templates
+    precompile_email_templates()
+    
+    # Запускаем фоновую отправку писем из очереди
+    if settings.EMAIL_OUTBOX_ENABLED:
+        from app.services.email_outbox import email_outbox_sender
+        email_outbox_sender.start()
     
-    # Асинхронная функция для обновления метрик пользователей
-    async def init_user_metrics():
-        async for db in get_db():
-            # Получаем количество пользователей по ролям
-            for role in UserRole:
-                count = await db.execute(
-                    select(func.count()).where(User.role == role.value)
-                )
-                count = count.scalar() or 0
-                update_active_users(role.value, count)
+    # Подписываемся на события уведомлений для потоковой доставки клиентам
+    if settings.NOTIFICATION_STREAM_ENABLED:
+        from app.services.notification_hub import notification_hub
+        notification_hub.start()
     
-    # Запускаем инициализацию метрик
-    await init_user_metrics()
\ No newline at end of file
+    # Отправка отложенных уведомлений по scheduled_for
+    if settings.NOTIFICATION_DISPATCHER_ENABLED:
+        from app.services.notification_dispatcher import notification_dispatcher
+        notification_dispatcher.start()
+    
+    # Периодическая сверка счетчиков непрочитанных уведомлений
+    app.state.background_tasks = []
+    if settings.NOTIFICATION_COUNTER_REPAIR_INTERVAL_HOURS > 0:
+        import asyncio
+        from app.services.notifications import run_counter_repair
+        app.state.background_tasks.append(asyncio.create_task(
+            run_counter_repair(settings.NOTIFICATION_COUNTER_REPAIR_INTERVAL_HOURS)
+        ))
+
+    # Создание будущих и отсоединение устаревших секций
+    if settings.PARTITION_MAINTENANCE_INTERVAL_HOURS > 0:
+        import asyncio
+        from app.db.partitions import run_partition_maintenance
+        app.state.background_tasks.append(asyncio.create_task(
+            run_partition_maintenance(settings.PARTITION_MAINTENANCE_INTERVAL_HOURS)
+        ))
+
+    # Измерение отставания реплик для чтения
+    if settings.DATABASE_REPLICA_URLS:
+        import asyncio
+        from app.db.replicas import run_replica_monitor
+        app.state.background_tasks.append(asyncio.create_task(
+            run_replica_monitor(settings.REPLICA_LAG_CHECK_INTERVAL)
+        ))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
+
+    from app.services.metrics_refresh import metrics_refresher
+    await metrics_refresher.stop()
+
+    from app.db.replicas import replica_router
+    await replica_router.dispose()
+
+    from app.services.email_outbox import email_outbox_sender
+    from app.services.notification_hub import notification_hub
+    from app.services.notification_dispatcher import notification_dispatcher
+    await notification_dispatcher.stop()
+    await notification_hub.stop()
+    await email_outbox_sender.stop()
+
+    # Датчики завершившегося воркера больше не учитываются в /metrics
+    from app.core.metrics import mark_worker_dead
+    mark_worker_dead()
\ No newline at end of file
@@ -1 +1,2 @@
 from .logging import RequestLoggingMiddleware
+from .read_your_writes import ReadYourWritesMiddleware
@@ -0,0 +1,35 @@
+import time
+from typing import Callable
+
+from fastapi import Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.config import settings
+from app.core.security import COOKIE_SETTINGS
+from app.db.replicas import PRIMARY_COOKIE, request_writes
+
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    """
+    Если запрос зафиксировал запись в базу, клиент получает cookie, и следующие
+    READ_YOUR_WRITES_SECONDS секунд его чтения через get_read_db идут в основную
+    базу, а не на реплику, которая могла еще не получить изменения.
+    Cookie работает в любом воркере, в отличие от состояния в памяти.
+    """
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        writes = {"wrote": False}
+        token = request_writes.set(writes)
+        try:
+            response = await call_next(request)
+        finally:
+            request_writes.reset(token)
+
+        if writes["wrote"] and settings.DATABASE_REPLICA_URLS:
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                str(int(time.time()) + settings.READ_YOUR_WRITES_SECONDS),
+                max_age=settings.READ_YOUR_WRITES_SECONDS,
+                **COOKIE_SETTINGS
+            )
+        return response
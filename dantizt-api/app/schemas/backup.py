@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel
 
 class BackupBase(BaseModel):
@@ -6,6 +7,8 @@ class BackupBase(BaseModel):
     created_at: datetime
     size_bytes: int
     size_human: str
+    kind: Optional[str] = None
+    sha256: Optional[str] = None
 
 class BackupList(BaseModel):
     items: list[BackupBase]
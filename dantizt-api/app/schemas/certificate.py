@@ -69,3 +69,9 @@ class CertificatePaginatedResponse(BaseModel):
     page: int
     limit: int
     total_pages: int
+
+
+class BulkCertificateCreate(BaseModel):
+    """Схема для запуска массового формирования справок за год"""
+    year: int = Field(..., ge=1)
+    patient_ids: Optional[List[int]] = Field(None, description="Ограничить формирование указанными пациентами")
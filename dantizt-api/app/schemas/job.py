@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+
+class JobOut(BaseModel):
+    """Состояние фоновой задачи"""
+    id: str
+    kind: str
+    status: str
+    params: Dict[str, Any] = {}
+    progress: Dict[str, Any] = {}
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
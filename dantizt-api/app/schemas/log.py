@@ -1,17 +1,21 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional, List
 from datetime import datetime
 
 class LogBase(BaseModel):
     table_name: str
     action_type: str
     record_id: int
-    old_data: Optional[str] = None
-    new_data: Optional[str] = None
+    old_data: Optional[Dict[str, Any]] = None
+    new_data: Optional[Dict[str, Any]] = None
+    changed_columns: Optional[List[str]] = None
     created_at: datetime
 
 class LogResponse(LogBase):
     id: int
+    # Полные состояния записи до и после изменения, восстановленные по журналу
+    before: Optional[Dict[str, Any]] = None
+    after: Optional[Dict[str, Any]] = None
 
     class Config:
         from_attributes = True
@@ -25,11 +29,37 @@ class LogResponse(LogBase):
             record_id=log.record_id,
             old_data=log.old_data,
             new_data=log.new_data,
+            changed_columns=log.changed_columns,
             created_at=log.created_at
         )
 
 class LogList(BaseModel):
     items: List[LogResponse]
     total: int
+    # total - оценка планировщика, а не точный подсчет
+    total_is_estimate: bool = False
     page: int
     size: int
+    # Курсор следующей страницы, None на последней странице
+    next_cursor: Optional[str] = None
+
+class PartitionInfo(BaseModel):
+    table: Optional[str] = None
+    schema_name: str
+    partition: str
+    attached: bool
+    bounds: Optional[str] = None
+    size_bytes: int
+    estimated_rows: int
+
+class DbQueryLogSettings(BaseModel):
+    # Порог медленного запроса в миллисекундах
+    slow_query_ms: float = Field(ge=0)
+    # Доли запросов (0..1), попадающих в журнал медленных запросов и в отладочный журнал
+    slow_query_sample_rate: float = Field(ge=0, le=1)
+    echo_sample_rate: float = Field(ge=0, le=1)
+
+class DbQueryLogSettingsUpdate(BaseModel):
+    slow_query_ms: Optional[float] = Field(default=None, ge=0)
+    slow_query_sample_rate: Optional[float] = Field(default=None, ge=0, le=1)
+    echo_sample_rate: Optional[float] = Field(default=None, ge=0, le=1)
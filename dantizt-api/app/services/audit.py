@@ -0,0 +1,184 @@
+import base64
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Select, func, select, text, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import ActionLog
+from app.db.triggers import AUDITED_TABLES
+
+State = Optional[Dict[str, Any]]
+
+
+async def _current_row(db: AsyncSession, table_name: str, record_id: int) -> State:
+    # Имя таблицы подставляется в запрос, поэтому допускаем только журналируемые таблицы
+    if table_name not in AUDITED_TABLES:
+        return None
+    result = await db.execute(
+        text(f"SELECT to_jsonb(t) FROM {table_name} t WHERE t.id = :id"),
+        {"id": record_id}
+    )
+    return result.scalar()
+
+
+async def reconstruct_log_states(db: AsyncSession, log: ActionLog) -> Tuple[State, State]:
+    """
+    Восстанавливает полное состояние записи до и после изменения из журнала.
+
+    Записи UPDATE хранят только измененные колонки. Полная строка собирается
+    от ближайшего INSERT накатыванием последующих разниц, а если INSERT в журнале
+    нет (запись создана до включения аудита или его секция архивирована) -
+    от текущей строки таблицы откатом более поздних изменений.
+    Возвращает (None, None), если восстановить состояние не из чего.
+    """
+    if log.action_type == "INSERT":
+        return None, log.new_data
+    if log.action_type == "DELETE":
+        return log.old_data, None
+
+    position = tuple_(ActionLog.created_at, ActionLog.id)
+    history = select(ActionLog).where(
+        ActionLog.table_name == log.table_name,
+        ActionLog.record_id == log.record_id
+    )
+
+    # Накат от последнего INSERT до текущей записи включительно
+    result = await db.execute(
+        history
+        .where(position <= tuple_(log.created_at, log.id))
+        .order_by(ActionLog.created_at, ActionLog.id)
+    )
+    earlier = result.scalars().all()
+    inserts = [index for index, entry in enumerate(earlier) if entry.action_type == "INSERT"]
+    if inserts:
+        after = dict(earlier[inserts[-1]].new_data or {})
+        for entry in earlier[inserts[-1] + 1:]:
+            if entry.action_type == "UPDATE":
+                after.update(entry.new_data or {})
+    else:
+        # Откат от текущей строки (или от снимка при удалении) к моменту записи
+        result = await db.execute(
+            history
+            .where(position > tuple_(log.created_at, log.id))
+            .order_by(ActionLog.created_at.desc(), ActionLog.id.desc())
+        )
+        later = result.scalars().all()
+        # Список идет от новых к старым: ближайшее к записи удаление - последнее в нем
+        deletes = [index for index, entry in enumerate(later) if entry.action_type == "DELETE"]
+        if deletes:
+            state = later[deletes[-1]].old_data
+            later = later[deletes[-1] + 1:]
+        else:
+            state = await _current_row(db, log.table_name, log.record_id)
+        if state is None:
+            return None, None
+
+        after = dict(state)
+        for entry in later:
+            if entry.action_type == "UPDATE":
+                after.update(entry.old_data or {})
+
+    before = {**after, **(log.old_data or {})}
+    return before, after
+
+
+def encode_cursor(created_at: datetime, log_id: int) -> str:
+    """Курсор страницы журнала: позиция последней выданной записи"""
+    raw = f"{created_at.isoformat()}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Разбирает курсор. ValueError, если курсор поврежден"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, log_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(log_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+# Кэш количества записей журнала по набору фильтров: ключ -> (истекает, количество)
+_count_cache: Dict[Any, Tuple[float, int]] = {}
+_COUNT_CACHE_LIMIT = 1000
+
+
+async def estimate_rows(db: AsyncSession, query: Select) -> int:
+    """Оценка числа строк запроса по плану PostgreSQL, без выполнения самого запроса"""
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    conn = await db.connection()
+    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def count_logs(db: AsyncSession, query: Select, cache_key: Any) -> Tuple[int, bool]:
+    """
+    Количество записей журнала для страницы: (количество, признак оценки).
+
+    Большие выборки считаются по оценке планировщика, точный count(*) по
+    десяткам миллионов строк занимает секунды. Небольшие считаются точно
+    и кэшируются по набору фильтров на LOGS_COUNT_CACHE_TTL секунд.
+    """
+    now = time.monotonic()
+    cached = _count_cache.get(cache_key)
+    if cached and cached[0] > now:
+        return cached[1], False
+
+    estimate = await estimate_rows(db, query)
+    if estimate > settings.LOGS_EXACT_COUNT_THRESHOLD:
+        return estimate, True
+
+    result = await db.execute(select(func.count()).select_from(query.subquery()))
+    total = result.scalar() or 0
+
+    if len(_count_cache) >= _COUNT_CACHE_LIMIT:
+        _count_cache.clear()
+    _count_cache[cache_key] = (now + settings.LOGS_COUNT_CACHE_TTL, total)
+    return total, False
+
+
+# Справочник пар (таблица, действие), встречающихся в журнале
+_catalog_cache: Dict[str, Any] = {"expires": 0.0, "pairs": []}
+
+
+async def get_log_catalog(db: AsyncSession) -> List[Tuple[str, str]]:
+    """
+    Пары (таблица, действие) из журнала. Различных пар единицы, поэтому вместо
+    DISTINCT по всему журналу они перебираются рекурсивным запросом, делающим
+    по одному переходу по индексу ix_action_logs_table_action на каждую пару.
+    Результат кэшируется на LOGS_CATALOG_CACHE_TTL секунд.
+    """
+    now = time.monotonic()
+    if _catalog_cache["expires"] > now:
+        return _catalog_cache["pairs"]
+
+    result = await db.execute(text("""
+        WITH RECURSIVE catalog AS (
+            (
+                SELECT table_name, action_type FROM action_logs
+                ORDER BY table_name, action_type
+                LIMIT 1
+            )
+            UNION ALL
+            SELECT next.table_name, next.action_type
+            FROM catalog
+            CROSS JOIN LATERAL (
+                SELECT table_name, action_type FROM action_logs
+                WHERE (table_name, action_type) > (catalog.table_name, catalog.action_type)
+                ORDER BY table_name, action_type
+                LIMIT 1
+            ) next
+        )
+        SELECT table_name, action_type FROM catalog
+    """))
+    pairs = [(row.table_name, row.action_type) for row in result]
+    _catalog_cache.update(expires=now + settings.LOGS_CATALOG_CACHE_TTL, pairs=pairs)
+    return pairs
@@ -0,0 +1,101 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from app.core.config import settings
+from app.db.backup import DatabaseBackup
+from app.services.jobs import job_registry, JobStatus
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND_BACKUP = "database_backup"
+JOB_KIND_RESTORE = "database_restore"
+JOB_KIND_VERIFY = "database_backup_verify"
+JOB_KINDS = (JOB_KIND_BACKUP, JOB_KIND_RESTORE, JOB_KIND_VERIFY)
+
+# Сколько последних копий остается после создания новой
+BACKUPS_KEEP_LAST = 10
+
+# Задачи выполняются в отдельном потоке по одной: копия, восстановление и проверка
+# не мешают друг другу и не занимают пул потоков, обслуживающий запросы
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup-job")
+
+
+def backup_manager() -> DatabaseBackup:
+    return DatabaseBackup(settings.POSTGRES_DB)
+
+
+def run_backup_job(job_id: str, incremental: bool = False) -> None:
+    """Создает резервную копию, публикуя ход выгрузки в состоянии задачи"""
+    job_registry.update(job_id, status=JobStatus.running)
+    try:
+        manager = backup_manager()
+        backup_file = manager.create_backup(
+            incremental=incremental,
+            progress=lambda state: job_registry.update(job_id, progress=state)
+        )
+        manager.cleanup_old_backups(keep_last=BACKUPS_KEEP_LAST)
+
+        manifest = manager.read_manifest(backup_file)
+        job_registry.update(
+            job_id,
+            status=JobStatus.completed,
+            result={
+                "filename": backup_file.name,
+                "kind": manifest["kind"],
+                "size_bytes": manifest["size_bytes"],
+                "sha256": manifest["sha256"],
+                "tables": len(manifest["tables"]),
+                "rows": sum(table["rows"] for table in manifest["tables"])
+            }
+        )
+        logger.info(f"Backup job {job_id} completed: {backup_file.name}")
+    except Exception as e:
+        logger.error(f"Backup job {job_id} failed: {e}")
+        job_registry.update(job_id, status=JobStatus.failed, error=str(e))
+
+
+def run_restore_job(job_id: str, filename: str) -> None:
+    """Восстанавливает базу из копии, публикуя число загруженных таблиц"""
+    job_registry.update(job_id, status=JobStatus.running)
+    try:
+        manager = backup_manager()
+        restored = {"rows": 0}
+
+        def report(state: Dict[str, Any]) -> None:
+            # restore_backup сообщает строки одной таблицы, в задаче - нарастающий итог
+            restored["rows"] += state["rows"]
+            job_registry.update(job_id, progress={**state, "rows": restored["rows"]})
+
+        manager.restore_backup(manager.backup_dir / filename, progress=report)
+        job_registry.update(job_id, status=JobStatus.completed, result={"filename": filename, **restored})
+        logger.info(f"Restore job {job_id} completed: {filename}")
+    except Exception as e:
+        logger.error(f"Restore job {job_id} failed: {e}")
+        job_registry.update(job_id, status=JobStatus.failed, error=str(e))
+
+
+def run_verify_job(job_id: str, filename: str, deep: bool = False) -> None:
+    """Проверяет копию по манифесту без загрузки в базу"""
+    job_registry.update(job_id, status=JobStatus.running)
+    try:
+        manager = backup_manager()
+        result = manager.verify_backup(manager.backup_dir / filename, deep=deep)
+        job_registry.update(job_id, status=JobStatus.completed, result=result)
+    except Exception as e:
+        logger.error(f"Verify job {job_id} failed: {e}")
+        job_registry.update(job_id, status=JobStatus.failed, error=str(e))
+
+
+_RUNNERS = {
+    JOB_KIND_BACKUP: run_backup_job,
+    JOB_KIND_RESTORE: run_restore_job,
+    JOB_KIND_VERIFY: run_verify_job
+}
+
+
+def submit_backup_job(kind: str, **params: Any) -> Dict[str, Any]:
+    """Регистрирует задачу и ставит ее в очередь потока резервного копирования"""
+    job = job_registry.create(kind, params=params)
+    _executor.submit(_RUNNERS[kind], job["id"], **params)
+    return job
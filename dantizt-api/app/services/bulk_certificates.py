@@ -0,0 +1,142 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import List, Optional
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.services.jobs import job_registry, JobStatus
+from app.services.tax_deduction import (
+    get_tax_deduction_patients, get_tax_deduction_services, build_services_data
+)
+from app.utils.pdf_generator import generate_tax_deduction_certificate
+
+logger = logging.getLogger(__name__)
+
+JOB_KIND = "bulk_tax_certificates"
+
+bulk_dir = Path(settings.CERTIFICATE_BULK_DIR)
+bulk_dir.mkdir(parents=True, exist_ok=True)
+
+
+def bulk_archive_path(job_id: str) -> Path:
+    return bulk_dir / f"{job_id}.zip"
+
+
+def _archive_entry_name(patient_id: int, full_name: str) -> str:
+    safe_name = re.sub(r'[\\/:*?"<>|]+', "_", full_name).strip() or "patient"
+    return f"{patient_id}_{safe_name}.pdf"
+
+
+async def run_bulk_certificate_job(
+    job_id: str,
+    year: int,
+    patient_ids: Optional[List[int]],
+    staff_name: str,
+    staff_phone: str
+) -> None:
+    """
+    Формирует справки для налогового вычета всех подходящих пациентов за год.
+
+    Данные собираются двумя сгруппированными запросами, PDF генерируются параллельно
+    в пуле процессов и по мере готовности дописываются в ZIP-архив на диске,
+    так что в памяти одновременно находится лишь несколько документов.
+    """
+    job_registry.update(job_id, status=JobStatus.running)
+    try:
+        async with AsyncSessionLocal() as db:
+            patients = await get_tax_deduction_patients(db, year, patient_ids)
+            service_rows = await get_tax_deduction_services(db, year, patient_ids)
+
+        services_by_patient = {
+            patient_id: build_services_data(rows)
+            for patient_id, rows in itertools.groupby(service_rows, key=lambda row: row.patient_id)
+        }
+
+        total = len(patients)
+        job_registry.update(job_id, progress={"total": total, "processed": 0, "failed": 0})
+        logger.info(f"Bulk certificate job {job_id}: {total} patients for year {year}")
+
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        workers = max(1, settings.CERTIFICATE_BULK_WORKERS)
+        archive_path = bulk_archive_path(job_id)
+        loop = asyncio.get_running_loop()
+
+        processed = 0
+        errors = []
+
+        async def render(pool, patient):
+            services = services_by_patient.get(patient.patient_id, [])
+            pdf_content = await loop.run_in_executor(pool, partial(
+                generate_tax_deduction_certificate,
+                patient_name=patient.full_name,
+                patient_inn=patient.inn or "ИНН не указан",
+                clinic_name=settings.CLINIC_NAME,
+                clinic_inn=settings.CLINIC_INN,
+                clinic_address=settings.CLINIC_ADDRESS,
+                services=services,
+                total_amount=sum(service["cost"] for service in services),
+                payment_date=patient.last_payment_at.strftime("%d.%m.%Y"),
+                certificate_number=f"{year}-{patient.patient_id}-{timestamp}",
+                staff_name=staff_name,
+                staff_phone=staff_phone
+            ))
+            return patient, pdf_content
+
+        def collect(archive, task):
+            nonlocal processed
+            processed += 1
+            try:
+                patient, pdf_content = task.result()
+                archive.writestr(_archive_entry_name(patient.patient_id, patient.full_name), pdf_content)
+            except BrokenProcessPool:
+                # Пул процессов неработоспособен - продолжать задачу бессмысленно
+                raise
+            except Exception as e:
+                patient = tasks[task]
+                logger.error(f"Failed to render certificate for patient {patient.patient_id}: {e}")
+                errors.append({"patient_id": patient.patient_id, "error": str(e)})
+            job_registry.update(job_id, progress={"processed": processed, "failed": len(errors)})
+
+        # spawn вместо fork: дочерние процессы не наследуют event loop и соединения с БД
+        mp_context = multiprocessing.get_context("spawn")
+        tasks = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool, \
+                zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for patient in patients:
+                # Ограничиваем число документов в работе, чтобы не держать все PDF в памяти
+                while len(tasks) >= workers * 2:
+                    done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        collect(archive, task)
+                        del tasks[task]
+                tasks[asyncio.ensure_future(render(pool, patient))] = patient
+
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    collect(archive, task)
+                    del tasks[task]
+
+        job_registry.update(
+            job_id,
+            status=JobStatus.completed,
+            result={
+                "filename": f"tax_certificates_{year}.zip",
+                "size_bytes": archive_path.stat().st_size,
+                "generated": processed - len(errors),
+                "errors": errors
+            }
+        )
+        logger.info(f"Bulk certificate job {job_id} completed: {processed - len(errors)}/{total} generated")
+    except Exception as e:
+        logger.error(f"Bulk certificate job {job_id} failed: {e}")
+        job_registry.update(job_id, status=JobStatus.failed, error=str(e))
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Версия формата кэша. Увеличивается при изменении шаблона справки,
+# чтобы ранее сгенерированные файлы перестали совпадать по хэшу.
+CACHE_FORMAT_VERSION = 2
+
+
+class CertificateCache:
+    """Дисковый кэш PDF-справок, адресуемый по содержимому.
+
+    Файл справки хранится под именем ``{certificate_id}-{digest}.pdf``, где
+    digest - хэш входных данных, из которых сформирован документ. Если данные
+    справки изменились, хэш меняется и старый файл просто перестает использоваться.
+    Общий размер кэша ограничен, при превышении удаляются давно не использованные файлы.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        """
+        :param cache_dir: Директория для хранения файлов справок
+        :param max_bytes: Максимальный суммарный размер кэша в байтах
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def compute_digest(data: Dict[str, Any]) -> str:
+        """Вычисляет хэш входных данных справки"""
+        payload = json.dumps(
+            {"version": CACHE_FORMAT_VERSION, "data": data},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, certificate_id: int, digest: str) -> Path:
+        return self.cache_dir / f"{certificate_id}-{digest}.pdf"
+
+    def get(self, certificate_id: int, digest: str) -> Optional[Path]:
+        """
+        Возвращает путь к закэшированному файлу или None, если его нет.
+        Время модификации обновляется, чтобы файл не был вытеснен как старый.
+        """
+        path = self.path_for(certificate_id, digest)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, certificate_id: int, digest: str, content: bytes) -> Path:
+        """Атомарно сохраняет PDF в кэш и при необходимости вытесняет старые файлы"""
+        path = self.path_for(certificate_id, digest)
+
+        # Пишем во временный файл и переименовываем, чтобы параллельные
+        # запросы (в том числе из других воркеров) не увидели недописанный файл
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_name, path)
+        except Exception:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        # Удаляем устаревшие версии этой же справки
+        for stale in self.cache_dir.glob(f"{certificate_id}-*.pdf"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+
+        self._evict(keep=path)
+        return path
+
+    def invalidate(self, certificate_id: int) -> int:
+        """Удаляет все закэшированные файлы справки. Возвращает количество удаленных файлов"""
+        removed = 0
+        for path in self.cache_dir.glob(f"{certificate_id}-*.pdf"):
+            path.unlink(missing_ok=True)
+            removed += 1
+        if removed:
+            logger.info(f"Invalidated {removed} cached PDF(s) for certificate {certificate_id}")
+        return removed
+
+    def _evict(self, keep: Optional[Path] = None) -> None:
+        """Удаляет наиболее давно использованные файлы, пока кэш превышает лимит"""
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort(key=lambda entry: entry[0])
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            logger.debug(f"Evicted cached certificate {path.name}")
+
+
+certificate_cache = CertificateCache(
+    settings.CERTIFICATE_CACHE_DIR,
+    settings.CERTIFICATE_CACHE_MAX_BYTES
+)
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from email.utils import formataddr, make_msgid
+from typing import List, Optional
+
+import aiosmtplib
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import EmailOutbox, EmailStatus
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+async def enqueue_email(
+    email_to: str,
+    subject: str,
+    html: str,
+    attachment: Optional[bytes] = None,
+    attachment_name: Optional[str] = None,
+    attachment_type: str = "application/octet-stream",
+    db: Optional[AsyncSession] = None
+) -> int:
+    """
+    Ставит письмо в очередь исходящей почты и возвращает его идентификатор.
+
+    Если передана сессия, письмо добавляется в текущую транзакцию и будет
+    отправлено только после ее фиксации вызывающим кодом. Иначе письмо
+    сохраняется в отдельной транзакции.
+    """
+    message = EmailOutbox(
+        recipient=email_to,
+        subject=subject,
+        body=html,
+        attachment=attachment,
+        attachment_name=attachment_name,
+        attachment_type=attachment_type if attachment is not None else None,
+        status=EmailStatus.pending.value,
+        attempts=0
+    )
+
+    if db is not None:
+        db.add(message)
+        await db.flush()
+        return message.id
+
+    async with AsyncSessionLocal() as session:
+        session.add(message)
+        await session.commit()
+        logger.info(f"Email to {email_to} queued as #{message.id}")
+        return message.id
+
+
+class EmailOutboxSender:
+    """Фоновый отправитель писем из очереди email_outbox.
+
+    Держит одно долгоживущее SMTP-соединение и переиспользует его для всех
+    писем, закрывая только после периода простоя. Письма забираются пачками
+    через FOR UPDATE SKIP LOCKED с арендой на lease_seconds, поэтому несколько
+    воркеров uvicorn могут работать с очередью одновременно, не отправляя письма
+    дважды. Результат каждой отправки сохраняется сразу. Неудачные отправки
+    повторяются с экспоненциальной задержкой.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        use_tls: bool = True,
+        start_tls: bool = False,
+        timeout: float = 60,
+        batch_size: int = 50,
+        poll_interval: float = 2.0,
+        max_attempts: int = 8,
+        backoff_base: int = 30,
+        backoff_max: int = 3600,
+        idle_timeout: float = 60,
+        lease_seconds: int = 600,
+        session_factory=AsyncSessionLocal
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.start_tls = start_tls
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.idle_timeout = idle_timeout
+        self.lease_seconds = lease_seconds
+        self.session_factory = session_factory
+
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._last_used = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        """Возвращает открытое SMTP-соединение, подключаясь при необходимости"""
+        if self._smtp is not None and self._smtp.is_connected:
+            return self._smtp
+
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            timeout=self.timeout
+        )
+        await smtp.connect()
+        if self.username and self.password:
+            await smtp.login(self.username, self.password)
+        self._smtp = smtp
+        logger.info(f"Connected to SMTP server {self.hostname}:{self.port}")
+        return smtp
+
+    async def close(self) -> None:
+        """Закрывает SMTP-соединение"""
+        smtp, self._smtp = self._smtp, None
+        if smtp is None or not smtp.is_connected:
+            return
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    def _build_message(self, item: EmailOutbox) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = formataddr((settings.MAIL_FROM_NAME, settings.MAIL_FROM))
+        message["To"] = item.recipient
+        message["Subject"] = item.subject
+        message["Message-ID"] = make_msgid(domain=settings.MAIL_FROM.split("@")[-1])
+        message.set_content(item.body, subtype="html")
+
+        if item.attachment is not None:
+            maintype, _, subtype = (item.attachment_type or "application/octet-stream").partition("/")
+            message.add_attachment(
+                item.attachment,
+                maintype=maintype,
+                subtype=subtype,
+                filename=item.attachment_name or "attachment"
+            )
+        return message
+
+    async def _deliver(self, message: EmailMessage) -> None:
+        """Отправляет письмо, переподключаясь один раз, если сервер закрыл соединение"""
+        try:
+            smtp = await self._connect()
+            await smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            await self.close()
+            smtp = await self._connect()
+            await smtp.send_message(message)
+        self._last_used = time.monotonic()
+
+    def _retry_delay(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max))
+
+    async def _claim_batch(self) -> List[EmailOutbox]:
+        """
+        Забирает пачку готовых писем в короткой транзакции: увеличивает число
+        попыток и откладывает next_attempt_at на время аренды, чтобы письма не
+        выбрали другие воркеры. Если воркер упадет во время отправки, письмо
+        вернется в очередь по истечении аренды с уже учтенной попыткой.
+        """
+        async with self.session_factory() as db:
+            # Письма, отправка которых прервалась на последней попытке
+            await db.execute(
+                update(EmailOutbox)
+                .where(
+                    EmailOutbox.status == EmailStatus.pending.value,
+                    EmailOutbox.next_attempt_at <= func.now(),
+                    EmailOutbox.attempts >= self.max_attempts
+                )
+                .values(
+                    status=EmailStatus.failed.value,
+                    last_error=func.coalesce(EmailOutbox.last_error, "Delivery was interrupted")
+                )
+            )
+
+            result = await db.execute(
+                select(EmailOutbox)
+                .where(
+                    EmailOutbox.status == EmailStatus.pending.value,
+                    EmailOutbox.next_attempt_at <= func.now()
+                )
+                .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            items = result.scalars().all()
+            lease_until = datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+            for item in items:
+                item.attempts += 1
+                item.next_attempt_at = lease_until
+            await db.flush()
+            # Письма отправляются после фиксации, вне сессии
+            db.expunge_all()
+            await db.commit()
+            return items
+
+    async def _record(self, item: EmailOutbox, **values) -> None:
+        """Сохраняет результат отправки письма в отдельной короткой транзакции"""
+        async with self.session_factory() as db:
+            # Условие по attempts: письмо не перезаписывается, если после
+            # истечения аренды его уже забрал другой воркер
+            await db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id == item.id, EmailOutbox.attempts == item.attempts)
+                .values(**values)
+            )
+            await db.commit()
+
+    async def send_batch(self) -> int:
+        """
+        Отправляет одну пачку готовых к отправке писем.
+        Письма забираются отдельной транзакцией, а SMTP-отправка идет вне
+        транзакций и без блокировок строк. Возвращает количество обработанных писем.
+        """
+        items = await self._claim_batch()
+        for item in items:
+            try:
+                await self._deliver(self._build_message(item))
+            except Exception as e:
+                if item.attempts >= self.max_attempts:
+                    await self._record(item, status=EmailStatus.failed.value, last_error=str(e))
+                    logger.error(f"Email #{item.id} to {item.recipient} failed permanently: {e}")
+                else:
+                    await self._record(
+                        item,
+                        last_error=str(e),
+                        next_attempt_at=datetime.now(timezone.utc) + self._retry_delay(item.attempts)
+                    )
+                    logger.warning(f"Email #{item.id} to {item.recipient} failed (attempt {item.attempts}): {e}")
+                continue
+
+            await self._record(
+                item,
+                status=EmailStatus.sent.value,
+                sent_at=datetime.now(timezone.utc),
+                last_error=None
+            )
+            logger.info(f"Email #{item.id} sent to {item.recipient}")
+        return len(items)
+
+    async def run(self) -> None:
+        """Разбирает очередь, пока задача не будет отменена"""
+        logger.info("Email outbox sender started")
+        try:
+            while True:
+                try:
+                    processed = await self.send_batch()
+                except Exception as e:
+                    logger.error(f"Email outbox batch failed: {e}")
+                    await self.close()
+                    processed = 0
+
+                if processed >= self.batch_size:
+                    continue
+
+                if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                    await self.close()
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            await self.close()
+            logger.info("Email outbox sender stopped")
+
+    def start(self) -> None:
+        """Запускает отправителя в фоне текущего event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Останавливает отправителя и закрывает соединение"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+email_outbox_sender = EmailOutboxSender(
+    hostname=settings.MAIL_SERVER,
+    port=settings.MAIL_PORT,
+    username=settings.MAIL_USERNAME if settings.MAIL_USE_CREDENTIALS else None,
+    password=settings.MAIL_PASSWORD if settings.MAIL_USE_CREDENTIALS else None,
+    use_tls=settings.MAIL_SSL_TLS,
+    start_tls=settings.MAIL_STARTTLS,
+    timeout=settings.MAIL_TIMEOUT,
+    batch_size=settings.EMAIL_OUTBOX_BATCH_SIZE,
+    poll_interval=settings.EMAIL_OUTBOX_POLL_INTERVAL,
+    max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+    backoff_base=settings.EMAIL_OUTBOX_BACKOFF_BASE,
+    backoff_max=settings.EMAIL_OUTBOX_BACKOFF_MAX,
+    idle_timeout=settings.EMAIL_SMTP_IDLE_TIMEOUT,
+    lease_seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS
+)
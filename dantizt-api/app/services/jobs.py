@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class JobStatus:
+    pending = "pending"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+
+class JobRegistry:
+    """Реестр фоновых задач.
+
+    Состояние каждой задачи хранится в отдельном JSON-файле. Так статус задачи
+    доступен из любого воркера uvicorn, а не только из того, который ее запустил.
+    """
+
+    def __init__(self, jobs_dir: str):
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+
+    def _write(self, job: Dict[str, Any]) -> None:
+        fd, tmp_name = tempfile.mkstemp(dir=self.jobs_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(job, f, ensure_ascii=False, default=str)
+            os.replace(tmp_name, self._path(job["id"]))
+        except Exception:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+    def create(self, kind: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Регистрирует новую задачу и возвращает ее состояние"""
+        now = datetime.now().isoformat()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": JobStatus.pending,
+            "params": params or {},
+            "progress": {},
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None
+        }
+        with self._lock:
+            self._write(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Возвращает состояние задачи или None, если задача не найдена"""
+        if not _JOB_ID_RE.match(job_id):
+            return None
+        try:
+            with open(self._path(job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def update(self, job_id: str, progress: Optional[Dict[str, Any]] = None, **fields: Any) -> Dict[str, Any]:
+        """
+        Обновляет состояние задачи.
+
+        :param progress: Поля прогресса, которые объединяются с текущими
+        :param fields: Поля верхнего уровня (status, result, error)
+        """
+        with self._lock:
+            job = self.get(job_id)
+            if job is None:
+                raise KeyError(f"Job {job_id} not found")
+            if progress:
+                job["progress"].update(progress)
+            job.update(fields)
+            job["updated_at"] = datetime.now().isoformat()
+            if fields.get("status") in (JobStatus.completed, JobStatus.failed):
+                job["finished_at"] = job["updated_at"]
+            self._write(job)
+        return job
+
+
+job_registry = JobRegistry(settings.JOBS_DIR)
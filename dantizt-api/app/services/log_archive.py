@@ -0,0 +1,263 @@
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки, чтобы выгрузку выполнял один процесс
+LOG_ARCHIVE_LOCK_KEY = 730_003
+
+INDEX_FILE = "index.json"
+EXTENSIONS = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+
+def _open_chunk(path: Path, mode: str, compression: str):
+    """Открывает файл куска на чтение или запись текста с нужным сжатием"""
+    if compression == "zstd":
+        import zstandard
+
+        if mode == "w":
+            stream = zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb"))
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _aware(moment: Optional[datetime]) -> Optional[datetime]:
+    """Время без часового пояса считается временем UTC, как и в базе"""
+    if moment is not None and moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+class LogArchive:
+    """Холодное хранилище журнала действий.
+
+    Отсоединенные секции action_logs (см. app/db/partitions.py) выгружаются
+    в каталог ``{directory}/{секция}/`` кусками JSONL по chunk_rows строк,
+    сжатыми gzip или zstd. Рядом пишется index.json с числом строк и
+    минимальным и максимальным created_at каждого куска - по нему чтение
+    открывает только куски, пересекающиеся с запрошенным интервалом.
+    После записи индекса секция удаляется из базы.
+    """
+
+    def __init__(self, directory: str, compression: str = "gzip", chunk_rows: int = 50000):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Unsupported archive compression: {compression}")
+        self.directory = Path(directory)
+        self.compression = compression
+        self.chunk_rows = chunk_rows
+        # Разобранные индексы секций: путь -> (mtime, куски)
+        self._indexes: Dict[Path, Tuple[float, List[Dict[str, Any]]]] = {}
+
+    def _write_chunk(self, path: Path, lines: List[str]) -> None:
+        tmp_path = path.with_name(path.name + ".tmp")
+        with _open_chunk(tmp_path, "w", self.compression) as f:
+            for line in lines:
+                f.write(line)
+                f.write("\n")
+        # Секция удаляется из базы после выгрузки, поэтому куски должны быть на диске
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _write_index(self, partition_dir: Path, partition: str, chunks: List[Dict[str, Any]]) -> None:
+        tmp_path = partition_dir / (INDEX_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"partition": partition, "chunks": chunks}, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, partition_dir / INDEX_FILE)
+
+    async def export_partition(self, conn, schema: str, partition: str) -> List[Dict[str, Any]]:
+        """Выгружает секцию в куски и пишет индекс. Возвращает описания кусков"""
+        partition_dir = self.directory / partition
+        if partition_dir.exists():
+            # Остатки прерванной выгрузки
+            shutil.rmtree(partition_dir)
+        partition_dir.mkdir(parents=True)
+
+        chunks: List[Dict[str, Any]] = []
+        lines: List[str] = []
+        first_created_at = None
+
+        async def flush(last_created_at: str) -> None:
+            name = f"chunk_{len(chunks) + 1:05d}{EXTENSIONS[self.compression]}"
+            await run_in_threadpool(self._write_chunk, partition_dir / name, lines)
+            chunks.append({
+                "file": name,
+                "compression": self.compression,
+                "rows": len(lines),
+                "min_created_at": first_created_at,
+                "max_created_at": last_created_at
+            })
+
+        # Строки читаются курсором на сервере в порядке ключа страниц журнала,
+        # поэтому куски не пересекаются по времени
+        result = await conn.stream(text(f"""
+            SELECT row_to_json(t)::text AS line, t.created_at
+            FROM {schema}.{partition} t
+            ORDER BY t.created_at, t.id
+        """))
+        last_created_at = None
+        async for row in result:
+            if not lines:
+                first_created_at = row.created_at.isoformat()
+            lines.append(row.line)
+            last_created_at = row.created_at.isoformat()
+            if len(lines) >= self.chunk_rows:
+                await flush(last_created_at)
+                lines = []
+        if lines:
+            await flush(last_created_at)
+
+        await run_in_threadpool(self._write_index, partition_dir, partition, chunks)
+        return chunks
+
+    async def archive_partitions(self, engine: AsyncEngine) -> List[str]:
+        """
+        Выгружает все отсоединенные секции action_logs из схемы архива и удаляет их.
+        Возвращает имена выгруженных секций.
+        """
+        schema = settings.PARTITION_ARCHIVE_SCHEMA
+        archived = []
+        async with engine.connect() as conn:
+            locked = await conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": LOG_ARCHIVE_LOCK_KEY}
+            )
+            if not locked.scalar():
+                await conn.rollback()
+                return archived
+
+            try:
+                result = await conn.execute(text("""
+                    SELECT c.relname FROM pg_class c
+                    JOIN pg_namespace n ON n.oid = c.relnamespace
+                    WHERE n.nspname = :schema AND c.relkind = 'r'
+                    AND c.relname LIKE 'action\\_logs\\_%'
+                    AND c.relname <> 'action_logs_default'
+                    ORDER BY c.relname
+                """), {"schema": schema})
+                partitions = result.scalars().all()
+                await conn.commit()
+
+                for partition in partitions:
+                    # Индекс пишется последним: если он есть, выгрузка уже завершена
+                    if not (self.directory / partition / INDEX_FILE).exists():
+                        chunks = await self.export_partition(conn, schema, partition)
+                        await conn.commit()
+                        logger.info(
+                            f"Exported {sum(chunk['rows'] for chunk in chunks)} rows of {partition} "
+                            f"into {len(chunks)} chunk(s)"
+                        )
+                    await conn.execute(text(f"DROP TABLE {schema}.{partition}"))
+                    await conn.commit()
+                    archived.append(partition)
+            finally:
+                await conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": LOG_ARCHIVE_LOCK_KEY}
+                )
+                await conn.commit()
+        return archived
+
+    def _load_index(self, path: Path) -> List[Dict[str, Any]]:
+        mtime = path.stat().st_mtime
+        cached = self._indexes.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, encoding="utf-8") as f:
+            chunks = json.load(f)["chunks"]
+        for chunk in chunks:
+            chunk["path"] = path.parent / chunk["file"]
+            chunk["min"] = _parse_time(chunk["min_created_at"])
+            chunk["max"] = _parse_time(chunk["max_created_at"])
+        self._indexes[path] = (mtime, chunks)
+        return chunks
+
+    def chunks_for_range(self, start: Optional[datetime], end: Optional[datetime]) -> List[Dict[str, Any]]:
+        """Куски, пересекающиеся с интервалом, от новых к старым"""
+        chunks = []
+        for path in self.directory.glob(f"*/{INDEX_FILE}"):
+            for chunk in self._load_index(path):
+                if start and chunk["max"] < start:
+                    continue
+                if end and chunk["min"] > end:
+                    continue
+                chunks.append(chunk)
+        return sorted(chunks, key=lambda chunk: chunk["max"], reverse=True)
+
+    def _read_chunk(self, chunk: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with _open_chunk(chunk["path"], "r", chunk["compression"]) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def query(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        table_name: Optional[str] = None,
+        action_type: Optional[str] = None,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        limit: int = 100
+    ) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """
+        Записи архива в порядке (created_at, id) по убыванию.
+        Возвращает (до limit + 1 записей, количество, признак оценки количества).
+        Количество - сумма строк подходящих кусков; оно точное, только если
+        фильтр по таблице и действию не задан и куски целиком входят в интервал.
+        """
+        start, end = _aware(start), _aware(end)
+        if cursor:
+            cursor = (_aware(cursor[0]), cursor[1])
+
+        chunks = self.chunks_for_range(start, end)
+        total = sum(chunk["rows"] for chunk in chunks)
+        is_estimate = bool(table_name or action_type) or any(
+            (start and chunk["min"] < start) or (end and chunk["max"] > end) for chunk in chunks
+        )
+
+        items: List[Dict[str, Any]] = []
+        for chunk in chunks:
+            if cursor and chunk["min"] > cursor[0]:
+                continue
+            rows = []
+            for row in self._read_chunk(chunk):
+                created_at = datetime.fromisoformat(row["created_at"])
+                if start and created_at < start or end and created_at > end:
+                    continue
+                if table_name and row["table_name"] != table_name:
+                    continue
+                if action_type and row["action_type"] != action_type:
+                    continue
+                if cursor and (created_at, row["id"]) >= cursor:
+                    continue
+                row["created_at"] = created_at
+                rows.append(row)
+            rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+            items.extend(rows)
+            if len(items) > limit:
+                break
+        return items[:limit + 1], total, is_estimate
+
+
+log_archive = LogArchive(
+    settings.LOGS_ARCHIVE_DIR,
+    compression=settings.LOGS_ARCHIVE_COMPRESSION,
+    chunk_rows=settings.LOGS_ARCHIVE_CHUNK_ROWS
+)
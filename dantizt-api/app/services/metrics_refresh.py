@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.core.config import settings
+from app.core.metrics import update_active_users, update_appointments_today, update_pending_payments
+from app.db.models import Appointment, AppointmentStatus, Payment, PaymentStatus, User, UserRole
+from app.db.session import engine
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки лидера: метрики из базы обновляет один воркер
+METRICS_REFRESH_LOCK_KEY = 730_005
+
+
+async def refresh_metrics(conn: AsyncConnection) -> Dict[str, object]:
+    """
+    Пересчитывает метрики из базы: пользователей по ролям, записи на сегодня
+    по статусам и очередь неоплаченных платежей - по одному запросу с группировкой.
+    Отсутствующие в выборке роли и статусы получают 0.
+    """
+    roles = dict((await conn.execute(
+        select(User.role, func.count()).group_by(User.role)
+    )).all())
+    for role in UserRole:
+        update_active_users(role.value, roles.get(role.value, 0))
+
+    day_start = func.date_trunc('day', func.now())
+    statuses = {
+        status.value if isinstance(status, AppointmentStatus) else status: count
+        for status, count in (await conn.execute(
+            select(Appointment.status, func.count())
+            .where(
+                Appointment.start_time >= day_start,
+                Appointment.start_time < day_start + text("interval '1 day'")
+            )
+            .group_by(Appointment.status)
+        )).all()
+    }
+    for status in AppointmentStatus:
+        update_appointments_today(status.value, statuses.get(status.value, 0))
+
+    pending = (await conn.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(Payment.amount), 0),
+            func.coalesce(func.extract('epoch', func.now() - func.min(Payment.created_at)), 0)
+        )
+        .where(Payment.status == PaymentStatus.pending)
+    )).one()
+    update_pending_payments(pending[0], float(pending[1]), float(pending[2]))
+
+    return {"roles": roles, "appointments_today": statuses, "pending_payments": pending[0]}
+
+
+class MetricsRefresher:
+    """
+    Периодическое обновление метрик из базы на одном воркере.
+
+    Лидер держит сессионную advisory-блокировку на своем соединении и выполняет
+    на нем же запросы пересчета. Остальные воркеры раз в интервал пытаются взять
+    блокировку; если соединение лидера обрывается или воркер завершается,
+    блокировка освобождается и лидером становится другой воркер.
+    """
+
+    def __init__(self, db_engine: AsyncEngine, interval: float = 60.0):
+        self.engine = db_engine
+        self.interval = interval
+        self._conn: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._conn is not None
+
+    async def _elect(self) -> bool:
+        """Пытается стать лидером. Возвращает True, если воркер - лидер"""
+        if self._conn is not None:
+            return True
+        conn = await self.engine.connect()
+        try:
+            locked = (await conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": METRICS_REFRESH_LOCK_KEY}
+            )).scalar()
+            await conn.commit()
+        except Exception:
+            await conn.close()
+            raise
+        if not locked:
+            await conn.close()
+            return False
+        self._conn = conn
+        logger.info("Metrics refresh leadership acquired")
+        return True
+
+    async def resign(self) -> None:
+        """Отдает лидерство: закрытие соединения освобождает блокировку"""
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": METRICS_REFRESH_LOCK_KEY})
+            await conn.commit()
+        except Exception:
+            pass
+        finally:
+            await conn.close()
+
+    async def refresh_once(self) -> bool:
+        """Один проход: пересчитывает метрики, если воркер - лидер"""
+        if not await self._elect():
+            return False
+        try:
+            await refresh_metrics(self._conn)
+            await self._conn.commit()
+        except Exception:
+            # Соединение лидера могло оборваться вместе с блокировкой
+            await self.resign()
+            raise
+        return True
+
+    async def run(self) -> None:
+        """Обновляет метрики, пока задача не будет отменена. Первый проход - сразу"""
+        while True:
+            try:
+                await self.refresh_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Metrics refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.resign()
+
+
+metrics_refresher = MetricsRefresher(engine, interval=settings.METRICS_REFRESH_INTERVAL)
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import select, update, func
+
+from app.core.config import settings
+from app.db.models import Notification, User
+from app.db.session import AsyncSessionLocal
+from app.utils.email import send_email
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDispatcher:
+    """Отправка отложенных уведомлений по наступлении notifications.scheduled_for.
+
+    Пачка наступивших уведомлений забирается через FOR UPDATE SKIP LOCKED,
+    поэтому диспетчеры нескольких реплик API не пересекаются. Письма ставятся
+    в очередь исходящей почты в той же транзакции, а уведомления отмечаются
+    отправленными одним UPDATE. Это же UPDATE публикует событие для
+    потоковой доставки (push) и увеличивает счетчики непрочитанных.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        poll_interval: float = 10.0,
+        send_email_copy: bool = True,
+        session_factory=AsyncSessionLocal
+    ):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.send_email_copy = send_email_copy
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+
+    async def dispatch_batch(self) -> int:
+        """Отправляет одну пачку наступивших уведомлений. Возвращает их количество"""
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(
+                    Notification.id,
+                    Notification.title,
+                    Notification.message,
+                    User.email,
+                    User.full_name
+                )
+                .join(User, User.id == Notification.user_id)
+                .where(
+                    Notification.is_sent == False,
+                    Notification.scheduled_for <= func.now()
+                )
+                .order_by(Notification.scheduled_for, Notification.id)
+                .limit(self.batch_size)
+                .with_for_update(of=Notification, skip_locked=True)
+            )
+            due = result.all()
+            if not due:
+                return 0
+
+            if self.send_email_copy:
+                for item in due:
+                    if not item.email:
+                        continue
+                    await send_email(
+                        email_to=item.email,
+                        template_name="notification",
+                        environment={
+                            "full_name": item.full_name,
+                            "title": item.title,
+                            "message": item.message
+                        },
+                        db=db
+                    )
+
+            await db.execute(
+                update(Notification)
+                .where(Notification.id.in_([item.id for item in due]))
+                .values(is_sent=True, sent_at=func.now())
+            )
+            await db.commit()
+
+            logger.info(f"Dispatched {len(due)} scheduled notification(s)")
+            return len(due)
+
+    async def run(self) -> None:
+        """Отправляет наступившие уведомления, пока задача не будет отменена"""
+        logger.info("Notification dispatcher started")
+        while True:
+            try:
+                dispatched = await self.dispatch_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification dispatch failed: {e}")
+                dispatched = 0
+
+            # Полная пачка - вероятно, есть еще наступившие уведомления
+            if dispatched < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+notification_dispatcher = NotificationDispatcher(
+    batch_size=settings.NOTIFICATION_DISPATCH_BATCH_SIZE,
+    poll_interval=settings.NOTIFICATION_DISPATCH_POLL_INTERVAL,
+    send_email_copy=settings.NOTIFICATION_DISPATCH_EMAIL
+)
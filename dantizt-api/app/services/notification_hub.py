@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Set
+
+import asyncpg
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.services.notifications import get_unread_count
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "notification_events"
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    """Преобразует URL SQLAlchemy в DSN, понятный asyncpg"""
+    return database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+class NotificationHub:
+    """Раздача событий уведомлений подключенным клиентам в пределах процесса.
+
+    Процесс держит одно выделенное соединение с PostgreSQL, подписанное через
+    LISTEN на канал notification_events, и рассылает события в очереди
+    подписчиков нужного пользователя. Простаивающий клиент - это только
+    очередь в памяти, соединения с БД на каждого клиента не открываются.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        queue_size: int = 100,
+        reconnect_delay: float = 5.0,
+        session_factory=AsyncSessionLocal
+    ):
+        self.dsn = dsn
+        self.queue_size = queue_size
+        self.reconnect_delay = reconnect_delay
+        self.session_factory = session_factory
+
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._pending: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.listening = asyncio.Event()
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """Регистрирует клиента и возвращает очередь его событий"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(user_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def _put(self, queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+        # Медленный клиент не должен копить события бесконечно: вытесняем самое старое
+        if queue.full():
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        queue.put_nowait(event)
+
+    async def publish(self, user_id: int, event: Dict[str, Any]) -> None:
+        """Дополняет событие актуальным счетчиком и раздает подписчикам пользователя"""
+        if user_id not in self._subscribers:
+            return
+        try:
+            async with self.session_factory() as db:
+                event["unread_count"] = await get_unread_count(db, user_id)
+        except Exception as e:
+            logger.error(f"Failed to load unread count for user {user_id}: {e}")
+
+        for queue in list(self._subscribers.get(user_id, ())):
+            self._put(queue, event)
+
+    def _schedule(self, user_id: int, event: Dict[str, Any]) -> None:
+        task = asyncio.create_task(self.publish(user_id, event))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Malformed notification event: {payload[:200]}")
+            return
+
+        user_id = event.get("user_id")
+        # Большинство событий относится к пользователям, не подключенным к этому процессу
+        if user_id in self._subscribers:
+            self._schedule(user_id, event)
+
+    def _resync(self) -> None:
+        """После переподключения события могли быть потеряны - обновляем счетчики всем клиентам"""
+        for user_id in list(self._subscribers):
+            self._schedule(user_id, {"event": "resync", "user_id": user_id})
+
+    async def run(self) -> None:
+        """Держит LISTEN-соединение, переподключаясь при обрыве"""
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(CHANNEL, self._on_notify)
+                logger.info(f"Listening for notification events on channel {CHANNEL}")
+
+                if connected_before:
+                    self._resync()
+                connected_before = True
+                self.listening.set()
+
+                await closed.wait()
+                logger.warning("Notification listener connection lost")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification listener failed: {e}")
+            finally:
+                self.listening.clear()
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            await asyncio.sleep(self.reconnect_delay)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for task in list(self._pending):
+            task.cancel()
+
+
+notification_hub = NotificationHub(
+    asyncpg_dsn(settings.DATABASE_URL),
+    queue_size=settings.NOTIFICATION_STREAM_QUEUE_SIZE
+)
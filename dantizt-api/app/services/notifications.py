@@ -0,0 +1,108 @@
+import asyncio
+import logging
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import NotificationCounter
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки, чтобы восстановление счетчиков не выполнялось
+# одновременно в нескольких воркерах
+COUNTER_REPAIR_LOCK_KEY = 730_001
+
+
+async def get_unread_count(db: AsyncSession, user_id: int) -> int:
+    """Возвращает количество непрочитанных уведомлений пользователя по денормализованному счетчику"""
+    result = await db.execute(
+        select(NotificationCounter.unread_count)
+        .where(NotificationCounter.user_id == user_id)
+    )
+    return result.scalar() or 0
+
+
+# Условие уведомления, учитываемого в счетчике непрочитанных
+UNREAD_CONDITION = "NOT coalesce(n.is_read, false) AND (n.scheduled_for IS NULL OR n.is_sent)"
+
+
+async def repair_notification_counters(db: AsyncSession) -> int:
+    """
+    Сверяет счетчики непрочитанных уведомлений с таблицей notifications и исправляет расхождения.
+
+    Расхождения ищутся одним запросом по снимку без блокировок, затем каждый
+    счетчик исправляется в своей короткой транзакции: строка счетчика блокируется
+    FOR UPDATE, и только после этого уведомления пользователя пересчитываются.
+    Триггеры, уже изменившие счетчик, к этому моменту зафиксированы и видны в
+    пересчете, а еще не изменившие применят свою разницу поверх него, поэтому
+    вставки уведомлений (и записи на прием) не блокируются на время сверки.
+    Возвращает количество исправленных счетчиков или -1, если сверку уже выполняет другой процесс.
+    """
+    locked = await db.execute(
+        text("SELECT pg_try_advisory_xact_lock(:key)"),
+        {"key": COUNTER_REPAIR_LOCK_KEY}
+    )
+    if not locked.scalar():
+        await db.rollback()
+        return -1
+
+    drifted = await db.execute(text(f"""
+        SELECT coalesce(c.user_id, n.user_id)
+        FROM notification_counters c
+        FULL JOIN (
+            SELECT n.user_id, count(*) AS unread_count
+            FROM notifications n
+            JOIN users u ON u.id = n.user_id
+            WHERE {UNREAD_CONDITION}
+            GROUP BY n.user_id
+        ) n ON n.user_id = c.user_id
+        WHERE coalesce(c.unread_count, 0) <> coalesce(n.unread_count, 0)
+    """))
+    user_ids = drifted.scalars().all()
+    await db.commit()
+
+    fixed = 0
+    for user_id in user_ids:
+        await db.execute(text("""
+            INSERT INTO notification_counters (user_id, unread_count, updated_at)
+            VALUES (:user_id, 0, CURRENT_TIMESTAMP)
+            ON CONFLICT (user_id) DO NOTHING
+        """), {"user_id": user_id})
+        await db.execute(
+            text("SELECT 1 FROM notification_counters WHERE user_id = :user_id FOR UPDATE"),
+            {"user_id": user_id}
+        )
+        # Отдельный запрос после блокировки: в READ COMMITTED он видит все
+        # транзакции, которые успели изменить счетчик до нас
+        repaired = await db.execute(text(f"""
+            UPDATE notification_counters c
+            SET unread_count = d.unread_count,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (
+                SELECT count(*) AS unread_count
+                FROM notifications n
+                WHERE n.user_id = :user_id AND {UNREAD_CONDITION}
+            ) d
+            WHERE c.user_id = :user_id AND c.unread_count <> d.unread_count
+            RETURNING c.user_id
+        """), {"user_id": user_id})
+        fixed += len(repaired.all())
+        await db.commit()
+
+    if fixed:
+        logger.warning(f"Repaired {fixed} notification counter(s)")
+    return fixed
+
+
+async def run_counter_repair(interval_hours: float) -> None:
+    """Периодически восстанавливает счетчики. Первый проход выполняется сразу при запуске"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await repair_notification_counters(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Notification counter repair failed: {e}")
+        await asyncio.sleep(interval_hours * 3600)
@@ -0,0 +1,114 @@
+from typing import List, Optional, Sequence
+from datetime import datetime
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import (
+    Payment, PaymentStatus, Patient, User, Appointment, Service, AppointmentService
+)
+
+
+def _paid_in_year(year: int, patient_ids: Optional[Sequence[int]] = None):
+    """Условие для завершенных платежей за указанный год"""
+    conditions = [
+        Payment.status == PaymentStatus.completed,
+        Payment.created_at >= datetime(year, 1, 1),
+        Payment.created_at <= datetime(year, 12, 31, 23, 59, 59)
+    ]
+    if patient_ids:
+        conditions.append(Payment.patient_id.in_(patient_ids))
+    return and_(*conditions)
+
+
+async def get_tax_deduction_patients(
+    db: AsyncSession,
+    year: int,
+    patient_ids: Optional[Sequence[int]] = None
+) -> List:
+    """
+    Возвращает пациентов, которым можно выдать справку за год, одним сгруппированным запросом.
+
+    Пациент подходит, если у него есть завершенные платежи за год, привязанные к приемам.
+    Строки: (patient_id, full_name, email, inn, last_payment_at)
+    """
+    result = await db.execute(
+        select(
+            Patient.id.label("patient_id"),
+            User.full_name,
+            User.email,
+            Patient.inn,
+            func.max(Payment.created_at).label("last_payment_at")
+        )
+        .join(User, User.id == Patient.user_id)
+        .join(Payment, Payment.patient_id == Patient.id)
+        .where(_paid_in_year(year, patient_ids))
+        .group_by(Patient.id, User.full_name, User.email, Patient.inn)
+        .having(func.count(Payment.appointment_id) > 0)
+        .order_by(Patient.id)
+    )
+    return result.all()
+
+
+async def get_tax_deduction_payment_summary(db: AsyncSession, year: int, patient_id: int):
+    """
+    Возвращает сводку по завершенным платежам пациента за год одним запросом.
+    Строка: (payments_count, appointments_count, last_payment_at)
+    """
+    result = await db.execute(
+        select(
+            func.count(Payment.id).label("payments_count"),
+            func.count(Payment.appointment_id).label("appointments_count"),
+            func.max(Payment.created_at).label("last_payment_at")
+        )
+        .where(_paid_in_year(year, [patient_id]))
+    )
+    return result.one()
+
+
+async def get_tax_deduction_services(
+    db: AsyncSession,
+    year: int,
+    patient_ids: Optional[Sequence[int]] = None
+) -> List:
+    """
+    Возвращает оказанные услуги по оплаченным за год приемам одним запросом.
+
+    Каждый прием учитывается один раз, даже если по нему было несколько платежей.
+    Строки упорядочены по пациенту и дате приема: (patient_id, date, service_name, cost)
+    """
+    paid_appointments = (
+        select(Payment.patient_id, Payment.appointment_id)
+        .where(and_(
+            _paid_in_year(year, patient_ids),
+            Payment.appointment_id.isnot(None)
+        ))
+        .distinct()
+        .subquery()
+    )
+
+    result = await db.execute(
+        select(
+            paid_appointments.c.patient_id,
+            Appointment.start_time.label("date"),
+            Service.name.label("service_name"),
+            Service.cost
+        )
+        .select_from(paid_appointments)
+        .join(Appointment, Appointment.id == paid_appointments.c.appointment_id)
+        .join(AppointmentService, AppointmentService.appointment_id == Appointment.id)
+        .join(Service, Service.id == AppointmentService.service_id)
+        .order_by(paid_appointments.c.patient_id, Appointment.start_time, Appointment.id, Service.name)
+    )
+    return result.all()
+
+
+def build_services_data(rows) -> List[dict]:
+    """Преобразует строки услуг в формат, ожидаемый генератором PDF"""
+    return [
+        {
+            "name": row.service_name,
+            "cost": float(row.cost) if row.cost else 0.0,
+            "date": row.date.strftime("%d.%m.%Y")
+        }
+        for row in rows
+    ]
@@ -0,0 +1,76 @@
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateNotFound, select_autoescape
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+template_dir = Path(__file__).parent / 'email-templates'
+
+
+@lru_cache()
+def get_email_environment() -> Environment:
+    """
+    Возвращает общее для процесса окружение Jinja2 для шаблонов писем.
+
+    Скомпилированные шаблоны хранятся в памяти окружения, а байткод
+    дополнительно кэшируется на диске, чтобы новые воркеры не разбирали
+    шаблоны заново. Проверка изменений файлов включена только в режиме отладки.
+    """
+    cache_dir = Path(settings.EMAIL_TEMPLATE_CACHE_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        autoescape=select_autoescape(enabled_extensions=('html',), default_for_string=False),
+        bytecode_cache=FileSystemBytecodeCache(str(cache_dir)),
+        auto_reload=settings.DEBUG_MODE,
+        cache_size=-1,
+        trim_blocks=True,
+        lstrip_blocks=True
+    )
+
+
+def precompile_email_templates() -> int:
+    """Загружает все шаблоны писем заранее. Возвращает количество шаблонов"""
+    environment = get_email_environment()
+    names = environment.list_templates(extensions=('html', 'txt'))
+    for name in names:
+        environment.get_template(name)
+    logger.info(f"Precompiled {len(names)} email templates")
+    return len(names)
+
+
+def _get_localized_template(name: str, locale: str):
+    environment = get_email_environment()
+    try:
+        return environment.get_template(f"{locale}/{name}")
+    except TemplateNotFound:
+        if locale == settings.EMAIL_DEFAULT_LOCALE:
+            raise
+        return environment.get_template(f"{settings.EMAIL_DEFAULT_LOCALE}/{name}")
+
+
+def render_email(
+    template_name: str,
+    context: Optional[Dict[str, Any]] = None,
+    locale: Optional[str] = None
+) -> Tuple[str, str]:
+    """
+    Формирует тему и HTML письма по имени шаблона.
+
+    :param template_name: Имя шаблона без расширения, например "verification"
+    :param context: Переменные для подстановки в шаблон
+    :param locale: Язык письма, по умолчанию EMAIL_DEFAULT_LOCALE
+    :return: Кортеж (тема, HTML)
+    """
+    locale = locale or settings.EMAIL_DEFAULT_LOCALE
+    context = context or {}
+
+    subject = _get_localized_template(f"{template_name}.subject.txt", locale).render(context)
+    html = _get_localized_template(f"{template_name}.html", locale).render(context)
+    return " ".join(subject.split()), html
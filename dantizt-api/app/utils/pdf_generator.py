@@ -1,41 +1,283 @@
 from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import mm, cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import cm
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
-import os
+from num2words import num2words
+from functools import lru_cache
+from pathlib import Path
+import copy
 import io
+import logging
+import os
 from datetime import datetime
 
-# Попытка зарегистрировать шрифт с поддержкой кириллицы
-try:
-    # Путь к шрифту в системе
-    font_path = os.path.join(os.environ.get('WINDIR', ''), 'Fonts', 'times.ttf')
-    bold_font_path = os.path.join(os.environ.get('WINDIR', ''), 'Fonts', 'timesbd.ttf')
-    
-    if os.path.exists(font_path) and os.path.exists(bold_font_path):
-        pdfmetrics.registerFont(TTFont('TimesRussian', font_path))
-        pdfmetrics.registerFont(TTFont('TimesRussian-Bold', bold_font_path))
-        main_font = 'TimesRussian'
-        bold_font = 'TimesRussian-Bold'
-    else:
-        main_font = 'Helvetica'
-        bold_font = 'Helvetica-Bold'
-except:
-    main_font = 'Helvetica'
-    bold_font = 'Helvetica-Bold'
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Пары (обычный, жирный) шрифтов с поддержкой кириллицы в порядке приоритета.
+# Сначала ищем шрифты в настроенной директории (по умолчанию - системные шрифты
+# пакета fonts-dejavu-core), затем в других известных путях Linux и Windows.
+_FONT_CANDIDATES = [
+    (Path(settings.PDF_FONTS_DIR) / "DejaVuSerif.ttf", Path(settings.PDF_FONTS_DIR) / "DejaVuSerif-Bold.ttf"),
+    (Path("/usr/share/fonts/TTF/DejaVuSerif.ttf"), Path("/usr/share/fonts/TTF/DejaVuSerif-Bold.ttf")),
+    (Path(os.environ.get('WINDIR', 'C:\\Windows')) / "Fonts" / "times.ttf",
+     Path(os.environ.get('WINDIR', 'C:\\Windows')) / "Fonts" / "timesbd.ttf"),
+]
+
+
+@lru_cache()
+def register_fonts():
+    """
+    Регистрирует шрифты с поддержкой кириллицы один раз на процесс.
+
+    Returns:
+        tuple: Имена обычного и жирного шрифтов
+    """
+    for index, (font_path, bold_font_path) in enumerate(_FONT_CANDIDATES):
+        if not (font_path.exists() and bold_font_path.exists()):
+            if index == 0:
+                logger.warning(f"PDF fonts not found in {font_path.parent}, check PDF_FONTS_DIR")
+            continue
+        try:
+            pdfmetrics.registerFont(TTFont('CertificateFont', str(font_path)))
+            pdfmetrics.registerFont(TTFont('CertificateFont-Bold', str(bold_font_path)))
+            logger.info(f"Registered PDF fonts from {font_path.parent}")
+            return 'CertificateFont', 'CertificateFont-Bold'
+        except Exception as e:
+            logger.warning(f"Failed to register PDF fonts from {font_path.parent}: {e}")
+
+    logger.warning(
+        "No Cyrillic TTF fonts found, falling back to Helvetica: "
+        "Cyrillic text in PDF documents will not be rendered"
+    )
+    return 'Helvetica', 'Helvetica-Bold'
+
+
+def num_to_words_ru(number):
+    """Возвращает сумму прописью"""
+    try:
+        # Разделяем число на целую и дробную части
+        rubles, kopecks = str(float(number)).split('.')
+        kopecks = kopecks.ljust(2, '0')[:2]  # Убедимся, что у нас 2 цифры после запятой
+
+        # Преобразуем в слова
+        rubles_text = num2words(int(rubles), lang='ru')
+
+        # Определяем правильное склонение слова "рубль"
+        last_digit = int(rubles[-1]) if rubles else 0
+        last_two_digits = int(rubles[-2:]) if len(rubles) > 1 else last_digit
+
+        if last_two_digits in range(11, 20):
+            ruble_form = "рублей"
+        elif last_digit == 1:
+            ruble_form = "рубль"
+        elif last_digit in range(2, 5):
+            ruble_form = "рубля"
+        else:
+            ruble_form = "рублей"
+
+        # Формируем полную строку
+        result = f"{rubles_text} {ruble_form} {kopecks} копеек"
+        return result.capitalize()
+    except:
+        return f"{number} рублей"
+
+
+class TaxDeductionCertificateTemplate:
+    """Шаблон справки для налогового вычета.
+
+    Стили и неизменяемые абзацы (заголовки, подписи полей, сноска) создаются
+    один раз при построении шаблона. При генерации документа разбирается только
+    разметка переменных абзацев, а статические абзацы копируются поверхностно:
+    разобранный текст общий, а состояние верстки у каждой копии свое, поэтому
+    шаблон можно использовать из нескольких потоков одновременно.
+    """
+
+    def __init__(self, main_font: str, bold_font: str):
+        self.styles = {
+            'LeftHeader': ParagraphStyle(
+                name='LeftHeader',
+                fontName=main_font,
+                fontSize=10,
+                alignment=TA_LEFT,
+                spaceAfter=0.1*cm
+            ),
+            'CertificateTitle': ParagraphStyle(
+                name='CertificateTitle',
+                fontName=bold_font,
+                fontSize=14,
+                alignment=TA_CENTER,
+                spaceAfter=0.3*cm
+            ),
+            'CertNormal': ParagraphStyle(
+                name='CertNormal',
+                fontName=main_font,
+                fontSize=10,
+                alignment=TA_LEFT,
+                spaceAfter=0.2*cm
+            ),
+            'CertRight': ParagraphStyle(
+                name='CertRight',
+                fontName=main_font,
+                fontSize=10,
+                alignment=TA_RIGHT,
+                spaceAfter=0.2*cm
+            ),
+            'CertJustify': ParagraphStyle(
+                name='CertJustify',
+                fontName=main_font,
+                fontSize=10,
+                alignment=TA_JUSTIFY,
+                spaceAfter=0.2*cm
+            ),
+            'CertBold': ParagraphStyle(
+                name='CertBold',
+                fontName=bold_font,
+                fontSize=10,
+                alignment=TA_LEFT,
+                spaceAfter=0.2*cm
+            ),
+            'CertSmall': ParagraphStyle(
+                name='CertSmall',
+                fontName=main_font,
+                fontSize=8,
+                alignment=TA_LEFT,
+                spaceAfter=0.1*cm
+            ),
+        }
+
+        self.static = {
+            'ministry': self._paragraph("Министерство здравоохранения", 'LeftHeader'),
+            'country': self._paragraph("Российской Федерации", 'LeftHeader'),
+            'title': self._paragraph("СПРАВКА", 'CertificateTitle'),
+            'subtitle': self._paragraph("ОБ ОПЛАТЕ МЕДИЦИНСКИХ УСЛУГ ДЛЯ ПРЕДСТАВЛЕНИЯ", 'CertBold'),
+            'sum_hint': self._paragraph("(сумма прописью)", 'CertSmall'),
+            'relatives': self._paragraph("оказанные: ему (ей), супругу(е), сыну (дочери), матери (отцу)", 'CertNormal'),
+            'relatives_hint': self._paragraph("(нужное подчеркнуть)", 'CertSmall'),
+            'name_hint': self._paragraph("(Ф.И.О. полностью)", 'CertSmall'),
+            'stamp': self._paragraph("М.П.", 'CertBold'),
+            'footnote': self._paragraph(
+                "* Справка дает право на получение социального налогового вычета в соответствии с п.3 ч.1 ст.219 Налогового кодекса РФ.",
+                'CertSmall'
+            ),
+        }
+
+    def _paragraph(self, text, style):
+        return Paragraph(text, self.styles[style])
+
+    def _static(self, key):
+        return copy.copy(self.static[key])
+
+    def render(
+        self,
+        patient_name,
+        patient_inn,
+        clinic_name,
+        clinic_inn,
+        clinic_address,
+        total_amount,
+        payment_date,
+        certificate_number,
+        staff_name,
+        staff_phone
+    ):
+        """Формирует PDF-документ, подставляя в шаблон данные справки"""
+        buffer = io.BytesIO()
+
+        # Создаем PDF документ
+        doc = SimpleDocTemplate(
+            buffer,
+            pagesize=A4,
+            rightMargin=2*cm,
+            leftMargin=2*cm,
+            topMargin=1*cm,
+            bottomMargin=1*cm
+        )
+
+        sum_in_words = num_to_words_ru(total_amount)
+
+        elements = [
+            # Шапка документа в левом верхнем углу
+            self._static('ministry'),
+            self._static('country'),
+            self._paragraph(f"{clinic_name}", 'LeftHeader'),
+            self._paragraph(f"ИНН {clinic_inn}", 'LeftHeader'),
+            self._paragraph(f"Адрес: {clinic_address}", 'LeftHeader'),
+            Spacer(1, 1*cm),
+
+            # Заголовок справки
+            self._static('title'),
+            self._static('subtitle'),
+            self._paragraph(f"В НАЛОГОВЫЕ ОРГАНЫ РОССИЙСКОЙ ФЕДЕРАЦИИ № {certificate_number}", 'CertBold'),
+            Spacer(1, 0.5*cm),
+
+            # Дата выдачи
+            self._paragraph(f"от \"___\" __________ {datetime.now().year} г.", 'CertRight'),
+            Spacer(1, 0.5*cm),
+
+            # Информация о пациенте
+            self._paragraph(f"Выдана налогоплательщику (Ф.И.О.): <u>{patient_name}</u>", 'CertNormal'),
+            self._paragraph(f"ИНН налогоплательщика: <u>{patient_inn}</u>", 'CertNormal'),
+            self._paragraph(f"В том, что он (она) оплатил(а) медицинские услуги стоимостью <u>{total_amount} руб. 00 копеек</u>", 'CertNormal'),
+
+            # Сумма прописью
+            Spacer(1, 0.1*cm),
+            self._paragraph(f"<u>{sum_in_words}</u>", 'CertNormal'),
+            self._static('sum_hint'),
+
+            Spacer(1, 0.3*cm),
+            self._static('relatives'),
+            self._static('relatives_hint'),
+
+            Spacer(1, 0.3*cm),
+            self._paragraph(f"ФИО пациента: <u>{patient_name}</u>", 'CertNormal'),
+            self._static('name_hint'),
+
+            Spacer(1, 0.3*cm),
+            self._paragraph(f"Дата оплаты: <u>{payment_date}</u>", 'CertNormal'),
+
+            Spacer(1, 0.5*cm),
+            self._paragraph(f"Фамилия, имя, отчество и должность лица, выдавшего справку: <u>{staff_name}</u> регистратор", 'CertNormal'),
+
+            Spacer(1, 0.3*cm),
+            self._paragraph(f"Телефон: <u>{staff_phone}</u>", 'CertNormal'),
+
+            Spacer(1, 1*cm),
+            self._static('stamp'),
+
+            Spacer(1, 1*cm),
+            self._static('footnote'),
+        ]
+
+        # Генерируем PDF
+        doc.build(elements)
+
+        # Получаем содержимое буфера
+        pdf_content = buffer.getvalue()
+        buffer.close()
+
+        return pdf_content
+
+
+@lru_cache()
+def get_tax_deduction_template():
+    """Возвращает шаблон справки, создавая его при первом обращении в процессе"""
+    main_font, bold_font = register_fonts()
+    return TaxDeductionCertificateTemplate(main_font, bold_font)
+
 
 def generate_tax_deduction_certificate(
-    patient_name, 
-    patient_inn, 
-    clinic_name, 
-    clinic_inn, 
-    clinic_address, 
-    services, 
-    total_amount, 
+    patient_name,
+    patient_inn,
+    clinic_name,
+    clinic_inn,
+    clinic_address,
+    services,
+    total_amount,
     payment_date,
     certificate_number,
     staff_name,
@@ -43,7 +285,7 @@ def generate_tax_deduction_certificate(
 ):
     """
     Генерирует справку для налогового вычета в соответствии с законодательством РФ.
-    
+
     Args:
         patient_name (str): ФИО пациента
         patient_inn (str): ИНН пациента
@@ -56,193 +298,19 @@ def generate_tax_deduction_certificate(
         certificate_number (str): Номер справки
         staff_name (str): ФИО сотрудника регистратуры
         staff_phone (str): Телефон сотрудника регистратуры
-    
+
     Returns:
         bytes: PDF-документ в виде байтов
     """
-    buffer = io.BytesIO()
-    
-    # Создаем PDF документ
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=1*cm,
-        bottomMargin=1*cm
-    )
-    
-    # Стили
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(
-        name='CertHeader',
-        fontName=main_font,
-        fontSize=10,
-        alignment=TA_CENTER,
-        spaceAfter=0.1*cm
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CertificateTitle',
-        fontName=bold_font,
-        fontSize=14,
-        alignment=TA_CENTER,
-        spaceAfter=0.3*cm
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CertNormal',
-        fontName=main_font,
-        fontSize=10,
-        alignment=TA_LEFT,
-        spaceAfter=0.2*cm
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CertRight',
-        fontName=main_font,
-        fontSize=10,
-        alignment=TA_RIGHT,
-        spaceAfter=0.2*cm
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CertJustify',
-        fontName=main_font,
-        fontSize=10,
-        alignment=TA_JUSTIFY,
-        spaceAfter=0.2*cm
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CertBold',
-        fontName=bold_font,
-        fontSize=10,
-        alignment=TA_LEFT,
-        spaceAfter=0.2*cm
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CertUnderline',
-        fontName=main_font,
-        fontSize=10,
-        alignment=TA_LEFT,
-        spaceAfter=0.2*cm,
-        underline=True
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CertSmall',
-        fontName=main_font,
-        fontSize=8,
-        alignment=TA_LEFT,
-        spaceAfter=0.1*cm
-    ))
-    
-    # Элементы документа
-    elements = []
-    
-    # Шапка документа в левом верхнем углу
-    header_style = ParagraphStyle(
-        name='LeftHeader',
-        fontName=main_font,
-        fontSize=10,
-        alignment=TA_LEFT,
-        spaceAfter=0.1*cm
+    return get_tax_deduction_template().render(
+        patient_name=patient_name,
+        patient_inn=patient_inn,
+        clinic_name=clinic_name,
+        clinic_inn=clinic_inn,
+        clinic_address=clinic_address,
+        total_amount=total_amount,
+        payment_date=payment_date,
+        certificate_number=certificate_number,
+        staff_name=staff_name,
+        staff_phone=staff_phone
     )
-    
-    elements.append(Paragraph("Министерство здравоохранения", header_style))
-    elements.append(Paragraph("Российской Федерации", header_style))
-    elements.append(Paragraph(f"{clinic_name}", header_style))
-    elements.append(Paragraph(f"ИНН {clinic_inn}", header_style))
-    elements.append(Paragraph(f"Адрес: {clinic_address}", header_style))
-    
-    elements.append(Spacer(1, 1*cm))
-    
-    # Заголовок справки
-    elements.append(Paragraph("СПРАВКА", styles['CertificateTitle']))
-    elements.append(Paragraph("ОБ ОПЛАТЕ МЕДИЦИНСКИХ УСЛУГ ДЛЯ ПРЕДСТАВЛЕНИЯ", styles['CertBold']))
-    elements.append(Paragraph(f"В НАЛОГОВЫЕ ОРГАНЫ РОССИЙСКОЙ ФЕДЕРАЦИИ № {certificate_number}", styles['CertBold']))
-    
-    elements.append(Spacer(1, 0.5*cm))
-    
-    # Дата выдачи
-    current_date = datetime.now().strftime("%d.%m.%Y")
-    elements.append(Paragraph(f"от \"___\" __________ {datetime.now().year} г.", styles['CertRight']))
-    
-    elements.append(Spacer(1, 0.5*cm))
-    
-    # Информация о пациенте
-    elements.append(Paragraph(f"Выдана налогоплательщику (Ф.И.О.): <u>{patient_name}</u>", styles['CertNormal']))
-    elements.append(Paragraph(f"ИНН налогоплательщика: <u>{patient_inn}</u>", styles['CertNormal']))
-    
-    # Сумма прописью
-    from num2words import num2words
-    
-    def num_to_words_ru(number):
-        try:
-            # Разделяем число на целую и дробную части
-            rubles, kopecks = str(float(number)).split('.')
-            kopecks = kopecks.ljust(2, '0')[:2]  # Убедимся, что у нас 2 цифры после запятой
-            
-            # Преобразуем в слова
-            rubles_text = num2words(int(rubles), lang='ru')
-            
-            # Определяем правильное склонение слова "рубль"
-            last_digit = int(rubles[-1]) if rubles else 0
-            last_two_digits = int(rubles[-2:]) if len(rubles) > 1 else last_digit
-            
-            if last_two_digits in range(11, 20):
-                ruble_form = "рублей"
-            elif last_digit == 1:
-                ruble_form = "рубль"
-            elif last_digit in range(2, 5):
-                ruble_form = "рубля"
-            else:
-                ruble_form = "рублей"
-            
-            # Формируем полную строку
-            result = f"{rubles_text} {ruble_form} {kopecks} копеек"
-            return result.capitalize()
-        except:
-            return f"{number} рублей"
-    
-    # Сумма прописью
-    sum_in_words = num_to_words_ru(total_amount)
-    elements.append(Paragraph(f"В том, что он (она) оплатил(а) медицинские услуги стоимостью <u>{total_amount} руб. 00 копеек</u>", styles['CertNormal']))
-    
-    elements.append(Spacer(1, 0.1*cm))
-    elements.append(Paragraph(f"<u>{sum_in_words}</u>", styles['CertNormal']))
-    elements.append(Paragraph("(сумма прописью)", styles['CertSmall']))
-    
-    elements.append(Spacer(1, 0.3*cm))
-    elements.append(Paragraph("оказанные: ему (ей), супругу(е), сыну (дочери), матери (отцу)", styles['CertNormal']))
-    elements.append(Paragraph("(нужное подчеркнуть)", styles['CertSmall']))
-    
-    elements.append(Spacer(1, 0.3*cm))
-    elements.append(Paragraph(f"ФИО пациента: <u>{patient_name}</u>", styles['CertNormal']))
-    elements.append(Paragraph("(Ф.И.О. полностью)", styles['CertSmall']))
-    
-    elements.append(Spacer(1, 0.3*cm))
-    elements.append(Paragraph(f"Дата оплаты: <u>{payment_date}</u>", styles['CertNormal']))
-    
-    elements.append(Spacer(1, 0.5*cm))
-    elements.append(Paragraph(f"Фамилия, имя, отчество и должность лица, выдавшего справку: <u>{staff_name}</u> регистратор", styles['CertNormal']))
-    
-    elements.append(Spacer(1, 0.3*cm))
-    elements.append(Paragraph(f"Телефон: <u>{staff_phone}</u>", styles['CertNormal']))
-    
-    elements.append(Spacer(1, 1*cm))
-    elements.append(Paragraph("М.П.", styles['CertBold']))
-    
-    elements.append(Spacer(1, 1*cm))
-    elements.append(Paragraph("* Справка дает право на получение социального налогового вычета в соответствии с п.3 ч.1 ст.219 Налогового кодекса РФ.", styles['CertSmall']))
-    
-    # Генерируем PDF
-    doc.build(elements)
-    
-    # Получаем содержимое буфера
-    pdf_content = buffer.getvalue()
-    buffer.close()
-    
-    return pdf_content
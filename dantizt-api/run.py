@@ -1,7 +1,20 @@
+import os
+import shutil
+import tempfile
+
 import uvicorn
 from app.core.config import settings
 
 if __name__ == "__main__":
+    # Несколько воркеров собирают метрики Prometheus через общую директорию;
+    # файлы прошлого запуска удаляются до старта воркеров
+    if settings.WORKERS_COUNT > 1:
+        multiproc_dir = os.environ.setdefault(
+            "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "dantizt_prometheus")
+        )
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir)
+
     uvicorn.run(
         "app.main:app",
         host=settings.SERVER_HOST,
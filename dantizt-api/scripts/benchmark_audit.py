@@ -0,0 +1,103 @@
+"""
+Бенчмарк пропускной способности записи с аудитом изменений.
+
+Сравнивает вставку и обновление строк без аудита, с построчным триггером
+log_changes (режим row) и с пакетным триггером уровня оператора
+log_changes_batch (режим statement). Замеры выполняются на отдельной
+таблице audit_bench, которая удаляется вместе со своими записями action_logs.
+
+Запуск: python scripts/benchmark_audit.py [количество строк]
+"""
+import asyncio
+import os
+import sys
+import time
+
+import asyncpg
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.db.triggers import (
+    AUDIT_MODES, audit_trigger_statements, create_audit_trigger, create_audit_batch_trigger
+)
+from app.services.notification_hub import asyncpg_dsn
+
+TABLE = "audit_bench"
+
+
+async def reset_table(connection, mode: str) -> None:
+    await connection.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    await connection.execute(f"""
+        CREATE TABLE {TABLE} (
+            id serial PRIMARY KEY,
+            patient_id integer NOT NULL,
+            status varchar(32) NOT NULL,
+            notes text,
+            created_at timestamptz DEFAULT now()
+        )
+    """)
+    for statement in audit_trigger_statements(TABLE, mode):
+        await connection.execute(statement)
+
+
+async def timed(connection, work) -> float:
+    started = time.perf_counter()
+    async with connection.transaction():
+        await work()
+    return time.perf_counter() - started
+
+
+async def run_mode(connection, mode: str, rows: int) -> dict:
+    results = {}
+
+    # Одна строка на оператор - так пишет ORM при добавлении объектов по одному
+    await reset_table(connection, mode)
+    values = [(i % 500, "scheduled", f"Запись {i}") for i in range(rows)]
+    results["insert (row by row)"] = await timed(connection, lambda: connection.executemany(
+        f"INSERT INTO {TABLE} (patient_id, status, notes) VALUES ($1, $2, $3)", values
+    ))
+
+    # Пачка строк одним оператором - импорт, массовые операции процедур
+    await reset_table(connection, mode)
+    results["insert (one statement)"] = await timed(connection, lambda: connection.execute(f"""
+        INSERT INTO {TABLE} (patient_id, status, notes)
+        SELECT g % 500, 'scheduled', 'Запись ' || g FROM generate_series(1, {rows}) g
+    """))
+
+    results["update (one statement)"] = await timed(connection, lambda: connection.execute(
+        f"UPDATE {TABLE} SET status = 'completed'"
+    ))
+    results["delete (one statement)"] = await timed(connection, lambda: connection.execute(
+        f"DELETE FROM {TABLE}"
+    ))
+    return results
+
+
+async def main(rows: int) -> None:
+    connection = await asyncpg.connect(asyncpg_dsn(settings.DATABASE_URL))
+    try:
+        await connection.execute(create_audit_trigger)
+        await connection.execute(create_audit_batch_trigger)
+
+        modes = [mode for mode in AUDIT_MODES if mode != "off"]
+        table = {"off": await run_mode(connection, "off", rows)}
+        for mode in modes:
+            table[mode] = await run_mode(connection, mode, rows)
+
+        print(f"{rows} rows per operation, rows/s (higher is better)")
+        print(f"{'operation':<26}" + "".join(f"{mode:>14}" for mode in table))
+        for operation in table["off"]:
+            line = f"{operation:<26}"
+            for mode in table:
+                line += f"{rows / table[mode][operation]:>14,.0f}"
+            print(line)
+    finally:
+        await connection.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        await connection.execute("DELETE FROM action_logs WHERE table_name = $1", TABLE)
+        await connection.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
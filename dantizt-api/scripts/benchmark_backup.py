@@ -0,0 +1,118 @@
+"""
+Бенчмарк параллельной выгрузки и загрузки резервных копий.
+
+Создает отдельную базу {POSTGRES_DB}_backup_bench с несколькими таблицами,
+связанными внешними ключами, и замеряет время create_backup и restore_backup
+при разном числе соединений. База и копии удаляются после замеров.
+
+Запуск: python scripts/benchmark_backup.py [строк в таблице] [число соединений ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.config import settings
+from app.db.backup import DatabaseBackup, default_connection_params
+
+DATABASE = f"{settings.POSTGRES_DB}_backup_bench"
+CHILD_TABLES = 6
+
+
+def admin_connection():
+    conn = psycopg2.connect(dbname="postgres", **default_connection_params())
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    return conn
+
+
+def create_database(rows: int) -> None:
+    conn = admin_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS {DATABASE}")
+        cursor.execute(f"CREATE DATABASE {DATABASE}")
+    conn.close()
+
+    conn = psycopg2.connect(dbname=DATABASE, **default_connection_params())
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE bench_patients (
+                id serial PRIMARY KEY,
+                full_name text NOT NULL,
+                created_at timestamptz DEFAULT now()
+            )
+        """)
+        cursor.execute(f"""
+            INSERT INTO bench_patients (full_name)
+            SELECT 'Пациент ' || g FROM generate_series(1, {rows}) g
+        """)
+        for index in range(CHILD_TABLES):
+            table = f"bench_records_{index}"
+            cursor.execute(f"""
+                CREATE TABLE {table} (
+                    id serial PRIMARY KEY,
+                    patient_id integer NOT NULL REFERENCES bench_patients (id),
+                    status varchar(32) NOT NULL,
+                    notes text,
+                    created_at timestamptz DEFAULT now()
+                )
+            """)
+            cursor.execute(f"CREATE INDEX ix_{table}_patient ON {table} (patient_id, created_at)")
+            cursor.execute(f"""
+                INSERT INTO {table} (patient_id, status, notes)
+                SELECT (g % {rows}) + 1, 'completed', repeat('Запись ' || g, 4)
+                FROM generate_series(1, {rows}) g
+            """)
+    conn.commit()
+    conn.close()
+
+
+def drop_database() -> None:
+    conn = admin_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP DATABASE IF EXISTS {DATABASE}")
+    conn.close()
+
+
+def timed(work) -> float:
+    started = time.perf_counter()
+    work()
+    return time.perf_counter() - started
+
+
+def main(rows: int, worker_counts) -> None:
+    create_database(rows)
+    try:
+        with tempfile.TemporaryDirectory() as backup_dir:
+            manager = DatabaseBackup(DATABASE, backup_dir)
+            results = {}
+            for workers in worker_counts:
+                backup_time = timed(lambda: results.setdefault(workers, manager.create_backup(workers=workers)))
+                backup_file = results[workers]
+                restore_time = timed(lambda: manager.restore_backup(backup_file, workers=workers))
+                results[workers] = (backup_time, restore_time)
+                manager.delete_backup(backup_file)
+
+        base_backup, base_restore = results[worker_counts[0]]
+        print(f"{CHILD_TABLES + 1} tables x {rows} rows, wall-clock seconds (speedup)")
+        print(f"{'workers':>8}{'backup':>18}{'restore':>18}")
+        for workers, (backup_time, restore_time) in results.items():
+            print(
+                f"{workers:>8}"
+                f"{backup_time:>10.2f} ({base_backup / backup_time:4.1f}x)"
+                f"{restore_time:>10.2f} ({base_restore / restore_time:4.1f}x)"
+            )
+    finally:
+        drop_database()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200000,
+        [int(value) for value in sys.argv[2:]] or [1, 2, 4, 8]
+    )
@@ -0,0 +1,62 @@
+"""
+Микробенчмарк генерации PDF-справок для налогового вычета.
+
+Сравнивает стоимость одного документа при построении шаблона на каждый вызов
+(как было раньше) и при использовании заранее подготовленного шаблона.
+
+Запуск: python scripts/benchmark_pdf.py [количество документов]
+"""
+import sys
+import os
+import time
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.pdf_generator import (
+    TaxDeductionCertificateTemplate, get_tax_deduction_template, register_fonts
+)
+
+SAMPLE = dict(
+    patient_name="Иванов Иван Иванович",
+    patient_inn="123456789012",
+    clinic_name="ООО 'ДантиЗТ'",
+    clinic_inn="7701234567",
+    clinic_address="г. Москва, ул. Примерная, д. 1",
+    total_amount=15300.0,
+    payment_date="15.03.2024",
+    certificate_number="2024-1-20240315120000",
+    staff_name="Петрова Анна Сергеевна",
+    staff_phone="+7 (999) 123-45-67"
+)
+
+
+def measure(label, render, count):
+    started = time.perf_counter()
+    for _ in range(count):
+        render()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed / count * 1000:8.2f} ms/doc  ({count} docs, {elapsed:.2f} s)")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    started = time.perf_counter()
+    main_font, bold_font = register_fonts()
+    print(f"Font registration ({main_font}): {(time.perf_counter() - started) * 1000:.2f} ms (once per process)")
+
+    template = get_tax_deduction_template()
+    # Прогрев, чтобы не учитывать ленивую инициализацию reportlab
+    template.render(**SAMPLE)
+
+    measure(
+        "template per document",
+        lambda: TaxDeductionCertificateTemplate(main_font, bold_font).render(**SAMPLE),
+        count
+    )
+    measure("cached template", lambda: template.render(**SAMPLE), count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Обслуживание секционированных таблиц action_logs и appointments.
+
+Команды:
+    maintain             создать будущие секции и отсоединить устаревшие
+    report               размеры подключенных и архивных секций
+    convert <таблица>    перевести обычную таблицу в секционированную (окно обслуживания)
+
+Запуск: python scripts/manage_partitions.py maintain
+"""
+import asyncio
+import sys
+import os
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.db.session import engine
+from app.db.partitions import (
+    convert_to_partitioned, get_partition_spec, maintain_partitions, partition_report
+)
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+async def main(command: str, args):
+    async with engine.begin() as conn:
+        if command == "maintain":
+            result = await maintain_partitions(conn)
+            if result is None:
+                print("Обслуживание уже выполняется другим процессом")
+            else:
+                print(f"Создано секций: {len(result['created'])} {result['created']}")
+                print(f"Отсоединено секций: {len(result['detached'])} {result['detached']}")
+        elif command == "report":
+            for item in await partition_report(conn):
+                state = "attached" if item["attached"] else "archived"
+                print(
+                    f"{item['schema']}.{item['partition']:<32} {state:<9} "
+                    f"{format_size(item['size_bytes']):>10} {item['estimated_rows']:>12} rows  {item['bounds'] or ''}"
+                )
+        elif command == "convert" and args:
+            converted = await convert_to_partitioned(conn, get_partition_spec(args[0]))
+            print("Таблица переведена" if converted else "Таблица уже секционирована")
+        else:
+            print(__doc__)
+            sys.exit(1)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "", sys.argv[2:]))
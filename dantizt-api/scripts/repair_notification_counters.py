@@ -0,0 +1,24 @@
+"""
+Скрипт для сверки счетчиков непрочитанных уведомлений с таблицей notifications
+"""
+import asyncio
+import sys
+import os
+
+# Добавляем корневую директорию проекта в sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.db.session import AsyncSessionLocal
+from app.services.notifications import repair_notification_counters
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        fixed = await repair_notification_counters(db)
+
+    if fixed < 0:
+        print("Сверка уже выполняется другим процессом")
+    else:
+        print(f"Исправлено счетчиков: {fixed}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
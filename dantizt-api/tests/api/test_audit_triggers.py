@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import ActionLog, Service, ServiceCategory
+from app.db.triggers import configure_audit_triggers
+from app.services.audit import reconstruct_log_states
+from tests.conftest import test_engine
+
+pytestmark = pytest.mark.asyncio
+
+
+async def audit_rows(db: AsyncSession, ids):
+    result = await db.execute(
+        select(ActionLog)
+        .where(ActionLog.table_name == "services", ActionLog.record_id.in_(ids))
+        .order_by(ActionLog.id)
+    )
+    return result.scalars().all()
+
+
+@pytest.mark.parametrize("mode", ["row", "statement"])
+async def test_audit_modes_log_every_row(db: AsyncSession, setup_database, mode):
+    async with test_engine.begin() as conn:
+        applied = await configure_audit_triggers(conn, {"services": mode})
+    assert applied["services"] == mode
+
+    services = [
+        Service(name=f"Аудит {mode} {i}", cost=1000 + i, category=ServiceCategory.therapy)
+        for i in range(3)
+    ]
+    db.add_all(services)
+    await db.flush()
+    ids = [service.id for service in services]
+
+    # Одно обновление и одно удаление затрагивают все строки сразу
+    await db.execute(update(Service).where(Service.id.in_(ids)).values(is_active=False))
+    await db.execute(delete(Service).where(Service.id.in_(ids)))
+
+    rows = await audit_rows(db, ids)
+    assert [row.action_type for row in rows].count("INSERT") == 3
+    assert [row.action_type for row in rows].count("UPDATE") == 3
+    assert [row.action_type for row in rows].count("DELETE") == 3
+
+    for row in rows:
+        if row.action_type == "UPDATE":
+            # В журнал попадают только измененные колонки
+            assert row.old_data["is_active"] is True
+            assert row.new_data["is_active"] is False
+            assert "name" not in row.new_data
+        if row.action_type == "DELETE":
+            assert row.new_data is None
+            assert row.old_data["id"] == row.record_id
+
+    await db.rollback()
+
+
+async def test_audit_can_be_disabled_per_table(db: AsyncSession, setup_database):
+    async with test_engine.begin() as conn:
+        await configure_audit_triggers(conn, {"services": "off"})
+
+    service = Service(name="Без аудита", cost=500, category=ServiceCategory.consultation)
+    db.add(service)
+    await db.flush()
+    assert await audit_rows(db, [service.id]) == []
+    await db.rollback()
+
+    with pytest.raises(ValueError):
+        async with test_engine.begin() as conn:
+            await configure_audit_triggers(conn, {"services": "sometimes"})
+
+
+async def test_full_states_are_reconstructed_from_diffs(db: AsyncSession, setup_database):
+    async with test_engine.begin() as conn:
+        await configure_audit_triggers(conn, {"services": "statement"})
+
+    service = Service(name="Осмотр", cost=1000, category=ServiceCategory.consultation)
+    db.add(service)
+    await db.flush()
+    await db.execute(update(Service).where(Service.id == service.id).values(name="Первичный осмотр"))
+    await db.execute(update(Service).where(Service.id == service.id).values(cost=1500))
+
+    inserted, renamed, repriced = await audit_rows(db, [service.id])
+    assert repriced.changed_columns == ["cost"]
+
+    before, after = await reconstruct_log_states(db, repriced)
+    assert before["name"] == after["name"] == "Первичный осмотр"
+    assert (before["cost"], after["cost"]) == (1000, 1500)
+    assert after["category"] == "consultation"
+
+    # Без INSERT в журнале состояние восстанавливается от текущей строки
+    await db.delete(inserted)
+    await db.flush()
+    before, after = await reconstruct_log_states(db, renamed)
+    assert (before["name"], after["name"]) == ("Осмотр", "Первичный осмотр")
+    assert after["cost"] == 1000
+
+    await db.rollback()
@@ -0,0 +1,321 @@
+import gzip
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.db.backup import DatabaseBackup, manifest_path
+from app.db.triggers import configure_audit_triggers
+from tests.conftest import TEST_DATABASE_URL, test_engine
+
+pytestmark = pytest.mark.asyncio
+
+
+def backup_manager(backup_dir) -> DatabaseBackup:
+    url = make_url(TEST_DATABASE_URL)
+    return DatabaseBackup(url.database, str(backup_dir), connection_params={
+        "host": url.host or url.query.get("host"),
+        "port": url.port,
+        "user": url.username,
+        "password": url.password
+    })
+
+
+@pytest.fixture
+async def services(setup_database):
+    async with test_engine.begin() as conn:
+        await conn.execute(text("""
+            INSERT INTO services (name, cost, category, is_active)
+            SELECT 'Резервная ' || g, g * 100, 'therapy', true FROM generate_series(1, 50) g
+        """))
+    yield
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DELETE FROM services WHERE name LIKE 'Резервная %'"))
+
+
+async def test_backup_is_streamed_into_gzip_chunks(services, tmp_path, monkeypatch):
+    # Маленький порог куска, чтобы таблица разбилась на несколько кусков
+    monkeypatch.setattr(settings, "BACKUP_CHUNK_BYTES", 256)
+    manager = backup_manager(tmp_path)
+
+    backup_file = manager.create_backup()
+    manifest = manager.read_manifest(backup_file)
+    tables = {table["name"]: table for table in manifest["tables"]}
+
+    async with test_engine.connect() as conn:
+        count = (await conn.execute(text("SELECT count(*) FROM services"))).scalar()
+    table = tables["services"]
+    assert table["rows"] == count
+    assert len(table["chunks"]) > 1
+    assert "name" in [column["name"] for column in table["columns"]]
+    # Секции не выгружаются отдельно от родительской таблицы
+    assert not [name for name in tables if name.startswith("action_logs_")]
+
+    # Каждый кусок - самостоятельный gzip-член со своим числом строк
+    with open(backup_file, "rb") as f:
+        for chunk in table["chunks"]:
+            f.seek(chunk["offset"])
+            data = gzip.decompress(f.read(chunk["length"]))
+            assert data.count(b"\n") == chunk["rows"]
+            assert len(data) == chunk["raw_bytes"]
+
+    # Файл целиком читается как обычный gzip
+    with gzip.open(backup_file, "rb") as f:
+        assert sum(1 for _ in f) == sum(table["rows"] for table in manifest["tables"])
+
+    assert manager.list_backups() == [backup_file]
+    manager.delete_backup(backup_file)
+    assert not backup_file.exists() and not manifest_path(backup_file).exists()
+
+
+async def index_definitions():
+    async with test_engine.connect() as conn:
+        result = await conn.execute(text("""
+            SELECT indexdef FROM pg_indexes WHERE schemaname = 'public' ORDER BY indexname
+        """))
+        indexes = result.scalars().all()
+        result = await conn.execute(text("""
+            SELECT conname FROM pg_constraint WHERE contype = 'f' ORDER BY conname
+        """))
+        return indexes, result.scalars().all()
+
+
+async def test_backup_is_restored_with_copy(services, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BACKUP_CHUNK_BYTES", 256)
+    manager = backup_manager(tmp_path)
+    backup_file = manager.create_backup()
+    schema_before = await index_definitions()
+
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DELETE FROM services WHERE name LIKE 'Резервная 1%'"))
+        await conn.execute(text("UPDATE services SET cost = 0 WHERE name = 'Резервная 2'"))
+        await conn.execute(text("""
+            INSERT INTO services (name, cost, category, is_active)
+            VALUES ('Резервная лишняя', 1, 'therapy', true)
+        """))
+
+    progress = []
+    manager.restore_backup(backup_file, progress=progress.append)
+    assert progress[-1]["tables_done"] == progress[-1]["tables_total"]
+    restored = {item["table"]: item["rows"] for item in progress}
+    assert restored == {table["name"]: table["rows"] for table in manager.read_manifest(backup_file)["tables"]}
+
+    async with test_engine.begin() as conn:
+        result = await conn.execute(text("""
+            SELECT name, cost FROM services WHERE name LIKE 'Резервная %' ORDER BY id
+        """))
+        rows = result.all()
+        assert len(rows) == 50
+        assert ("Резервная 2", 200) in rows
+        # Последовательность продвинута за восстановленные ключи
+        new_id = (await conn.execute(text("""
+            INSERT INTO services (name, cost, category, is_active)
+            VALUES ('Резервная новая', 1, 'therapy', true) RETURNING id
+        """))).scalar()
+        max_id = (await conn.execute(text("SELECT max(id) FROM services WHERE name <> 'Резервная новая'"))).scalar()
+        assert new_id > max_id
+        disabled = (await conn.execute(text("""
+            SELECT count(*) FROM pg_trigger WHERE NOT tgisinternal AND tgenabled = 'D'
+        """))).scalar()
+        assert disabled == 0
+
+    # Отложенные индексы и внешние ключи созданы заново
+    assert await index_definitions() == schema_before
+
+
+def table_data(backup_file, table) -> bytes:
+    with open(backup_file, "rb") as f:
+        data = b""
+        for chunk in table["chunks"]:
+            f.seek(chunk["offset"])
+            data += gzip.decompress(f.read(chunk["length"]))
+        return data
+
+
+async def test_parallel_backup_and_restore(services, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BACKUP_CHUNK_BYTES", 256)
+    manager = backup_manager(tmp_path)
+    sequential = manager.create_backup(workers=1)
+    sequential.rename(tmp_path / "sequential.copy.gz")
+    manifest_path(sequential).rename(tmp_path / "sequential.manifest.json")
+    sequential = tmp_path / "sequential.copy.gz"
+    parallel = manager.create_backup(workers=4)
+
+    # Параллельная выгрузка из общего снимка совпадает с последовательной
+    expected = {table["name"]: table_data(sequential, table) for table in manager.read_manifest(sequential)["tables"]}
+    actual = {table["name"]: table_data(parallel, table) for table in manager.read_manifest(parallel)["tables"]}
+    assert actual == expected
+
+    schema_before = await index_definitions()
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DELETE FROM services WHERE name LIKE 'Резервная %'"))
+
+    progress = []
+    manager.restore_backup(parallel, progress=progress.append, workers=3)
+    assert sorted(item["tables_done"] for item in progress) == list(range(1, len(progress) + 1))
+
+    async with test_engine.connect() as conn:
+        count = (await conn.execute(text("SELECT count(*) FROM services WHERE name LIKE 'Резервная %'"))).scalar()
+    assert count == 50
+    assert await index_definitions() == schema_before
+
+
+async def services_state():
+    async with test_engine.connect() as conn:
+        result = await conn.execute(text("""
+            SELECT id, name, cost FROM services WHERE name LIKE 'Резервная %' ORDER BY id
+        """))
+        return result.all()
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+async def test_incremental_backup_chain(services, tmp_path, workers):
+    async with test_engine.begin() as conn:
+        await configure_audit_triggers(conn, {"services": "statement"})
+    manager = backup_manager(tmp_path)
+    full = manager.create_backup(workers=workers)
+
+    async with test_engine.begin() as conn:
+        await conn.execute(text("UPDATE services SET cost = 1 WHERE name = 'Резервная 2'"))
+        await conn.execute(text("DELETE FROM services WHERE name = 'Резервная 3'"))
+        await conn.execute(text("""
+            INSERT INTO services (name, cost, category, is_active)
+            VALUES ('Резервная 51', 5100, 'therapy', true)
+        """))
+    first = manager.create_backup(workers=workers, incremental=True)
+
+    manifest = manager.read_manifest(first)
+    assert (manifest["kind"], manifest["parent"]) == ("incremental", full.name)
+    table = next(table for table in manifest["tables"] if table["name"] == "services")
+    assert (table["mode"], table["rows"], table["tombstones"]["rows"]) == ("delta", 2, 1)
+
+    async with test_engine.begin() as conn:
+        await conn.execute(text("UPDATE services SET name = 'Резервная 4 (новая)' WHERE name = 'Резервная 4'"))
+        await conn.execute(text("DELETE FROM services WHERE name = 'Резервная 51'"))
+    second = manager.create_backup(workers=workers, incremental=True)
+    assert manager.backup_chain(second) == [full, first, second]
+    assert manager.read_manifest(second)["chain"] == [full.name, first.name, second.name]
+    expected = await services_state()
+
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DELETE FROM services WHERE name LIKE 'Резервная %'"))
+    manager.restore_backup(second, workers=workers)
+    assert await services_state() == expected
+
+    # Копии, на которые опираются инкрементные, не удаляются
+    with pytest.raises(ValueError):
+        manager.delete_backup(full)
+    manager.cleanup_old_backups(keep_last=1)
+    assert manager.list_backups() == [second, first, full]
+
+
+async def test_incremental_backup_includes_transaction_open_during_parent(services, tmp_path):
+    async with test_engine.begin() as conn:
+        await configure_audit_triggers(conn, {"services": "statement"})
+    manager = backup_manager(tmp_path)
+
+    # Строки открытой во время снимка транзакции помечены временем ее начала,
+    # которое и становится водяным знаком родительской копии
+    async with test_engine.connect() as writer:
+        await writer.execute(text("UPDATE services SET cost = 7 WHERE name = 'Резервная 5'"))
+        full = manager.create_backup(workers=1)
+        await writer.commit()
+
+    incremental = manager.create_backup(workers=1, incremental=True)
+    table = next(table for table in manager.read_manifest(incremental)["tables"] if table["name"] == "services")
+    assert (table["mode"], table["rows"]) == ("delta", 1)
+    assert "\tРезервная 5\t" in table_data(incremental, table).decode()
+    expected = await services_state()
+
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DELETE FROM services WHERE name LIKE 'Резервная %'"))
+    manager.restore_backup(incremental)
+    assert await services_state() == expected
+    assert full in manager.backup_chain(incremental)
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+async def test_backup_is_verified_without_loading(services, tmp_path, monkeypatch, workers):
+    monkeypatch.setattr(settings, "BACKUP_CHUNK_BYTES", 256)
+    manager = backup_manager(tmp_path)
+    progress = []
+    backup_file = manager.create_backup(workers=workers, progress=progress.append)
+    manifest = manager.read_manifest(backup_file)
+
+    # Последнее состояние - все таблицы, строки и байты копии
+    assert progress[-1]["tables_done"] == progress[-1]["tables_total"] == len(manifest["tables"])
+    assert progress[-1]["rows"] >= sum(table["rows"] for table in manifest["tables"])
+    assert progress[-1]["bytes"] == manifest["size_bytes"]
+
+    result = manager.verify_backup(backup_file, deep=True)
+    assert result["valid"], result["errors"]
+    assert result["rows"] == sum(table["rows"] for table in manifest["tables"])
+
+    # Порча одного байта в куске таблицы находится по контрольной сумме
+    chunk = next(table for table in manifest["tables"] if table["name"] == "services")["chunks"][1]
+    with open(backup_file, "r+b") as f:
+        f.seek(chunk["offset"] + chunk["length"] // 2)
+        byte = f.read(1)
+        f.seek(-1, 1)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    result = manager.verify_backup(backup_file)
+    assert not result["valid"]
+    assert any(error.startswith("services: checksum mismatch") for error in result["errors"])
+
+
+async def test_backup_job_reports_result(services, tmp_path, monkeypatch):
+    from app.services import backup_jobs
+    from app.services.jobs import job_registry, JobStatus
+
+    monkeypatch.setattr(backup_jobs, "backup_manager", lambda: backup_manager(tmp_path))
+    job = job_registry.create(backup_jobs.JOB_KIND_BACKUP, params={"incremental": False})
+    backup_jobs.run_backup_job(job["id"])
+
+    job = job_registry.get(job["id"])
+    assert job["status"] == JobStatus.completed, job["error"]
+    assert job["progress"]["tables_done"] == job["progress"]["tables_total"] == job["result"]["tables"]
+    assert (tmp_path / job["result"]["filename"]).exists()
+
+    verify = job_registry.create(backup_jobs.JOB_KIND_VERIFY, params={})
+    backup_jobs.run_verify_job(verify["id"], job["result"]["filename"], deep=True)
+    assert job_registry.get(verify["id"])["result"]["valid"]
+
+
+async def test_backup_download_supports_ranges(services, tmp_path, monkeypatch):
+    import hashlib
+    from types import SimpleNamespace
+    from httpx import ASGITransport, AsyncClient
+    from app.core.security import get_current_user
+    from app.db.models import UserRole
+    from app.main import app
+
+    monkeypatch.setattr(settings, "BACKUP_DIR", str(tmp_path))
+    manager = backup_manager(tmp_path)
+    backup_file = manager.create_backup()
+    data = backup_file.read_bytes()
+    sha256 = manager.read_manifest(backup_file)["sha256"]
+
+    # Индекс берет контрольную сумму из манифеста
+    index = manager.backup_index()
+    assert [entry["filename"] for entry in index] == [backup_file.name]
+    assert index[0]["sha256"] == hashlib.sha256(data).hexdigest() == sha256
+
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(role=UserRole.admin)
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            url = f"/api/v1/backups/download/{backup_file.name}"
+            response = await client.get(url)
+            assert response.status_code == 200 and response.content == data
+            assert response.headers["etag"] == f'"{sha256}"'
+            assert response.headers["accept-ranges"] == "bytes"
+
+            # Докачка с места обрыва того же файла
+            response = await client.get(url, headers={"Range": "bytes=100-", "If-Range": f'"{sha256}"'})
+            assert response.status_code == 206 and response.content == data[100:]
+            response = await client.get(url, headers={"Range": "bytes=100-", "If-Range": '"other"'})
+            assert response.status_code == 200 and response.content == data
+
+            assert (await client.get("/api/v1/backups/download/missing.copy.gz")).status_code == 404
+    finally:
+        del app.dependency_overrides[get_current_user]
@@ -0,0 +1,162 @@
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.api.v1.endpoints import certificates
+from app.core.security import get_current_user
+from app.db.models import (
+    User, UserRole, Patient, Doctor, Payment, PaymentStatus, PaymentMethod,
+    TaxDeductionCertificate, CertificatePayment
+)
+from app.main import app
+from app.services.certificate_cache import CertificateCache
+from tests.conftest import TestingSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+
+def test_cache_miss_then_hit(tmp_path):
+    cache = CertificateCache(str(tmp_path), max_bytes=1024 * 1024)
+    digest = cache.compute_digest({"certificate_id": 1, "amount": 100.0})
+
+    assert cache.get(1, digest) is None
+    path = cache.put(1, digest, b"%PDF-1")
+    assert cache.get(1, digest) == path
+    assert path.read_bytes() == b"%PDF-1"
+
+    # Новая версия справки вытесняет файл прежней
+    new_digest = cache.compute_digest({"certificate_id": 1, "amount": 200.0})
+    assert new_digest != digest
+    cache.put(1, new_digest, b"%PDF-2")
+    assert cache.get(1, digest) is None
+    assert cache.get(1, new_digest) is not None
+
+
+def test_invalidate_removes_certificate_files(tmp_path):
+    cache = CertificateCache(str(tmp_path), max_bytes=1024 * 1024)
+    cache.put(1, "a" * 64, b"%PDF-1")
+    other = cache.put(2, "b" * 64, b"%PDF-2")
+
+    assert cache.invalidate(1) == 1
+    assert list(tmp_path.glob("1-*.pdf")) == []
+    assert other.exists()
+    assert cache.invalidate(1) == 0
+
+
+def test_eviction_respects_max_bytes(tmp_path):
+    cache = CertificateCache(str(tmp_path), max_bytes=250)
+    paths = []
+    for certificate_id in range(1, 4):
+        paths.append(cache.put(certificate_id, "c" * 64, b"x" * 100))
+        # Разное время использования, чтобы порядок вытеснения был определенным
+        os.utime(paths[-1], (certificate_id, certificate_id))
+
+    assert sum(path.stat().st_size for path in tmp_path.glob("*.pdf")) <= 250
+    assert not paths[0].exists()
+    assert paths[2].exists()
+
+
+async def seed_certificate(db: AsyncSession) -> SimpleNamespace:
+    patient_user = User(
+        email="cache_patient@example.com", full_name="Пациент Кэш",
+        hashed_password="x", role=UserRole.patient.value
+    )
+    doctor_user = User(
+        email="cache_doctor@example.com", full_name="Врач Кэш",
+        hashed_password="x", role=UserRole.doctor.value
+    )
+    reception = User(
+        email="cache_reception@example.com", full_name="Регистратор Кэш",
+        hashed_password="x", role=UserRole.reception.value
+    )
+    db.add_all([patient_user, doctor_user, reception])
+    await db.flush()
+
+    patient = Patient(user_id=patient_user.id, inn="123456789012")
+    doctor = Doctor(user_id=doctor_user.id)
+    db.add_all([patient, doctor])
+    await db.flush()
+
+    payment = Payment(
+        patient_id=patient.id, doctor_id=doctor.id, amount=5000,
+        status=PaymentStatus.completed, payment_method=PaymentMethod.card,
+        created_at=datetime(2024, 3, 1, 10, 0)
+    )
+    certificate = TaxDeductionCertificate(
+        patient_id=patient.id, year=2024, amount=5000,
+        certificate_number="CACHE-2024-1", issued_by_id=reception.id
+    )
+    db.add_all([payment, certificate])
+    await db.flush()
+    db.add(CertificatePayment(certificate_id=certificate.id, payment_id=payment.id))
+    seeded = SimpleNamespace(id=certificate.id, issued_by_id=reception.id)
+    await db.commit()
+    return seeded
+
+
+async def current_digest(certificate_id: int) -> str:
+    async with TestingSessionLocal() as session:
+        result = await session.execute(
+            select(TaxDeductionCertificate).options(
+                joinedload(TaxDeductionCertificate.patient).joinedload(Patient.user),
+                joinedload(TaxDeductionCertificate.issued_by),
+                joinedload(TaxDeductionCertificate.payments)
+            ).where(TaxDeductionCertificate.id == certificate_id)
+        )
+        data = certificates._certificate_pdf_data(result.unique().scalar_one())
+    return CertificateCache.compute_digest(data)
+
+
+async def test_download_uses_cache_etag_and_invalidation(db: AsyncSession, tmp_path, monkeypatch):
+    certificate = await seed_certificate(db)
+    cache = CertificateCache(str(tmp_path), max_bytes=1024 * 1024)
+    monkeypatch.setattr(certificates, "certificate_cache", cache)
+
+    renders = []
+    render = certificates._render_certificate_pdf
+    monkeypatch.setattr(
+        certificates, "_render_certificate_pdf", lambda data: renders.append(data) or render(data)
+    )
+
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(
+        role=UserRole.reception, id=certificate.issued_by_id
+    )
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            url = f"/api/v1/certificates/{certificate.id}/download"
+            response = await client.get(url)
+            assert response.status_code == 200
+            assert response.content.startswith(b"%PDF")
+            etag = response.headers["etag"]
+            assert len(list(tmp_path.glob(f"{certificate.id}-*.pdf"))) == 1
+
+            # Повторное скачивание берет файл из кэша
+            response = await client.get(url)
+            assert response.status_code == 200 and response.headers["etag"] == etag
+            assert len(renders) == 1
+
+            response = await client.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            assert response.content == b""
+
+            # Изменение справки сбрасывает кэш и меняет хэш ее данных
+            response = await client.patch(f"/api/v1/certificates/{certificate.id}", json={"status": "cancelled"})
+            assert response.status_code == 200
+            assert list(tmp_path.glob(f"{certificate.id}-*.pdf")) == []
+            assert f'"{await current_digest(certificate.id)}"' != etag
+            assert (await client.get(url)).status_code == 400
+
+            # Повторно выданная справка совпадает с исходной: тот же ETag, но PDF формируется заново
+            response = await client.patch(f"/api/v1/certificates/{certificate.id}", json={"status": "issued"})
+            assert response.status_code == 200
+            response = await client.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            assert len(renders) == 2
+    finally:
+        del app.dependency_overrides[get_current_user]
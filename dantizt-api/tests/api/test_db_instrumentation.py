@@ -0,0 +1,59 @@
+import logging
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.instrumentation import classify_statement, instrument_engine, query_log
+from tests.conftest import test_engine
+
+pytestmark = pytest.mark.asyncio
+
+
+def test_statements_are_labelled_by_operation_and_table():
+    assert classify_statement('SELECT users.id FROM "users" WHERE users.id = $1') == ("select", "users")
+    assert classify_statement("INSERT INTO public.action_logs (id) VALUES ($1)") == ("insert", "action_logs")
+    assert classify_statement("UPDATE appointments SET status = $1") == ("update", "appointments")
+    assert classify_statement("DELETE FROM ONLY notifications WHERE id = $1") == ("delete", "notifications")
+    assert classify_statement(
+        "WITH moved AS (SELECT id FROM payments) UPDATE invoices SET paid = true"
+    ) == ("update", "invoices")
+    assert classify_statement("SELECT 1") == ("select", "unknown")
+    assert classify_statement("VACUUM") == ("other", "unknown")
+
+
+def latency_count(operation: str, table: str) -> float:
+    return REGISTRY.get_sample_value(
+        "dantizt_db_query_duration_seconds_count", {"operation": operation, "table": table}
+    ) or 0
+
+
+async def test_queries_feed_latency_and_slow_query_log(setup_database, tmp_path, monkeypatch, caplog):
+    instrument_engine(test_engine)
+    monkeypatch.setattr(query_log, "state_file", tmp_path / "db_query_log.json")
+    before = latency_count("select", "services")
+
+    query_log.update(slow_query_ms=0, slow_query_sample_rate=1.0, echo_sample_rate=0)
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.db.slow_query"):
+            async with test_engine.connect() as conn:
+                await conn.execute(
+                    text("SELECT count(*) FROM services WHERE name = :name"), {"name": "Секретное имя"}
+                )
+                with pytest.raises(Exception):
+                    await conn.execute(text("SELECT missing_column FROM services"))
+    finally:
+        query_log.update(
+            slow_query_ms=settings.DB_SLOW_QUERY_MS,
+            slow_query_sample_rate=settings.DB_SLOW_QUERY_SAMPLE_RATE,
+            echo_sample_rate=settings.DB_ECHO_SAMPLE_RATE
+        )
+
+    # Оба запроса замерены, включая упавший
+    assert latency_count("select", "services") == before + 2
+    messages = [record.getMessage() for record in caplog.records if record.name == "app.db.slow_query"]
+    assert any("WHERE name = $1" in message and "<str>" in message for message in messages)
+    assert any(message.startswith("Slow query failed") for message in messages)
+    # Значения параметров в журнал не попадают
+    assert not any("Секретное имя" in message for message in messages)
@@ -0,0 +1,176 @@
+import socket
+
+import pytest
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import EmailOutbox, EmailStatus
+from app.services.email_outbox import EmailOutboxSender, enqueue_email
+from app.utils.email import send_email
+from app.utils.email_templates import render_email
+from tests.conftest import TestingSessionLocal
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+pytestmark = pytest.mark.asyncio
+
+
+class RecordingHandler:
+    """Обработчик локального SMTP-сервера, запоминающий принятые письма и сессии"""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    try:
+        yield controller, handler
+    finally:
+        controller.stop()
+
+
+def make_sender(controller, **kwargs) -> EmailOutboxSender:
+    return EmailOutboxSender(
+        hostname=controller.hostname,
+        port=controller.port,
+        use_tls=False,
+        start_tls=False,
+        session_factory=TestingSessionLocal,
+        **kwargs
+    )
+
+
+async def test_outbox_batch_is_sent_over_one_connection(db: AsyncSession, smtp_server):
+    controller, handler = smtp_server
+    # Очередь общая для всех тестов - начинаем с пустой
+    await db.execute(delete(EmailOutbox))
+    await db.commit()
+
+    ids = []
+    for i in range(3):
+        ids.append(await enqueue_email(
+            email_to=f"outbox_{i}@example.com",
+            subject=f"Письмо {i}",
+            html="<p>Здравствуйте!</p>",
+            attachment=b"%PDF-1.4" if i == 0 else None,
+            attachment_name="certificate.pdf" if i == 0 else None,
+            attachment_type="application/pdf",
+            db=db
+        ))
+    await db.commit()
+
+    sender = make_sender(controller)
+    try:
+        assert await sender.send_batch() == 3
+        assert await sender.send_batch() == 0
+    finally:
+        await sender.close()
+
+    assert len(handler.messages) == 3
+    assert len(handler.sessions) == 1
+    assert b"certificate.pdf" in handler.messages[0].original_content
+
+    db.expire_all()
+    rows = (await db.execute(select(EmailOutbox).where(EmailOutbox.id.in_(ids)))).scalars().all()
+    assert {row.status for row in rows} == {EmailStatus.sent.value}
+    assert all(row.attempts == 1 and row.sent_at is not None for row in rows)
+
+
+async def test_outbox_failure_is_retried_with_backoff(db: AsyncSession, smtp_server):
+    controller, _ = smtp_server
+    email_id = await enqueue_email(
+        email_to="outbox_retry@example.com",
+        subject="Повтор",
+        html="<p>Повтор</p>",
+        db=db
+    )
+    await db.commit()
+
+    # Порт, на котором никто не слушает: соединение не устанавливается
+    sender = make_sender(controller, max_attempts=2, backoff_base=60, timeout=2)
+    sender.port = 1
+    try:
+        assert await sender.send_batch() == 1
+        # Следующая попытка отложена, поэтому письмо сразу не выбирается повторно
+        assert await sender.send_batch() == 0
+    finally:
+        await sender.close()
+
+    db.expire_all()
+    row = await db.get(EmailOutbox, email_id)
+    assert row.status == EmailStatus.pending.value
+    assert row.attempts == 1
+    assert row.last_error
+    assert row.next_attempt_at > row.created_at
+
+
+async def test_interrupted_delivery_is_counted_and_leased(db: AsyncSession, smtp_server):
+    controller, handler = smtp_server
+    await db.execute(delete(EmailOutbox))
+    await db.commit()
+    email_id = await enqueue_email(
+        email_to="outbox_crash@example.com",
+        subject="Сбой",
+        html="<p>Сбой</p>",
+        db=db
+    )
+    await db.commit()
+
+    # Воркер забрал письмо и упал до отправки: попытка уже сохранена,
+    # а письмо не выбирается повторно до истечения аренды
+    crashed = make_sender(controller, max_attempts=1)
+    assert [item.id for item in await crashed._claim_batch()] == [email_id]
+
+    db.expire_all()
+    row = await db.get(EmailOutbox, email_id)
+    assert row.status == EmailStatus.pending.value
+    assert row.attempts == 1
+
+    sender = make_sender(controller, max_attempts=1)
+    try:
+        assert await sender.send_batch() == 0
+
+        # По истечении аренды письмо с исчерпанными попытками не отправляется снова
+        row.next_attempt_at = row.created_at
+        await db.commit()
+        assert await sender.send_batch() == 0
+    finally:
+        await sender.close()
+
+    db.expire_all()
+    row = await db.get(EmailOutbox, email_id)
+    assert row.status == EmailStatus.failed.value
+    assert row.last_error
+    assert handler.messages == []
+
+
+async def test_send_email_renders_localized_template(db: AsyncSession):
+    email_id = await send_email(
+        email_to="outbox_template@example.com",
+        template_name="tax_deduction_certificate",
+        environment={"full_name": "<Иванов>", "year": 2024},
+        db=db
+    )
+
+    row = await db.get(EmailOutbox, email_id)
+    assert row.subject == "Справка для налогового вычета за 2024 год - DantiZT"
+    assert "&lt;Иванов&gt;" in row.body
+
+    _, html = render_email("tax_deduction_certificate", {"full_name": "Ivanov", "year": 2024}, locale="en")
+    assert "Hello, Ivanov!" in html
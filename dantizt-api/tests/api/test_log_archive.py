@@ -0,0 +1,85 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import text
+
+from app.api.v1.endpoints import logs as logs_endpoint
+from app.core.config import settings
+from app.db.models import User, UserRole
+from app.services.log_archive import LogArchive
+from tests.conftest import test_engine
+
+pytestmark = pytest.mark.asyncio
+
+PARTITION = "action_logs_2033_01"
+ADMIN = User(id=0, email="admin@example.com", role=UserRole.admin.value)
+
+
+@pytest.fixture
+async def archived_partition(setup_database):
+    schema = settings.PARTITION_ARCHIVE_SCHEMA
+    async with test_engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+        await conn.execute(text(f"CREATE TABLE {schema}.{PARTITION} (LIKE action_logs INCLUDING DEFAULTS)"))
+        # По строке в день с 1 по 10 января, каждая третья - удаление
+        await conn.execute(text(f"""
+            INSERT INTO {schema}.{PARTITION} (id, table_name, action_type, record_id, new_data, created_at)
+            SELECT g, 'appointments', CASE WHEN g % 3 = 0 THEN 'DELETE' ELSE 'UPDATE' END, g,
+                   jsonb_build_object('status', 'completed'),
+                   timestamptz '2033-01-01 12:00:00+00' + (g - 1) * interval '1 day'
+            FROM generate_series(1, 10) g
+        """))
+    yield schema
+    async with test_engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+async def test_partition_is_exported_in_chunks_and_dropped(archived_partition, tmp_path, compression):
+    archive = LogArchive(str(tmp_path), compression=compression, chunk_rows=3)
+
+    assert await archive.archive_partitions(test_engine) == [PARTITION]
+    async with test_engine.connect() as conn:
+        exists = await conn.execute(text("SELECT to_regclass(:name)"), {"name": f"{archived_partition}.{PARTITION}"})
+        assert exists.scalar() is None
+
+    chunks = archive.chunks_for_range(None, None)
+    assert [chunk["rows"] for chunk in chunks] == [1, 3, 3, 3]
+
+    # Интервал 4-6 января целиком лежит во втором куске
+    start = datetime(2033, 1, 4, tzinfo=timezone.utc)
+    end = datetime(2033, 1, 6, 23, 59, tzinfo=timezone.utc)
+    assert len(archive.chunks_for_range(start, end)) == 1
+    rows, total, is_estimate = archive.query(start=start, end=end, limit=10)
+    assert [row["id"] for row in rows] == [6, 5, 4]
+    assert (total, is_estimate) == (3, False)
+
+    # Постраничное чтение всего архива от новых записей к старым
+    seen, cursor = [], None
+    while True:
+        rows, _, _ = archive.query(action_type="UPDATE", cursor=cursor, limit=4)
+        page = rows[:4]
+        seen.extend(row["id"] for row in page)
+        if len(rows) <= 4:
+            break
+        cursor = (page[-1]["created_at"], page[-1]["id"])
+    assert seen == [10, 8, 7, 5, 4, 2, 1]
+
+
+async def test_logs_endpoint_reads_archive(archived_partition, tmp_path, monkeypatch):
+    archive = LogArchive(str(tmp_path), chunk_rows=4)
+    await archive.archive_partitions(test_engine)
+    monkeypatch.setattr(logs_endpoint, "log_archive", archive)
+
+    page = await logs_endpoint.get_logs(
+        limit=2,
+        archive=True,
+        start_date=datetime(2033, 1, 2),
+        end_date=datetime(2033, 1, 5),
+        current_user=ADMIN,
+        db=None
+    )
+    assert [item.id for item in page.items] == [4, 3]
+    assert page.items[0].new_data == {"status": "completed"}
+    assert page.next_cursor is not None
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.endpoints.logs import get_logs, get_log_tables, get_log_actions
+from app.db.models import ActionLog, User, UserRole
+from app.services import audit
+
+pytestmark = pytest.mark.asyncio
+
+ADMIN = User(id=0, email="admin@example.com", role=UserRole.admin.value)
+
+
+async def seed_logs(db: AsyncSession, count: int):
+    started = datetime.now(timezone.utc).replace(microsecond=0)
+    # Каждые три записи делят одно время, порядок внутри задает id
+    db.add_all([
+        ActionLog(
+            table_name="paging_test",
+            action_type="UPDATE",
+            record_id=i,
+            created_at=started - timedelta(seconds=i // 3)
+        )
+        for i in range(count)
+    ])
+    await db.flush()
+
+
+async def test_cursor_pages_cover_all_rows_once(db: AsyncSession, setup_database):
+    await seed_logs(db, 12)
+
+    seen, cursor = [], None
+    while True:
+        page = await get_logs(
+            limit=5, cursor=cursor, table_name="paging_test",
+            current_user=ADMIN, db=db
+        )
+        seen.extend((item.created_at, item.id) for item in page.items)
+        assert page.total == 12
+        assert page.total_is_estimate is False
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    assert len(seen) == 12
+    assert seen == sorted(seen, reverse=True)
+
+    with pytest.raises(Exception) as error:
+        await get_logs(limit=5, cursor="not-a-cursor", current_user=ADMIN, db=db)
+    assert error.value.status_code == 400
+
+    await db.rollback()
+
+
+async def test_catalogue_lists_tables_and_actions(db: AsyncSession, setup_database):
+    await seed_logs(db, 3)
+    db.add(ActionLog(table_name="catalog_test", action_type="DELETE", record_id=1))
+    await db.flush()
+    audit._catalog_cache["expires"] = 0
+
+    assert {"paging_test", "catalog_test"} <= set(await get_log_tables(current_user=ADMIN, db=db))
+    assert {"UPDATE", "DELETE"} <= set(await get_log_actions(current_user=ADMIN, db=db))
+
+    await db.rollback()
+    audit._catalog_cache["expires"] = 0
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+# Режим нескольких процессов выбирается при импорте prometheus_client,
+# поэтому воркеры и сбор метрик запускаются в отдельных процессах
+WORKER = textwrap.dedent("""
+    import sys
+    from app.core.metrics import ACTIVE_REQUESTS, APPOINTMENT_COUNT, update_active_users
+    APPOINTMENT_COUNT.labels(status="scheduled").inc()
+    ACTIVE_REQUESTS.labels(method="GET", endpoint="/test").inc()
+    update_active_users("admin", int(sys.argv[1]))
+""")
+
+SCRAPE = textwrap.dedent("""
+    import sys
+    from app.core.metrics import handle_metrics, mark_worker_dead
+    if len(sys.argv) > 1:
+        mark_worker_dead(int(sys.argv[1]))
+    sys.stdout.write(handle_metrics(None).body.decode())
+""")
+
+
+def run(code: str, env: dict, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-c", code, *args], env=env, capture_output=True, text=True, check=True
+    )
+
+
+def sample(metrics: str, prefix: str) -> float:
+    line = next(line for line in metrics.splitlines() if line.startswith(prefix))
+    return float(line.rsplit(" ", 1)[1])
+
+
+def test_metrics_are_aggregated_across_workers(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path), "PYTHONPATH": os.getcwd()}
+    first = subprocess.Popen([sys.executable, "-c", WORKER, "5"], env=env)
+    first.wait()
+    run(WORKER, env, "7")
+
+    metrics = run(SCRAPE, env).stdout
+    assert sample(metrics, 'dantizt_appointments_total{status="scheduled"}') == 2
+    assert sample(metrics, 'dantizt_http_requests_active{endpoint="/test",method="GET"}') == 2
+    # Датчик, который выставляет один воркер, берется по последней записи
+    assert sample(metrics, 'dantizt_active_users{role="admin"}') == 7
+
+    # После завершения воркера его live-датчики не учитываются, счетчики остаются
+    metrics = run(SCRAPE, env, str(first.pid)).stdout
+    assert sample(metrics, 'dantizt_appointments_total{status="scheduled"}') == 2
+    assert sample(metrics, 'dantizt_http_requests_active{endpoint="/test",method="GET"}') == 1
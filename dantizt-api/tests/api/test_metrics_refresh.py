@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import text
+
+from app.core.metrics import ACTIVE_USERS, APPOINTMENTS_TODAY, PENDING_PAYMENTS
+from app.db.models import AppointmentStatus, UserRole
+from app.services.metrics_refresh import MetricsRefresher
+from tests.conftest import test_engine
+
+pytestmark = pytest.mark.asyncio
+
+
+def gauge_value(gauge, **labels) -> float:
+    return (gauge.labels(**labels) if labels else gauge)._value.get()
+
+
+async def test_only_leader_refreshes_metrics(setup_database):
+    leader = MetricsRefresher(test_engine)
+    follower = MetricsRefresher(test_engine)
+    try:
+        assert await leader.refresh_once() is True
+        assert await follower.refresh_once() is False
+        assert leader.is_leader and not follower.is_leader
+
+        async with test_engine.connect() as conn:
+            roles = dict((await conn.execute(text("SELECT role, count(*) FROM users GROUP BY role"))).all())
+            pending = (await conn.execute(text("SELECT count(*) FROM payments WHERE status = 'pending'"))).scalar()
+        for role in UserRole:
+            assert gauge_value(ACTIVE_USERS, role=role.value) == roles.get(role.value, 0)
+        for status in AppointmentStatus:
+            assert gauge_value(APPOINTMENTS_TODAY, status=status.value) >= 0
+        assert gauge_value(PENDING_PAYMENTS) == pending
+
+        # Лидерство переходит к другому воркеру после ухода лидера
+        await leader.resign()
+        assert await follower.refresh_once() is True
+    finally:
+        await leader.stop()
+        await follower.stop()
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from sqlalchemy import update, delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import User, UserRole, Notification, NotificationType, NotificationCounter
+from app.db.triggers import create_notification_statement_triggers
+from app.services.notifications import get_unread_count, repair_notification_counters
+from tests.conftest import test_engine
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+async def counter_triggers(setup_database):
+    async with test_engine.begin() as conn:
+        await create_notification_statement_triggers(conn)
+
+
+async def create_user(db: AsyncSession, suffix: str) -> int:
+    user = User(
+        email=f"counter_{suffix}@example.com",
+        full_name=f"Пациент {suffix}",
+        hashed_password="x",
+        role=UserRole.patient.value
+    )
+    db.add(user)
+    await db.flush()
+    return user.id
+
+
+def make_notifications(user_id: int, count: int):
+    return [
+        Notification(user_id=user_id, title=f"Уведомление {i}", message="Текст", type=NotificationType.system)
+        for i in range(count)
+    ]
+
+
+async def test_counter_follows_insert_read_and_delete(db: AsyncSession, counter_triggers):
+    user_id = await create_user(db, "flow")
+    notifications = make_notifications(user_id, 5)
+    db.add_all(notifications)
+    await db.flush()
+    assert await get_unread_count(db, user_id) == 5
+
+    # Отметка одного уведомления
+    await db.execute(update(Notification).where(Notification.id == notifications[0].id).values(is_read=True))
+    assert await get_unread_count(db, user_id) == 4
+
+    # Удаление непрочитанного уведомления
+    await db.execute(delete(Notification).where(Notification.id == notifications[1].id))
+    assert await get_unread_count(db, user_id) == 3
+
+    # Отметка всех уведомлений одним оператором
+    await db.execute(
+        update(Notification)
+        .where(Notification.user_id == user_id, Notification.is_read == False)
+        .values(is_read=True)
+    )
+    assert await get_unread_count(db, user_id) == 0
+
+
+async def test_repair_fixes_drifted_counters(db: AsyncSession, counter_triggers):
+    user_id = await create_user(db, "drift")
+    stale_user_id = await create_user(db, "stale")
+    db.add_all(make_notifications(user_id, 3))
+    await db.flush()
+
+    # Имитируем расхождение, например после ручной правки данных
+    await db.execute(
+        update(NotificationCounter).where(NotificationCounter.user_id == user_id).values(unread_count=42)
+    )
+    db.add(NotificationCounter(user_id=stale_user_id, unread_count=7))
+    await db.commit()
+
+    assert await repair_notification_counters(db) >= 2
+    assert await get_unread_count(db, user_id) == 3
+    assert await get_unread_count(db, stale_user_id) == 0
+    assert await repair_notification_counters(db) == 0
+
+
+async def test_repair_does_not_block_concurrent_inserts(db: AsyncSession, counter_triggers):
+    busy_user_id = await create_user(db, "busy")
+    drifted_user_id = await create_user(db, "drifted")
+    db.add_all(make_notifications(drifted_user_id, 2))
+    await db.flush()
+    await db.execute(
+        update(NotificationCounter).where(NotificationCounter.user_id == drifted_user_id).values(unread_count=9)
+    )
+    await db.commit()
+
+    # Незафиксированная вставка уведомления в другой транзакции
+    async with test_engine.connect() as conn:
+        transaction = await conn.begin()
+        await conn.execute(text("""
+            INSERT INTO notifications (user_id, title, message, type)
+            VALUES (:user_id, 'Параллельное', 'Текст', 'system')
+        """), {"user_id": busy_user_id})
+
+        assert await asyncio.wait_for(repair_notification_counters(db), timeout=5) >= 1
+        assert await get_unread_count(db, drifted_user_id) == 2
+
+        await transaction.commit()
+
+    # Счетчик пользователя с параллельной вставкой остается точным
+    assert await get_unread_count(db, busy_user_id) == 1
+    assert await repair_notification_counters(db) == 0
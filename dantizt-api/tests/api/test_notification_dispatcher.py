@@ -0,0 +1,185 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import (
+    User, UserRole, Patient, Doctor, Appointment, AppointmentStatus,
+    Notification, NotificationType, EmailOutbox
+)
+from app.db.session import upgrade_schema
+from app.db.triggers import create_appointment_notification_trigger, create_notification_statement_triggers
+from app.services.notification_dispatcher import NotificationDispatcher
+from app.services.notifications import get_unread_count
+from tests.conftest import TestingSessionLocal, test_engine
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+async def notification_triggers(setup_database):
+    async with test_engine.begin() as conn:
+        await create_notification_statement_triggers(conn)
+
+
+async def test_dispatcher_sends_only_due_notifications(db: AsyncSession, notification_triggers):
+    user = User(
+        email="dispatch_user@example.com",
+        full_name="Пациент Диспетчер",
+        hashed_password="x",
+        role=UserRole.patient.value
+    )
+    db.add(user)
+    await db.flush()
+    user_id = user.id
+
+    now = datetime.now(timezone.utc)
+    due = [
+        Notification(
+            user_id=user_id, title=f"Напоминание {i}", message="Завтра прием",
+            type=NotificationType.reminder, scheduled_for=now - timedelta(minutes=i + 1)
+        )
+        for i in range(3)
+    ]
+    future = Notification(
+        user_id=user_id, title="Будущее", message="Через неделю",
+        type=NotificationType.reminder, scheduled_for=now + timedelta(days=7)
+    )
+    db.add_all([*due, future])
+    await db.flush()
+    due_ids = [n.id for n in due]
+    future_id = future.id
+    await db.commit()
+
+    # Отложенные уведомления не видны пользователю до отправки
+    assert await get_unread_count(db, user_id) == 0
+
+    dispatcher = NotificationDispatcher(batch_size=2, session_factory=TestingSessionLocal)
+    assert await dispatcher.dispatch_batch() == 2
+    assert await dispatcher.dispatch_batch() == 1
+    assert await dispatcher.dispatch_batch() == 0
+
+    db.expire_all()
+    rows = (await db.execute(select(Notification).where(Notification.user_id == user_id))).scalars().all()
+    sent = {row.id: row for row in rows}
+    assert all(sent[i].is_sent and sent[i].sent_at is not None for i in due_ids)
+    assert not sent[future_id].is_sent
+
+    assert await get_unread_count(db, user_id) == 3
+
+    emails = (await db.execute(
+        select(EmailOutbox).where(EmailOutbox.recipient == "dispatch_user@example.com")
+    )).scalars().all()
+    assert sorted(email.subject for email in emails) == [
+        f"Напоминание {i} - DantiZT" for i in range(3)
+    ]
+
+
+async def test_schema_upgrade_marks_legacy_due_notifications_sent(setup_database):
+    async with test_engine.connect() as conn:
+        transaction = await conn.begin()
+        # Таблица уведомлений до появления признака отправки; триггеры уведомлений
+        # появились вместе с ним, поэтому отключаются
+        await conn.execute(text("SET LOCAL session_replication_role = replica"))
+        await conn.execute(text("ALTER TABLE notifications DROP COLUMN is_sent CASCADE, DROP COLUMN sent_at"))
+        user_id = (await conn.execute(text("""
+            INSERT INTO users (email, full_name, hashed_password, role)
+            VALUES ('legacy_notifications@example.com', 'Пациент', 'x', 'patient')
+            RETURNING id
+        """))).scalar()
+        await conn.execute(text("""
+            INSERT INTO notifications (user_id, title, message, type, scheduled_for)
+            VALUES (:user_id, 'Прошлое', 'Прием был', 'reminder', now() - interval '1 day'),
+                   (:user_id, 'Будущее', 'Прием будет', 'reminder', now() + interval '1 day'),
+                   (:user_id, 'Обычное', 'Без отложенной отправки', 'system', NULL)
+        """), {"user_id": user_id})
+
+        await upgrade_schema(conn)
+
+        rows = dict((await conn.execute(text("""
+            SELECT title, is_sent AND sent_at IS NOT NULL FROM notifications WHERE user_id = :user_id
+        """), {"user_id": user_id})).all())
+        assert rows == {"Прошлое": True, "Будущее": False, "Обычное": False}
+        await transaction.rollback()
+
+
+@pytest.fixture
+async def appointment_triggers(notification_triggers):
+    async with test_engine.begin() as conn:
+        await conn.execute(text(create_appointment_notification_trigger))
+        await conn.execute(text("""
+            CREATE TRIGGER appointment_notification_trigger
+            AFTER INSERT OR UPDATE ON appointments
+            FOR EACH ROW EXECUTE FUNCTION handle_appointment_notifications()
+        """))
+    yield
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DROP TRIGGER IF EXISTS appointment_notification_trigger ON appointments"))
+
+
+async def create_appointment(db: AsyncSession, suffix: str, start_time: datetime) -> Appointment:
+    patient_user = User(
+        email=f"reminder_patient_{suffix}@example.com", full_name=f"Пациент {suffix}",
+        hashed_password="x", role=UserRole.patient.value
+    )
+    doctor_user = User(
+        email=f"reminder_doctor_{suffix}@example.com", full_name=f"Врач {suffix}",
+        hashed_password="x", role=UserRole.doctor.value
+    )
+    db.add_all([patient_user, doctor_user])
+    await db.flush()
+    patient = Patient(user_id=patient_user.id)
+    doctor = Doctor(user_id=doctor_user.id)
+    db.add_all([patient, doctor])
+    await db.flush()
+    appointment = Appointment(
+        patient_id=patient.id, doctor_id=doctor.id, start_time=start_time,
+        end_time=start_time + timedelta(minutes=30), status=AppointmentStatus.scheduled
+    )
+    db.add(appointment)
+    await db.flush()
+    return appointment
+
+
+async def pending_reminders(db: AsyncSession, appointment_id: int) -> list:
+    result = await db.execute(
+        select(Notification.scheduled_for, Notification.message)
+        .where(Notification.appointment_id == appointment_id, Notification.is_sent.is_(False))
+    )
+    return result.all()
+
+
+@pytest.mark.parametrize("status", [AppointmentStatus.cancelled, AppointmentStatus.no_show])
+async def test_reminder_is_removed_when_appointment_is_cancelled(appointment_triggers, db: AsyncSession, status):
+    start_time = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=5)
+    appointment = await create_appointment(db, f"cancel_{status.value}", start_time)
+    reminders = await pending_reminders(db, appointment.id)
+    assert [reminder.scheduled_for for reminder in reminders] == [start_time - timedelta(days=1)]
+
+    await db.execute(text("UPDATE appointments SET status = :status WHERE id = :id"), {
+        "status": status.name, "id": appointment.id
+    })
+    assert await pending_reminders(db, appointment.id) == []
+
+    # Возобновленный прием снова получает напоминание
+    await db.execute(text("UPDATE appointments SET status = 'scheduled' WHERE id = :id"), {"id": appointment.id})
+    assert len(await pending_reminders(db, appointment.id)) == 1
+
+
+async def test_reminder_follows_rescheduled_appointment(appointment_triggers, db: AsyncSession):
+    start_time = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=5)
+    appointment = await create_appointment(db, "move", start_time)
+    new_time = start_time + timedelta(days=2, hours=3)
+
+    await db.execute(text("UPDATE appointments SET start_time = :start WHERE id = :id"), {
+        "start": new_time, "id": appointment.id
+    })
+    reminders = await pending_reminders(db, appointment.id)
+    assert [reminder.scheduled_for for reminder in reminders] == [new_time - timedelta(days=1)]
+
+    # Прием, перенесенный меньше чем за сутки, напоминание не получает
+    await db.execute(text("UPDATE appointments SET start_time = :start WHERE id = :id"), {
+        "start": datetime.now(timezone.utc) + timedelta(hours=3), "id": appointment.id
+    })
+    assert await pending_reminders(db, appointment.id) == []
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import User, UserRole, Notification, NotificationType
+from app.db.triggers import create_notification_statement_triggers
+from app.services.notification_hub import NotificationHub, asyncpg_dsn
+from tests.conftest import TEST_DATABASE_URL, TestingSessionLocal, test_engine
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+async def hub(setup_database):
+    async with test_engine.begin() as conn:
+        await create_notification_statement_triggers(conn)
+
+    hub = NotificationHub(asyncpg_dsn(TEST_DATABASE_URL), session_factory=TestingSessionLocal)
+    hub.start()
+    await asyncio.wait_for(hub.listening.wait(), timeout=5)
+    yield hub
+    await hub.stop()
+
+
+async def test_hub_pushes_new_notifications_and_read_events(db: AsyncSession, hub: NotificationHub):
+    user = User(
+        email="stream_user@example.com",
+        full_name="Пациент Поток",
+        hashed_password="x",
+        role=UserRole.patient.value
+    )
+    other = User(
+        email="stream_other@example.com",
+        full_name="Другой Пациент",
+        hashed_password="x",
+        role=UserRole.patient.value
+    )
+    db.add_all([user, other])
+    await db.flush()
+    user_id, other_id = user.id, other.id
+    await db.commit()
+
+    queue = hub.subscribe(user_id)
+
+    db.add_all([
+        Notification(user_id=user_id, title="Напоминание", message="Прием завтра", type=NotificationType.reminder),
+        Notification(user_id=user_id, title="Оплата", message="Получен платеж", type=NotificationType.payment),
+        Notification(user_id=other_id, title="Чужое", message="Не для этого клиента", type=NotificationType.reminder)
+    ])
+    await db.commit()
+
+    events = [await asyncio.wait_for(queue.get(), timeout=5) for _ in range(2)]
+    assert {event["event"] for event in events} == {"created"}
+    assert {event["notification"]["title"] for event in events} == {"Напоминание", "Оплата"}
+    assert events[-1]["unread_count"] == 2
+
+    await db.execute(
+        update(Notification)
+        .where(Notification.user_id == user_id)
+        .values(is_read=True)
+    )
+    await db.commit()
+
+    # Массовая отметка прочитанного дает одно событие на пользователя
+    event = await asyncio.wait_for(queue.get(), timeout=5)
+    assert event["event"] == "read"
+    assert event["unread_count"] == 0
+    await asyncio.sleep(0.2)
+    assert queue.empty()
+
+    hub.unsubscribe(user_id, queue)
+    assert hub.subscriber_count == 0
@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import text
+
+from app.db.partitions import (
+    PartitionSpec, ensure_partitions, detach_expired_partitions, list_partitions, partition_report
+)
+from app.core.config import settings
+from tests.conftest import test_engine
+
+pytestmark = pytest.mark.asyncio
+
+NOW = datetime(2031, 5, 20, tzinfo=timezone.utc)
+
+
+def log_row(created_at: str) -> str:
+    return f"""
+        INSERT INTO action_logs (table_name, action_type, record_id, created_at)
+        VALUES ('partition_test', 'INSERT', 1, '{created_at}')
+    """
+
+
+async def test_partitions_are_premade_and_default_rows_are_moved(setup_database):
+    spec = PartitionSpec('action_logs', 'created_at', months=1, premake=2)
+    async with test_engine.connect() as conn:
+        transaction = await conn.begin()
+
+        created = await ensure_partitions(conn, spec, NOW)
+        assert created == ['action_logs_2031_05', 'action_logs_2031_06', 'action_logs_2031_07']
+        assert await ensure_partitions(conn, spec, NOW) == []
+
+        # Строка за пределами созданных секций попадает в секцию по умолчанию
+        await conn.execute(text(log_row('2031-05-21 10:00:00+00')))
+        await conn.execute(text(log_row('2031-09-03 10:00:00+00')))
+        located = await conn.execute(text("""
+            SELECT tableoid::regclass::text FROM action_logs
+            WHERE table_name = 'partition_test' ORDER BY created_at
+        """))
+        assert located.scalars().all() == ['action_logs_2031_05', 'action_logs_default']
+
+        # При создании секции ее строки переносятся из секции по умолчанию
+        await ensure_partitions(conn, spec, datetime(2031, 9, 1, tzinfo=timezone.utc))
+        located = await conn.execute(text("""
+            SELECT tableoid::regclass::text FROM action_logs
+            WHERE table_name = 'partition_test' ORDER BY created_at
+        """))
+        assert located.scalars().all() == ['action_logs_2031_05', 'action_logs_2031_09']
+
+        await transaction.rollback()
+
+
+async def test_expired_partitions_are_detached_into_archive(setup_database):
+    spec = PartitionSpec('action_logs', 'created_at', months=1, retention_months=2, premake=0)
+    schema = settings.PARTITION_ARCHIVE_SCHEMA
+    async with test_engine.connect() as conn:
+        transaction = await conn.begin()
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+
+        for month in (1, 2, 3, 4, 5):
+            await ensure_partitions(conn, spec, datetime(2032, month, 10, tzinfo=timezone.utc))
+        await conn.execute(text(log_row('2032-01-15 10:00:00+00')))
+
+        detached = await detach_expired_partitions(conn, spec, datetime(2032, 5, 10, tzinfo=timezone.utc))
+        # Секции текущих лет тоже старше срока хранения относительно 2032 года
+        assert [name for name in detached if name.startswith('action_logs_2032')] == [
+            'action_logs_2032_01', 'action_logs_2032_02'
+        ]
+
+        attached = [item["partition"] for item in await list_partitions(conn, 'action_logs')]
+        assert 'action_logs_2032_01' not in attached
+        assert 'action_logs_2032_03' in attached
+
+        archived = {
+            item["partition"]: item for item in await partition_report(conn)
+            if not item["attached"]
+        }
+        assert set(archived) == set(detached)
+        rows = await conn.execute(text(f"SELECT count(*) FROM {schema}.action_logs_2032_01"))
+        assert rows.scalar() == 1
+
+        await transaction.rollback()
@@ -0,0 +1,93 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.core.config import settings
+from app.db import session as db_session
+from app.db.replicas import PRIMARY_COOKIE, ReplicaRouter
+from app.middleware import ReadYourWritesMiddleware
+from tests.conftest import TEST_DATABASE_URL, TestingSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+# Реплика тестовой базы (например, вторая локальная копия, поднятая pg_basebackup -R);
+# без нее роль реплики играет сама тестовая база
+REPLICA_DATABASE_URL = os.environ.get("TEST_REPLICA_DATABASE_URL", TEST_DATABASE_URL)
+
+
+@pytest.fixture
+async def router(setup_database, monkeypatch):
+    router = ReplicaRouter([REPLICA_DATABASE_URL], max_lag=5)
+    monkeypatch.setattr(db_session, "replica_router", router)
+    monkeypatch.setattr(db_session, "AsyncSessionLocal", TestingSessionLocal)
+    yield router
+    await router.dispose()
+
+
+async def read_session(cookies=None):
+    sessions = db_session.get_read_db(SimpleNamespace(cookies=cookies or {}))
+    return sessions, await sessions.__anext__()
+
+
+async def test_reads_are_routed_by_replica_lag(router):
+    # Пока отставание не измерено, чтения идут в основную базу
+    assert router.pick() is None
+    await router.refresh()
+    assert router.lag[0] is not None and router.healthy() == [0]
+
+    sessions, session = await read_session()
+    try:
+        assert session.bind is router.engines[0]
+        assert (await session.execute(text("SHOW transaction_read_only"))).scalar() == "on"
+        with pytest.raises(DBAPIError):
+            await session.execute(text("CREATE TEMP TABLE replica_write (id int)"))
+    finally:
+        await sessions.aclose()
+
+    # Отстающая реплика пропускается
+    router.lag[0] = router.max_lag + 1
+    sessions, session = await read_session()
+    assert session.bind is not router.engines[0]
+    await sessions.aclose()
+
+
+async def test_client_reads_its_writes_from_primary(router, monkeypatch):
+    await router.refresh()
+    monkeypatch.setattr(settings, "DATABASE_REPLICA_URLS", [REPLICA_DATABASE_URL])
+
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware)
+
+    @app.post("/write")
+    async def write():
+        async with TestingSessionLocal() as session:
+            await session.execute(text("UPDATE services SET cost = cost WHERE false"))
+            await session.commit()
+        return {}
+
+    @app.get("/read")
+    async def read():
+        async with TestingSessionLocal() as session:
+            await session.execute(text("SELECT 1"))
+            await session.commit()
+        return {}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        assert PRIMARY_COOKIE not in (await client.get("/read")).headers.get("set-cookie", "")
+        cookie = (await client.post("/write")).headers["set-cookie"]
+    assert cookie.startswith(f"{PRIMARY_COOKIE}=")
+    until = int(cookie.split(";")[0].split("=")[1])
+    assert time.time() < until <= time.time() + settings.READ_YOUR_WRITES_SECONDS
+
+    sessions, session = await read_session({PRIMARY_COOKIE: str(until)})
+    assert session.bind is not router.engines[0]
+    await sessions.aclose()
+    sessions, session = await read_session({PRIMARY_COOKIE: str(int(time.time()) - 1)})
+    assert session.bind is router.engines[0]
+    await sessions.aclose()
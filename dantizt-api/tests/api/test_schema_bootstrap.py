@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import event, text
+
+from app.db.bootstrap import SchemaBootstrap, SqlBundle
+from app.db.session import SCHEMA_BUNDLES
+from tests.conftest import test_engine
+
+pytestmark = pytest.mark.asyncio
+
+TABLE = "schema_bootstrap_test"
+
+
+def view_bundle(version: int) -> SqlBundle:
+    async def build(conn):
+        await conn.execute(text(f"CREATE OR REPLACE VIEW bootstrap_test_view AS SELECT {version} AS version"))
+    return SqlBundle("view", build)
+
+
+def type_bundle() -> SqlBundle:
+    async def build(conn):
+        await conn.execute(text("""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'bootstrap_test_type') THEN
+                    CREATE TYPE bootstrap_test_type AS ENUM ('a');
+                END IF;
+            END
+            $$;
+        """))
+    return SqlBundle("type", build)
+
+
+async def test_unchanged_bundles_are_skipped_without_ddl():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lstrip().split(None, 1)[0].upper())
+
+    async with test_engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        await conn.execute(text("DROP VIEW IF EXISTS bootstrap_test_view"))
+        await conn.execute(text("DROP TYPE IF EXISTS bootstrap_test_type"))
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        bootstrap = SchemaBootstrap([type_bundle(), view_bundle(1)], table=TABLE)
+        assert await bootstrap.run(test_engine) == {"type": "applied", "view": "applied"}
+
+        statements.clear()
+        assert await bootstrap.run(test_engine) == {"type": "unchanged", "view": "unchanged"}
+        assert statements and set(statements) <= {"SELECT"}
+
+        # Изменился только один набор - применяется только он
+        bootstrap = SchemaBootstrap([type_bundle(), view_bundle(2)], table=TABLE)
+        assert await bootstrap.run(test_engine) == {"type": "unchanged", "view": "applied"}
+
+        assert await bootstrap.run(test_engine, force=True) == {"type": "applied", "view": "applied"}
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", record)
+
+    async with test_engine.begin() as conn:
+        version = await conn.execute(text("SELECT version FROM bootstrap_test_view"))
+        assert version.scalar() == 2
+        await conn.execute(text(f"DROP TABLE {TABLE}"))
+        await conn.execute(text("DROP VIEW bootstrap_test_view"))
+        await conn.execute(text("DROP TYPE bootstrap_test_type"))
+
+
+async def test_schema_bundles_have_stable_fingerprints():
+    bootstrap = SchemaBootstrap(SCHEMA_BUNDLES)
+    first = await bootstrap.fingerprints()
+    assert list(first) == [
+        "enum_types", "tables", "partitions", "schema_upgrades",
+        "triggers", "procedures", "initial_data", "views"
+    ]
+    assert await bootstrap.fingerprints() == first
@@ -0,0 +1,321 @@
+import io
+import logging
+import zipfile
+import pytest
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import StreamingResponse
+
+from app.db.models import (
+    User, UserRole, Patient, Doctor, Service, ServiceCategory, Appointment,
+    AppointmentService, AppointmentStatus, Payment, PaymentStatus, PaymentMethod
+)
+from app.api.v1.endpoints import certificates
+from app.api.v1.endpoints.medical_records import generate_tax_deduction_pdf
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.main import app
+from app.services import bulk_certificates
+from app.services.jobs import JobRegistry, JobStatus
+from app.services.tax_deduction import get_tax_deduction_patients, get_tax_deduction_services
+from app.utils import pdf_generator
+from tests.conftest import TestingSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+YEAR = 2024
+
+
+class QueryCounter:
+    """Подсчитывает SQL-запросы, выполненные через тестовый движок"""
+
+    def __init__(self, session: AsyncSession):
+        self.engine = session.bind.sync_engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+async def seed_patient_with_visits(db: AsyncSession, suffix: str, visits: int) -> Patient:
+    """Создает пациента с указанным количеством оплаченных приемов (по две услуги в каждом)"""
+    patient_user = User(
+        email=f"tax_patient_{suffix}@example.com",
+        full_name=f"Пациент {suffix}",
+        hashed_password="x",
+        role=UserRole.patient.value
+    )
+    doctor_user = User(
+        email=f"tax_doctor_{suffix}@example.com",
+        full_name=f"Врач {suffix}",
+        hashed_password="x",
+        role=UserRole.doctor.value
+    )
+    db.add_all([patient_user, doctor_user])
+    await db.flush()
+
+    patient = Patient(user_id=patient_user.id, inn="123456789012")
+    doctor = Doctor(user_id=doctor_user.id)
+    services = [
+        Service(name=f"Осмотр {suffix}", cost=1000, category=ServiceCategory.consultation),
+        Service(name=f"Лечение {suffix}", cost=4000, category=ServiceCategory.therapy)
+    ]
+    db.add_all([patient, doctor, *services])
+    await db.flush()
+
+    start = datetime(YEAR, 1, 10, 10, 0)
+    for i in range(visits):
+        visit_time = start + timedelta(days=i * 7)
+        appointment = Appointment(
+            patient_id=patient.id,
+            doctor_id=doctor.id,
+            start_time=visit_time,
+            end_time=visit_time + timedelta(minutes=30),
+            status=AppointmentStatus.completed
+        )
+        db.add(appointment)
+        await db.flush()
+        db.add_all([
+            AppointmentService(appointment_id=appointment.id, service_id=service.id)
+            for service in services
+        ])
+        db.add(Payment(
+            appointment_id=appointment.id,
+            patient_id=patient.id,
+            doctor_id=doctor.id,
+            amount=5000,
+            status=PaymentStatus.completed,
+            payment_method=PaymentMethod.card,
+            created_at=visit_time
+        ))
+    await db.flush()
+    return patient
+
+
+async def test_tax_deduction_services_single_query(db: AsyncSession):
+    """Услуги пациента с 40 визитами собираются одним запросом в хронологическом порядке"""
+    patient = await seed_patient_with_visits(db, "heavy", visits=40)
+
+    with QueryCounter(db) as counter:
+        rows = await get_tax_deduction_services(db, YEAR, [patient.id])
+
+    assert counter.count == 1
+    assert len(rows) == 80
+    assert [row.date for row in rows] == sorted(row.date for row in rows)
+    assert sum(float(row.cost) for row in rows) == 40 * 5000
+
+
+async def test_tax_deduction_pdf_query_count_does_not_grow_with_visits(db: AsyncSession):
+    """Количество запросов при формировании справки не зависит от числа приемов"""
+    light_patient = await seed_patient_with_visits(db, "light", visits=2)
+    heavy_patient = await seed_patient_with_visits(db, "heavy40", visits=40)
+    reception = User(
+        email="tax_reception@example.com",
+        full_name="Регистратор",
+        hashed_password="x",
+        role=UserRole.reception.value
+    )
+    db.add(reception)
+    await db.flush()
+
+    counts = []
+    for patient in (light_patient, heavy_patient):
+        with QueryCounter(db) as counter:
+            response = await generate_tax_deduction_pdf(
+                patient_id=patient.id,
+                year=YEAR,
+                send_email=False,
+                current_user=reception,
+                db=db
+            )
+        assert isinstance(response, StreamingResponse)
+        counts.append(counter.count)
+
+    assert counts[0] == counts[1]
+    assert counts[1] <= 3
+
+
+async def seed_ineligible_patient(db: AsyncSession, suffix: str) -> Patient:
+    """Создает пациента без оплаченных за год приемов: платеж без приема и платеж прошлого года"""
+    user = User(
+        email=f"tax_patient_{suffix}@example.com",
+        full_name=f"Пациент {suffix}",
+        hashed_password="x",
+        role=UserRole.patient.value
+    )
+    doctor_user = User(
+        email=f"tax_doctor_{suffix}@example.com",
+        full_name=f"Врач {suffix}",
+        hashed_password="x",
+        role=UserRole.doctor.value
+    )
+    db.add_all([user, doctor_user])
+    await db.flush()
+    patient = Patient(user_id=user.id)
+    doctor = Doctor(user_id=doctor_user.id)
+    db.add_all([patient, doctor])
+    await db.flush()
+    db.add_all([
+        Payment(
+            patient_id=patient.id, doctor_id=doctor.id, amount=700, status=PaymentStatus.completed,
+            payment_method=PaymentMethod.cash, created_at=datetime(YEAR, 5, 1, 12, 0)
+        ),
+        Payment(
+            patient_id=patient.id, doctor_id=doctor.id, amount=900, status=PaymentStatus.completed,
+            payment_method=PaymentMethod.cash, created_at=datetime(YEAR - 1, 12, 31, 12, 0)
+        )
+    ])
+    await db.flush()
+    return patient
+
+
+async def test_tax_deduction_patients_and_services(db: AsyncSession):
+    """Пациенты и услуги за год выбираются только по завершенным платежам за оплаченные приемы"""
+    first = await seed_patient_with_visits(db, "pick_a", visits=2)
+    second = await seed_patient_with_visits(db, "pick_b", visits=3)
+    ineligible = await seed_ineligible_patient(db, "pick_none")
+
+    # Второй платеж за тот же прием не дублирует услуги
+    paid = (await db.execute(
+        select(Payment.appointment_id, Payment.doctor_id).where(Payment.patient_id == first.id).limit(1)
+    )).one()
+    db.add(Payment(
+        appointment_id=paid.appointment_id, patient_id=first.id, doctor_id=paid.doctor_id, amount=100,
+        status=PaymentStatus.completed, payment_method=PaymentMethod.card,
+        created_at=datetime(YEAR, 11, 1, 9, 0)
+    ))
+    await db.flush()
+
+    patient_ids = [first.id, second.id, ineligible.id]
+    patients = await get_tax_deduction_patients(db, YEAR, patient_ids)
+    assert [row.patient_id for row in patients] == [first.id, second.id]
+    assert patients[0].full_name == "Пациент pick_a"
+    assert patients[0].last_payment_at.replace(tzinfo=None) == datetime(YEAR, 11, 1, 9, 0)
+    assert patients[1].last_payment_at.replace(tzinfo=None) == datetime(YEAR, 1, 24, 10, 0)
+    assert await get_tax_deduction_patients(db, YEAR - 1, patient_ids) == []
+
+    rows = await get_tax_deduction_services(db, YEAR, patient_ids)
+    assert [row.patient_id for row in rows] == [first.id] * 4 + [second.id] * 6
+    assert sum(float(row.cost) for row in rows if row.patient_id == first.id) == 2 * 5000
+
+
+async def seed_committed_patients(suffix: str, visits: list) -> list:
+    """Сохраняет пациентов в базе, чтобы их видела фоновая задача со своей сессией"""
+    async with TestingSessionLocal() as session:
+        patients = [
+            await seed_patient_with_visits(session, f"{suffix}_{i}", visits=count)
+            for i, count in enumerate(visits)
+        ]
+        ineligible = await seed_ineligible_patient(session, f"{suffix}_none")
+        ids = [patient.id for patient in patients] + [ineligible.id]
+        await session.commit()
+    return ids
+
+
+@pytest.fixture
+def bulk_env(tmp_path, monkeypatch):
+    """Задача работает с тестовой базой, а реестр и архивы хранит во временном каталоге"""
+    registry = JobRegistry(str(tmp_path / "jobs"))
+    monkeypatch.setattr(bulk_certificates, "AsyncSessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(bulk_certificates, "job_registry", registry)
+    monkeypatch.setattr(certificates, "job_registry", registry)
+    monkeypatch.setattr(bulk_certificates, "bulk_dir", tmp_path)
+    monkeypatch.setattr(settings, "CERTIFICATE_BULK_WORKERS", 1)
+    return registry
+
+
+def archive_entries(content: bytes) -> dict:
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+async def test_bulk_job_builds_archive_for_selected_patients(bulk_env):
+    """Задача формирует по одному PDF на каждого подходящего пациента и отражает прогресс в реестре"""
+    first_id, second_id, ineligible_id = await seed_committed_patients("bulk_sel", [1, 2])
+    job = bulk_env.create(bulk_certificates.JOB_KIND, params={"year": YEAR})
+    assert job["status"] == JobStatus.pending
+
+    await bulk_certificates.run_bulk_certificate_job(
+        job["id"], YEAR, [first_id, second_id, ineligible_id], "Регистратор", "+7 900 000-00-00"
+    )
+
+    job = bulk_env.get(job["id"])
+    assert job["status"] == JobStatus.completed
+    assert job["progress"] == {"total": 2, "processed": 2, "failed": 0}
+    assert job["result"]["generated"] == 2 and job["result"]["errors"] == []
+    assert job["finished_at"] is not None
+
+    archive_path = bulk_certificates.bulk_archive_path(job["id"])
+    assert job["result"]["size_bytes"] == archive_path.stat().st_size
+    entries = archive_entries(archive_path.read_bytes())
+    assert sorted(entries) == [f"{first_id}_Пациент bulk_sel_0.pdf", f"{second_id}_Пациент bulk_sel_1.pdf"]
+    assert all(content.startswith(b"%PDF") for content in entries.values())
+
+
+async def test_bulk_endpoints_with_empty_patient_ids_cover_all_patients(db: AsyncSession, bulk_env):
+    """Пустой список пациентов означает всех пациентов; статус и архив доступны через API"""
+    seeded = await seed_committed_patients("bulk_all", [1, 1])
+    expected = [row.patient_id for row in await get_tax_deduction_patients(db, YEAR)]
+    assert set(seeded[:2]) <= set(expected) and seeded[2] not in expected
+
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(
+        role=UserRole.reception, full_name="Регистратор", phone_number=None
+    )
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            # Задача, которая еще не завершена, не отдает архив
+            pending = bulk_env.create(bulk_certificates.JOB_KIND)
+            response = await client.get(f"/api/v1/certificates/bulk/{pending['id']}/download")
+            assert response.status_code == 409
+
+            # Фоновая задача выполняется до завершения запроса
+            response = await client.post("/api/v1/certificates/bulk", json={"year": YEAR, "patient_ids": []})
+            assert response.status_code == 202
+            job_id = response.json()["id"]
+
+            response = await client.get(f"/api/v1/certificates/bulk/{job_id}")
+            assert response.status_code == 200
+            job = response.json()
+            assert job["status"] == JobStatus.completed
+            assert job["progress"] == {"total": len(expected), "processed": len(expected), "failed": 0}
+
+            response = await client.get(f"/api/v1/certificates/bulk/{job_id}/download")
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/zip"
+            entries = archive_entries(response.content)
+            assert sorted(int(name.split("_", 1)[0]) for name in entries) == expected
+
+            other = bulk_env.create("other_kind")
+            assert (await client.get(f"/api/v1/certificates/bulk/{other['id']}")).status_code == 404
+            assert (await client.get("/api/v1/certificates/bulk/missing")).status_code == 404
+    finally:
+        del app.dependency_overrides[get_current_user]
+
+
+def test_pdf_fonts_default_to_system_dejavu_and_warn_on_fallback(tmp_path, monkeypatch, caplog):
+    """Шрифты берутся из настроенной директории, а переход на Helvetica сопровождается предупреждением"""
+    assert pdf_generator._FONT_CANDIDATES[0][0].parent == Path(settings.PDF_FONTS_DIR)
+    if (Path(settings.PDF_FONTS_DIR) / "DejaVuSerif.ttf").exists():
+        pdf_generator.register_fonts.cache_clear()
+        assert pdf_generator.register_fonts() == ('CertificateFont', 'CertificateFont-Bold')
+
+    monkeypatch.setattr(pdf_generator, "_FONT_CANDIDATES", [(tmp_path / "a.ttf", tmp_path / "b.ttf")])
+    pdf_generator.register_fonts.cache_clear()
+    try:
+        with caplog.at_level(logging.WARNING, logger=pdf_generator.logger.name):
+            assert pdf_generator.register_fonts() == ('Helvetica', 'Helvetica-Bold')
+        assert "check PDF_FONTS_DIR" in caplog.text
+        assert "falling back to Helvetica" in caplog.text
+    finally:
+        pdf_generator.register_fonts.cache_clear()
@@ -8,6 +8,7 @@ from sqlalchemy.orm import sessionmaker
 
 from app.main import app
 from app.db.session import Base, get_db
+from app.db.partitions import ensure_all_partitions
 from app.core.config import settings
 
 # Используем тестовую базу данных
@@ -35,6 +36,7 @@ async def setup_database() -> AsyncGenerator:
     async with test_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+        await ensure_all_partitions(conn)
     
     yield
     
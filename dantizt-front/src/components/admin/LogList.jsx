@@ -289,11 +289,18 @@ export default function LogList() {
                 </div>
               </div>
               
+              {selectedLog.changed_columns && (
+                <div className="mt-4">
+                  <p className="text-sm font-medium text-gray-500">Измененные поля</p>
+                  <p>{selectedLog.changed_columns.join(', ')}</p>
+                </div>
+              )}
+              
               {selectedLog.old_data && (
                 <div className="mt-4">
                   <p className="text-sm font-medium text-gray-500">Старые данные</p>
                   <pre className="mt-1 bg-gray-50 p-2 rounded text-sm overflow-x-auto">
-                    {selectedLog.old_data}
+                    {JSON.stringify(selectedLog.old_data, null, 2)}
                   </pre>
                 </div>
               )}
@@ -302,7 +309,7 @@ export default function LogList() {
                 <div className="mt-4">
                   <p className="text-sm font-medium text-gray-500">Новые данные</p>
                   <pre className="mt-1 bg-gray-50 p-2 rounded text-sm overflow-x-auto">
-                    {selectedLog.new_data}
+                    {JSON.stringify(selectedLog.new_data, null, 2)}
                   </pre>
                 </div>
               )}
@@ -1,10 +1,28 @@
 import { create } from 'zustand';
 import api from '@/lib/axios';
 
+const JOB_POLL_INTERVAL = 2000;
+
+// Создание и восстановление копий выполняются на сервере фоновыми задачами:
+// ждем завершения задачи, опрашивая ее состояние
+const waitForJob = async (job, onProgress) => {
+  while (job.status === 'pending' || job.status === 'running') {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL));
+    const response = await api.get(`/backups/jobs/${job.id}`);
+    job = response.data;
+    onProgress?.(job.progress);
+  }
+  if (job.status === 'failed') {
+    throw new Error(job.error || 'Задача завершилась с ошибкой');
+  }
+  return job;
+};
+
 export const useBackupStore = create((set, get) => ({
   backups: [],
   loading: false,
   error: null,
+  progress: null,
 
   fetchBackups: async () => {
     try {
@@ -22,55 +40,49 @@ export const useBackupStore = create((set, get) => ({
 
   createBackup: async () => {
     try {
-      set({ loading: true, error: null });
-      await api.post('/backups/create');
+      set({ loading: true, error: null, progress: null });
+      const response = await api.post('/backups/create');
+      await waitForJob(response.data, (progress) => set({ progress }));
+      set({ progress: null });
       // После создания обновляем список
       await get().fetchBackups();
     } catch (error) {
       console.error('Ошибка при создании резервной копии:', error);
       set({ 
-        error: error.response?.data?.detail || 'Не удалось создать резервную копию', 
-        loading: false 
+        error: error.response?.data?.detail || error.message || 'Не удалось создать резервную копию', 
+        loading: false,
+        progress: null
       });
     }
   },
 
   restoreBackup: async (filename) => {
     try {
-      set({ loading: true, error: null });
-      await api.post(`/backups/restore/${filename}`);
-      set({ loading: false });
+      set({ loading: true, error: null, progress: null });
+      const response = await api.post(`/backups/restore/${filename}`);
+      await waitForJob(response.data, (progress) => set({ progress }));
+      set({ loading: false, progress: null });
       return true;
     } catch (error) {
       console.error('Ошибка при восстановлении из резервной копии:', error);
       set({ 
-        error: error.response?.data?.detail || 'Не удалось восстановить из резервной копии', 
-        loading: false 
+        error: error.response?.data?.detail || error.message || 'Не удалось восстановить из резервной копии', 
+        loading: false,
+        progress: null
       });
       return false;
     }
   },
   
-  downloadBackup: async (filename) => {
-    try {
-      set({ loading: true, error: null });
-      // Создаем ссылку для скачивания файла
-      const response = await api.get(`/backups/download/${filename}`, { responseType: 'blob' });
-      const url = window.URL.createObjectURL(new Blob([response.data]));
-      const link = document.createElement('a');
-      link.href = url;
-      link.setAttribute('download', filename);
-      document.body.appendChild(link);
-      link.click();
-      link.remove();
-      set({ loading: false });
-    } catch (error) {
-      console.error('Ошибка при скачивании резервной копии:', error);
-      set({ 
-        error: error.response?.data?.detail || 'Не удалось скачать резервную копию', 
-        loading: false 
-      });
-    }
+  downloadBackup: (filename) => {
+    // Файл скачивает сам браузер: он пишет его на диск потоком и может
+    // продолжить прерванную загрузку Range-запросом
+    const link = document.createElement('a');
+    link.href = `${api.defaults.baseURL}/backups/download/${encodeURIComponent(filename)}`;
+    link.setAttribute('download', filename);
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
   },
 
   deleteBackup: async (filename) => {